@@ -0,0 +1,109 @@
+import gzip
+import json
+from typing import Any, Dict, Optional
+
+from flask import Response, request
+
+from core.graph_codec import to_columnar
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+JSON_MIMETYPE = "application/json"
+COLUMNAR_JSON_MIMETYPE = "application/vnd.kg.columnar+json"
+MSGPACK_MIMETYPE = "application/msgpack"
+COLUMNAR_MSGPACK_MIMETYPE = "application/vnd.kg.columnar+msgpack"
+
+# Bodies smaller than this are sent uncompressed; compression would cost more than it saves
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+_zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard else None
+
+
+def dumps_json(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _negotiate_mimetype() -> str:
+    offered = [JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE]
+    if msgpack is not None:
+        offered += [MSGPACK_MIMETYPE, "application/x-msgpack", COLUMNAR_MSGPACK_MIMETYPE]
+    best = request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    if best == "application/x-msgpack":
+        best = MSGPACK_MIMETYPE
+
+    # ?format=columnar selects the columnar layout for whichever serializer was negotiated
+    if request.args.get("format") == "columnar":
+        if best == JSON_MIMETYPE:
+            best = COLUMNAR_JSON_MIMETYPE
+        elif best == MSGPACK_MIMETYPE:
+            best = COLUMNAR_MSGPACK_MIMETYPE
+    return best
+
+
+def _negotiate_encoding(body: bytes) -> Optional[str]:
+    if len(body) < MIN_COMPRESS_BYTES:
+        return None
+    accepted = request.accept_encodings
+    if _zstd_compressor is not None and accepted["zstd"]:
+        return "zstd"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "zstd":
+        return _zstd_compressor.compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def _with_columnar_graph(payload: Dict[str, Any]) -> Dict[str, Any]:
+    graph_data = payload.get("graph_data")
+    if not graph_data:
+        return payload
+    return {**payload, "graph_data": to_columnar(graph_data)}
+
+
+def graph_response(payload: Dict[str, Any], status: int = 200) -> Response:
+    """
+    Build a response for a payload carrying "graph_data", negotiated from the request:
+        - Accept: application/json (default), application/vnd.kg.columnar+json,
+          application/msgpack or application/vnd.kg.columnar+msgpack
+        - ?format=columnar switches the negotiated serializer to the columnar layout
+        - Accept-Encoding: zstd or gzip for bodies above MIN_COMPRESS_BYTES
+    """
+    mimetype = _negotiate_mimetype()
+    if mimetype in (COLUMNAR_JSON_MIMETYPE, COLUMNAR_MSGPACK_MIMETYPE):
+        payload = _with_columnar_graph(payload)
+
+    if mimetype in (MSGPACK_MIMETYPE, COLUMNAR_MSGPACK_MIMETYPE):
+        body = msgpack.packb(payload, default=str, use_bin_type=True)
+    else:
+        body = dumps_json(payload)
+
+    encoding = _negotiate_encoding(body)
+    response = Response(_compress(body, encoding), status=status, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.update(("Accept", "Accept-Encoding"))
+    return response
@@ -4,4 +4,8 @@ api = Blueprint('api', __name__, url_prefix='/api/v1')
 
 def init_routes(api, graph_extractor):
 	from .graph_routes import register_routes
+	from .query_routes import register_routes as register_query_routes
+	from .admin_routes import register_routes as register_admin_routes
 	register_routes(api, graph_extractor)
+	register_query_routes(api, graph_extractor)
+	register_admin_routes(api, graph_extractor)
@@ -0,0 +1,108 @@
+import hmac
+import logging
+import os
+import random
+
+from flask import Response, g, request, jsonify
+
+from core.profiling import Profile, ProfileStore, folded_stacks, profile_scope
+
+logger = logging.getLogger(__name__)
+
+
+def register_routes(api, graph_extractor):
+    # Requests are profiled when they send "X-Profile: 1" (unless PROFILE_HEADER_ENABLED=0)
+    # or are picked at random with probability PROFILE_SAMPLE_RATE
+    header_enabled = os.getenv('PROFILE_HEADER_ENABLED', '1') == '1'
+    sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    # The /admin endpoints are disabled (404) unless PROFILE_ADMIN_TOKEN is set, and then
+    # require it as "Authorization: Bearer <token>"
+    admin_token = os.getenv('PROFILE_ADMIN_TOKEN', '')
+    store = ProfileStore()
+
+    def should_profile():
+        if request.path.startswith(f"{api.url_prefix}/admin/"):
+            return False
+        if header_enabled and request.headers.get("X-Profile", "").lower() in ("1", "true", "yes"):
+            return True
+        return sample_rate > 0 and random.random() < sample_rate
+
+    @api.before_request
+    def start_profile():
+        if not should_profile():
+            return
+        profile = Profile(f"{request.method} {request.path}", {"endpoint": request.endpoint})
+        g.profile_scope = profile_scope(profile)
+        g.profile_scope.__enter__()
+        g.profile = profile
+
+    def finish(scope, profile, error=None):
+        try:
+            scope.__exit__(type(error) if error else None, error, None)
+            store.save(profile)
+        except Exception:
+            logger.exception("Error saving profile %s", profile.id)
+
+    @api.after_request
+    def add_profile_header(response):
+        profile = g.get("profile")
+        if profile is not None:
+            profile.attributes["status"] = response.status_code
+            response.headers["X-Profile-Id"] = profile.id
+            if response.is_streamed:
+                # The body is generated after teardown; the profile ends when the server closes the response
+                scope = g.pop("profile_scope")
+                g.pop("profile")
+                response.call_on_close(lambda: finish(scope, profile))
+        return response
+
+    @api.teardown_request
+    def finish_profile(error=None):
+        scope = g.pop("profile_scope", None)
+        profile = g.pop("profile", None)
+        if scope is not None:
+            finish(scope, profile, error)
+
+    def admin_denied():
+        """A response refusing the request, or None when the admin token matches"""
+        if not admin_token:
+            return jsonify({"error": "Not found"}), 404
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {admin_token}".encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+        return None
+
+    @api.route("/admin/profiles", methods=["GET"])
+    def list_profiles():
+        """
+        List the newest saved profiles (data/logs/profiles).
+        Query parameters:
+            limit: number of profiles (default 50)
+        """
+        denied = admin_denied()
+        if denied:
+            return denied
+        try:
+            limit = int(request.args.get("limit", 50))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        return jsonify({"profiles": store.list(limit)}), 200
+
+    @api.route("/admin/profiles/<profile_id>", methods=["GET"])
+    def get_profile(profile_id):
+        """
+        Get a saved profile: its span timeline and stack samples as JSON, or with
+        ?format=folded the samples as folded stacks for flamegraph.pl / speedscope.
+        """
+        denied = admin_denied()
+        if denied:
+            return denied
+        try:
+            data = store.get(profile_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if data is None:
+            return jsonify({"error": f"Profile not found: {profile_id}"}), 404
+        if request.args.get("format") == "folded":
+            return Response(folded_stacks(data), mimetype="text/plain")
+        return jsonify(data), 200
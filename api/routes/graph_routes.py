@@ -1,19 +1,55 @@
-from flask import Blueprint, request, jsonify
+import logging
+
+from flask import Blueprint, Response, request, jsonify
+
+from api.responses import graph_response, dumps_json
+from core.cancellation import JobRegistry, OperationCancelled, cancellation_scope
+
+logger = logging.getLogger(__name__)
+
 
 def register_routes(api, graph_extractor):
+    # Running extraction jobs of this worker process, cancellable with DELETE /graph/jobs/<job_id>
+    jobs = JobRegistry()
+
+    def run_job(data, extract):
+        """
+        Run extract() as a cancellable job. The job id comes from the X-Job-Id header or
+        the body's job_id (generated otherwise) and is returned in the X-Job-Id header.
+        """
+        try:
+            job_id, token = jobs.start(request.headers.get("X-Job-Id") or data.get("job_id"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        try:
+            with cancellation_scope(token):
+                response = graph_response(extract(), 200)
+        except OperationCancelled as e:
+            response = jsonify({"error": f"Job cancelled: {e}", "job_id": job_id})
+            response.status_code = 409
+        finally:
+            jobs.finish(job_id)
+        response.headers["X-Job-Id"] = job_id
+        return response
+
     @api.route("/graph/test", methods=["POST"])
     def test_graph():
         #Use create_test_knowledge_graph
         graph_data = graph_extractor.create_test_knowledge_graph()
-        return jsonify(graph_data), 200
+        return graph_response(graph_data, 200)
     
     @api.route("/graph/extract", methods=["POST"])
     def extract_graph_nodes_and_relations():
         """
         Extract a knowledge graph from the provided text.
         Expected JSON body: {
-            "text": "The text to analyze"
+            "text": "The text to analyze",
+            "story_id": "optional id; only this story's graph is replaced",
+            "mode": "optional: serial, pipelined, joint or partitioned",
+            "prefilter": "optional bool: only extract relationships where entities co-occur",
+            "job_id": "optional id for DELETE /graph/jobs/<job_id> (or the X-Job-Id header)"
         }
+        The response format is negotiated by api.responses.graph_response.
         """
         try:
             data = request.get_json()
@@ -21,10 +57,92 @@ def register_routes(api, graph_extractor):
                 return jsonify({"error": "No text provided"}), 400
                 
             text = data["text"]
-            graph_data = graph_extractor.extract_graph_nodes_and_relations(text)
-            
-            return jsonify(graph_data), 200
+            return run_job(data, lambda: graph_extractor.extract_graph_nodes_and_relations(
+                text, story_id=data.get("story_id"), mode=data.get("mode"),
+                prefilter=data.get("prefilter")
+            ))
             
         except Exception as e:
-            print(e)
-            return jsonify({"error": str(e)}), 500
\ No newline at end of file
+            logger.exception("Error extracting graph")
+            return jsonify({"error": str(e)}), 500
+
+    @api.route("/graph/stories/<story_id>", methods=["PUT"])
+    def update_story(story_id):
+        """
+        Incrementally (re)build a story's graph: only chunks of the text that changed since
+        the last submission are extracted, and facts of removed chunks are retracted.
+        Expected JSON body: {
+            "text": "The full story text",
+            "prefilter": "optional bool",
+            "job_id": "optional id, as for /graph/extract"
+        }
+        """
+        try:
+            data = request.get_json()
+            if not data or "text" not in data:
+                return jsonify({"error": "No text provided"}), 400
+
+            return run_job(data, lambda: graph_extractor.update_story(
+                story_id, data["text"], prefilter=data.get("prefilter")
+            ))
+
+        except Exception as e:
+            logger.exception(f"Error updating story {story_id}")
+            return jsonify({"error": str(e)}), 500
+
+    @api.route("/graph/extract/batch", methods=["POST"])
+    def extract_graph_batch():
+        """
+        Extract a knowledge graph for each of many documents.
+        Expected JSON body: {
+            "documents": [{"id": "doc-1", "text": "The text to analyze"}, ...],
+            "job_id": "optional id, as for /graph/extract"
+        }
+        Streams one NDJSON line per document as it finishes: {"id", "index", "metadata",
+        "graph_data", "status"}. A failed document only produces an error line.
+        If the client disconnects or the job is cancelled, the remaining documents are
+        cancelled and the stream ends with {"error": ..., "job_id": ...}.
+        """
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get("documents"), list):
+            return jsonify({"error": "No documents provided"}), 400
+        try:
+            job_id, token = jobs.start(request.headers.get("X-Job-Id") or data.get("job_id"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+
+        def generate():
+            finished = False
+            try:
+                with cancellation_scope(token):
+                    for result in graph_extractor.extract_batch(data["documents"]):
+                        yield dumps_json(result) + b"\n"
+                finished = True
+            except OperationCancelled as e:
+                yield dumps_json({"error": f"Job cancelled: {e}", "job_id": job_id}) + b"\n"
+            finally:
+                # The server closes the generator early when the client disconnects
+                if not finished:
+                    token.cancel("client disconnected")
+                jobs.finish(job_id)
+
+        response = Response(generate(), mimetype="application/x-ndjson")
+        response.headers["X-Job-Id"] = job_id
+        return response
+
+    @api.route("/graph/jobs", methods=["GET"])
+    def list_jobs():
+        """Ids of the jobs running in this worker process"""
+        return jsonify({"jobs": jobs.active()})
+
+    @api.route("/graph/jobs/<job_id>", methods=["DELETE"])
+    def cancel_job(job_id):
+        """
+        Cancel a running job: its in-flight LLM streams are closed, pending database
+        batches are skipped and the request returns 409 (a batch stream ends instead).
+        Jobs are per worker process, so with several workers this only reaches jobs of
+        the worker that serves it.
+        """
+        if not jobs.cancel(job_id, "cancelled by request"):
+            return jsonify({"error": f"Job not found: {job_id}"}), 404
+        return jsonify({"job_id": job_id, "cancelled": True}), 202
@@ -0,0 +1,146 @@
+import logging
+
+from flask import Response, request, jsonify
+
+from api.responses import graph_response
+
+logger = logging.getLogger(__name__)
+
+
+def _int_arg(name: str, default: int) -> int:
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def register_routes(api, graph_extractor):
+    neo4j_builder = graph_extractor.neo4j_builder
+
+    @api.route("/graph/nodes/<node_id>/neighborhood", methods=["GET"])
+    def get_neighborhood(node_id):
+        """
+        Get the nodes within `depth` hops of a node, one page at a time.
+        Query parameters:
+            depth: number of hops (default 1, at most MAX_NEIGHBORHOOD_DEPTH)
+            types: comma-separated relationship types to follow (default: all)
+            limit: nodes per page (default 100, at most MAX_PAGE_SIZE)
+            cursor: the cursor returned by the previous page
+            story_id: only traverse nodes of this story
+        """
+        try:
+            depth = _int_arg("depth", 1)
+            limit = _int_arg("limit", 100)
+            types = request.args.get("types")
+            relationship_types = [t for t in types.split(",") if t] if types else None
+            neighborhood = neo4j_builder.get_neighborhood(
+                node_id,
+                depth=depth,
+                relationship_types=relationship_types,
+                limit=limit,
+                cursor=request.args.get("cursor"),
+                story_id=request.args.get("story_id")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.exception(f"Error reading neighborhood of {node_id}")
+            return jsonify({"error": str(e)}), 500
+
+        if not neighborhood["nodes"] and not request.args.get("cursor"):
+            return jsonify({"error": f"Node not found: {node_id}"}), 404
+        return graph_response({
+            "graph_data": {
+                "nodes": neighborhood["nodes"],
+                "relationships": neighborhood["relationships"]
+            },
+            "cursor": neighborhood["cursor"],
+            "truncated": neighborhood["truncated"]
+        }, 200)
+
+    @api.route("/graph/labels/<label>/nodes", methods=["GET"])
+    def get_nodes_by_label(label):
+        """
+        Get the nodes with a label, one page at a time.
+        Query parameters: limit (default 100), cursor, story_id
+        """
+        try:
+            page = neo4j_builder.get_nodes_by_label_page(
+                label,
+                limit=_int_arg("limit", 100),
+                cursor=request.args.get("cursor"),
+                story_id=request.args.get("story_id")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.exception(f"Error listing {label} nodes")
+            return jsonify({"error": str(e)}), 500
+
+        return graph_response({
+            "graph_data": {
+                "nodes": page["nodes"],
+                "relationships": []
+            },
+            "cursor": page["cursor"]
+        }, 200)
+
+    analytics = graph_extractor.analytics
+
+    @api.route("/graph/analytics", methods=["GET"])
+    def get_analytics():
+        """
+        Precomputed analytics of a story graph (or of the graph without a story): node and
+        relationship counts, connected component sizes, and the top entries by PageRank
+        centrality, location traffic and character co-occurrence. Served from the cache
+        kept by GraphAnalytics, with an ETag for conditional requests.
+        Query parameters:
+            story_id: the story (default: nodes without a story)
+            top: entries per ranking (default 20, at most ANALYTICS_SUMMARY_SIZE)
+        """
+        try:
+            top = _int_arg("top", 20)
+            if top < 0:
+                raise ValueError("top must not be negative")
+            summary = analytics.get(request.args.get("story_id"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.exception("Error reading graph analytics")
+            return jsonify({"error": str(e)}), 500
+
+        etag = f'"{summary["computed_at"]}:{top}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            response = Response(status=304)
+        else:
+            response = jsonify({
+                **summary,
+                "centrality": summary["centrality"][:top],
+                "location_traffic": summary["location_traffic"][:top],
+                "co_occurrence": summary["co_occurrence"][:top]
+            })
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = f"private, max-age={int(analytics.cache_ttl)}"
+        return response
+
+    @api.route("/graph/analytics/refresh", methods=["POST"])
+    def refresh_analytics():
+        """
+        Recompute the analytics of a story now (e.g. after writes that bypassed the extractor).
+        Expected JSON body (optional): {"story_id": "the story; omit for nodes without a story"}
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            summary = analytics.refresh(data.get("story_id"))
+        except Exception as e:
+            logger.exception("Error refreshing graph analytics")
+            return jsonify({"error": str(e)}), 500
+        return jsonify({
+            "story_id": summary["story_id"],
+            "computed_at": summary["computed_at"],
+            "node_count": summary["node_count"],
+            "relationship_count": summary["relationship_count"]
+        }), 200
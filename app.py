@@ -2,7 +2,10 @@ from flask import Flask, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 import logging
+import os
+import time
 
+from core.log_config import setup_logging
 from core.neo4j_graph_builder import Neo4jGraphBuilder
 from core.llm_client import LLMClient
 from services.graph_extractor import GraphExtractor
@@ -15,18 +18,42 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Queue-backed logging: console plus rotating JSON files under data/logs (see core/log_config.py)
+setup_logging()
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-neo4j_builder = Neo4jGraphBuilder()
+# These are cheap to construct: the Neo4j driver, the OpenAI clients and the
+# prompts are only created or loaded on first use, or by warm_up()
+# GRAPH_BUILDER=memory swaps Neo4j for a process-local stand-in (load tests, local runs)
+if os.getenv("GRAPH_BUILDER", "neo4j").lower() == "memory":
+    from core.memory_graph_builder import InMemoryGraphBuilder
+    neo4j_builder = InMemoryGraphBuilder()
+else:
+    neo4j_builder = Neo4jGraphBuilder()
 llm_client = LLMClient()
 graph_extractor = GraphExtractor(neo4j_builder, llm_client)
 
 init_routes(api, graph_extractor)
 app.register_blueprint(api)
 
+
+def warm_up():
+    """
+    Open Neo4j connections, create the LLM clients and load prompts and schemas,
+    so the first request does not pay for them. Failures are logged, not raised,
+    so a worker still starts when Neo4j is unreachable.
+    """
+    start = time.perf_counter()
+    try:
+        graph_extractor.warm_up()
+        llm_client.warm_up()
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+    neo4j_ready = neo4j_builder.warm_up()
+    logger.info(f"Warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms (neo4j ready: {neo4j_ready})")
+
+
 if __name__ == "__main__":
-    print("Starting server...")
+    logger.info("Starting server...")
+    warm_up()
     app.run(host="0.0.0.0", debug=True, threaded=True)
@@ -0,0 +1,145 @@
+import contextvars
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OperationCancelled(BaseException):
+    """
+    Raised inside work whose cancellation token was cancelled. Like
+    asyncio.CancelledError it derives from BaseException, so the broad
+    "except Exception" handlers that turn failures into error responses let it
+    through and the whole request unwinds.
+    """
+
+
+class CancellationToken:
+    """
+    Cancellation state of one request. cancel() may be called from any thread; work
+    checks raise_if_cancelled() between steps, and blocking I/O registers on_cancel
+    callbacks (e.g. closing an HTTP stream) so it is interrupted immediately.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.exception(f"Error in cancellation callback: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run callback on cancel (immediately if already cancelled); returns a function that unregisters it"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                registered = True
+            else:
+                registered = False
+        if not registered:
+            callback()
+
+        def unregister():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return unregister
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar("cancellation_token", default=None)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """The token of the request running in this context, if any"""
+    return _current_token.get()
+
+
+def raise_if_cancelled() -> None:
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """Make token the current token for the code inside the block"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Wrap fn so it runs with the caller's context variables (the current token, and the
+    current profile of core.profiling). Thread pools do not carry context variables
+    over, so work submitted to a pool is wrapped with this.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A Context cannot be entered by two threads at once, so each call runs in its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+class JobRegistry:
+    """Cancellation tokens of the running jobs of this process, by job id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, CancellationToken] = {}
+
+    def start(self, job_id: Optional[str] = None) -> Tuple[str, CancellationToken]:
+        """Register a job (with a generated id if none is given); raises ValueError if the id is in use"""
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            if job_id in self._jobs:
+                raise ValueError(f"Job already running: {job_id}")
+            token = self._jobs[job_id] = CancellationToken()
+        return job_id, token
+
+    def finish(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        """Cancel a running job; returns False if no job has that id"""
+        with self._lock:
+            token = self._jobs.get(job_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    def active(self) -> List[str]:
+        with self._lock:
+            return list(self._jobs)
@@ -0,0 +1,415 @@
+import csv
+import glob
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.cancellation import raise_if_cancelled
+from core.neo4j_graph_builder import CHUNK_PROPERTIES, Neo4jGraphBuilder, _quote
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+GRAPH_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'graph')
+ARRAY_DELIMITER = ";"
+MANIFEST_FILE = "manifest.json"
+
+# Schema property types (data/graph/*.json) to neo4j-admin CSV header types
+SCHEMA_TYPES = {
+    "string": "string",
+    "number": "double",
+    "boolean": "boolean",
+    "string[]": "string[]",
+    "number[]": "double[]",
+    "boolean[]": "boolean[]",
+}
+# Ownership and bookkeeping properties written by GraphExtractor, exported for every label/type
+NODE_SYSTEM_PROPERTIES = [("story_id", "string"), ("chunks", "string[]"), (CHUNK_PROPERTIES, "string[]")]
+RELATIONSHIP_SYSTEM_PROPERTIES = [("story_id", "string"), ("chunk_hash", "string")]
+# Id columns of Parquet/Arrow files; the underscore keeps them apart from schema properties such as PART_OF.type
+NODE_ID_COLUMNS = [("_id", "string"), ("_labels", "string[]")]
+RELATIONSHIP_ID_COLUMNS = [("_start_id", "string"), ("_end_id", "string"), ("_type", "string")]
+# Temporary label and property linking imported relationships to imported nodes
+IMPORT_LABEL = "BulkImportNode"
+IMPORT_ID = "_import_id"
+
+
+def _load_schema(filename: str) -> Dict[str, Any]:
+    with open(os.path.join(GRAPH_DIR, filename), 'r') as f:
+        return json.load(f)
+
+
+def node_columns(label: str, nodes_schema: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(property, neo4j-admin type) columns for a node label, derived from nodes_schema.json"""
+    definition = nodes_schema.get("node_types", {}).get(label, {})
+    columns = {"name": "string"}
+    for group in ("required_properties", "optional_properties"):
+        for key, schema_type in definition.get(group, {}).items():
+            columns[key] = SCHEMA_TYPES.get(schema_type, "string")
+    for key, column_type in NODE_SYSTEM_PROPERTIES:
+        columns.setdefault(key, column_type)
+    return list(columns.items())
+
+
+def relationship_columns(relationship_type: str, relationships_schema: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(property, neo4j-admin type) columns for a relationship type, derived from relationships_schema.json"""
+    definition = relationships_schema.get("relationship_types", {}).get(relationship_type, {})
+    columns = {}
+    for group in ("required", "optional"):
+        for key, schema_type in definition.get("properties", {}).get(group, {}).items():
+            columns[key] = SCHEMA_TYPES.get(schema_type, "string")
+    for key, column_type in RELATIONSHIP_SYSTEM_PROPERTIES:
+        columns.setdefault(key, column_type)
+    return list(columns.items())
+
+
+def _csv_value(value: Any, column_type: str) -> str:
+    if value is None:
+        return ""
+    if column_type.endswith("[]"):
+        values = value if isinstance(value, list) else [value]
+        return ARRAY_DELIMITER.join(_csv_value(item, column_type[:-2]) for item in values)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _parse_csv_value(text: str, column_type: str) -> Any:
+    if text == "":
+        return None
+    if column_type.endswith("[]"):
+        return [_parse_csv_value(item, column_type[:-2]) for item in text.split(ARRAY_DELIMITER)]
+    if column_type in ("double", "float"):
+        return float(text)
+    if column_type in ("long", "int", "short", "byte"):
+        return int(text)
+    if column_type == "boolean":
+        return text.lower() == "true"
+    return text
+
+
+def _parse_header(header: List[str]) -> List[Tuple[str, str]]:
+    """neo4j-admin header fields ("name:type", ":ID", ":LABEL", ...) as (name, type) pairs"""
+    columns = []
+    for field in header:
+        name, _, column_type = field.partition(":")
+        if field.startswith(":"):
+            name, column_type = "", field[1:]
+        columns.append((name, column_type or "string"))
+    return columns
+
+
+def _arrow_type(column_type: str):
+    base = {"string": pyarrow.string(), "double": pyarrow.float64(), "boolean": pyarrow.bool_()}
+    if column_type.endswith("[]"):
+        return pyarrow.list_(base.get(column_type[:-2], pyarrow.string()))
+    return base.get(column_type, pyarrow.string())
+
+
+def _arrow_value(value: Any, column_type: str) -> Any:
+    """Coerce a property value to the column's Arrow type; values that do not fit are stringified"""
+    if value is None:
+        return None
+    if column_type.endswith("[]"):
+        return [_arrow_value(item, column_type[:-2]) for item in (value if isinstance(value, list) else [value])]
+    if column_type == "double":
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    if column_type == "boolean":
+        return value if isinstance(value, bool) else None
+    return value if isinstance(value, str) else json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+
+
+class GraphBulkIO:
+    """
+    Streams a story graph (or the whole database) to and from files for offline bulk
+    loading and analytics:
+        - neo4j-admin compatible CSV: one nodes_<Label>.csv per label and one
+          relationships_<TYPE>.csv per type, with typed headers derived from the schemas.
+          A node with several labels is written once, to the file of its first label,
+          and its :LABEL column lists all of them.
+        - Parquet or Arrow IPC files with the same layout, whose id, label and type
+          columns are the reserved _id, _labels, _start_id, _end_id and _type
+    Exports read query results incrementally and write them in batches; imports read
+    files in batches of batch_size and write them with UNWIND queries, so memory use is
+    bounded by the batch size rather than the graph size.
+    """
+
+    def __init__(self, neo4j_builder: Neo4jGraphBuilder, batch_size: int = 10000):
+        self.neo4j_builder = neo4j_builder
+        self.batch_size = batch_size
+        self.nodes_schema = _load_schema('nodes_schema.json')
+        self.relationships_schema = _load_schema('relationships_schema.json')
+
+    # Export
+
+    def _labels_and_types(self, session, story_id: Optional[str]) -> Tuple[List[str], List[str]]:
+        # A node is exported once, in the file of its first label
+        labels = session.run("""
+            MATCH (n)
+            WHERE ($story_id IS NULL OR n.story_id = $story_id) AND NOT n:StoryChunk AND NOT n:GraphAnalytics
+              AND size(labels(n)) > 0
+            RETURN DISTINCT head(labels(n)) AS label
+        """, story_id=story_id).value()
+        types = session.run("""
+            MATCH (n)-[r]->()
+            WHERE ($story_id IS NULL OR n.story_id = $story_id)
+            RETURN DISTINCT type(r) AS type
+        """, story_id=story_id).value()
+        return sorted(labels), sorted(types)
+
+    def _iter_nodes(self, session, label: str, story_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+        cypher = f"""
+            MATCH (n:{_quote(label)})
+            WHERE ($story_id IS NULL OR n.story_id = $story_id) AND head(labels(n)) = $label
+            RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+        """
+        for record in session.run(cypher, story_id=story_id, label=label):
+            yield record.data()
+
+    def _iter_relationships(self, session, relationship_type: str, story_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+        cypher = f"""
+            MATCH (a)-[r:{_quote(relationship_type)}]->(b)
+            WHERE $story_id IS NULL OR a.story_id = $story_id
+            RETURN elementId(a) AS source, elementId(b) AS target, properties(r) AS properties
+        """
+        for record in session.run(cypher, story_id=story_id):
+            yield record.data()
+
+    def export(self, out_dir: str, story_id: Optional[str] = None, file_format: str = "csv") -> Dict[str, Any]:
+        """
+        Export the graph of story_id (or the whole database) to out_dir as "csv",
+        "parquet" or "arrow" files, plus a manifest.json listing files, row counts and
+        schema properties that were not exported. Returns the manifest.
+        """
+        if file_format not in ("csv", "parquet", "arrow"):
+            raise ValueError(f"Invalid format: {file_format}. Valid formats are: csv, parquet, arrow")
+        if file_format != "csv" and pyarrow is None:
+            raise RuntimeError("pyarrow is required for Parquet and Arrow export")
+        os.makedirs(out_dir, exist_ok=True)
+
+        manifest = {"format": file_format, "story_id": story_id, "nodes": [], "relationships": [],
+                    "array_delimiter": ARRAY_DELIMITER, "dropped_properties": {}}
+        with self.neo4j_builder.driver.session() as session:
+            labels, types = self._labels_and_types(session, story_id)
+            for label in labels:
+                columns = node_columns(label, self.nodes_schema)
+                rows = self._iter_nodes(session, label, story_id)
+                entry = self._write_table(out_dir, f"nodes_{label}", file_format, columns, rows, "node", label,
+                                          manifest["dropped_properties"])
+                manifest["nodes"].append(entry)
+            for relationship_type in types:
+                columns = relationship_columns(relationship_type, self.relationships_schema)
+                rows = self._iter_relationships(session, relationship_type, story_id)
+                entry = self._write_table(out_dir, f"relationships_{relationship_type}", file_format, columns, rows,
+                                          "relationship", relationship_type, manifest["dropped_properties"])
+                manifest["relationships"].append(entry)
+
+        if file_format == "csv":
+            manifest["neo4j_admin_command"] = " ".join(
+                ["neo4j-admin database import full", f"--array-delimiter='{ARRAY_DELIMITER}'"]
+                + [f"--nodes={entry['file']}" for entry in manifest["nodes"]]
+                + [f"--relationships={entry['file']}" for entry in manifest["relationships"]]
+                + ["<database>"]
+            )
+        with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _write_table(self, out_dir: str, name: str, file_format: str, columns: List[Tuple[str, str]],
+                     rows: Iterator[Dict[str, Any]], kind: str, label_or_type: str,
+                     dropped: Dict[str, int]) -> Dict[str, Any]:
+        known = {key for key, _ in columns}
+
+        def note_dropped(properties):
+            for key in properties:
+                if key not in known:
+                    dropped_key = f"{label_or_type}.{key}"
+                    dropped[dropped_key] = dropped.get(dropped_key, 0) + 1
+
+        if file_format == "csv":
+            filename = f"{name}.csv"
+            if kind == "node":
+                header = [":ID"] + [f"{key}:{column_type}" for key, column_type in columns] + [":LABEL"]
+            else:
+                header = [":START_ID", ":END_ID", ":TYPE"] + [f"{key}:{column_type}" for key, column_type in columns]
+            count = 0
+            with open(os.path.join(out_dir, filename), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                for row in rows:
+                    properties = row["properties"]
+                    note_dropped(properties)
+                    values = [_csv_value(properties.get(key), column_type) for key, column_type in columns]
+                    if kind == "node":
+                        writer.writerow([row["id"]] + values + [ARRAY_DELIMITER.join(row["labels"])])
+                    else:
+                        writer.writerow([row["source"], row["target"], label_or_type] + values)
+                    count += 1
+            return {"file": filename, "name": label_or_type, "count": count}
+
+        id_fields = NODE_ID_COLUMNS if kind == "node" else RELATIONSHIP_ID_COLUMNS
+        schema = pyarrow.schema([(key, _arrow_type(column_type)) for key, column_type in id_fields + columns])
+        filename = f"{name}.{'parquet' if file_format == 'parquet' else 'arrow'}"
+        path = os.path.join(out_dir, filename)
+        writer = pyarrow.parquet.ParquetWriter(path, schema) if file_format == "parquet" \
+            else pyarrow.ipc.new_file(path, schema)
+        count = 0
+        batch = []
+        try:
+            for row in rows:
+                properties = row["properties"]
+                note_dropped(properties)
+                if kind == "node":
+                    record = {"_id": row["id"], "_labels": row["labels"]}
+                else:
+                    record = {"_start_id": row["source"], "_end_id": row["target"], "_type": label_or_type}
+                for key, column_type in columns:
+                    record[key] = _arrow_value(properties.get(key), column_type)
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+        finally:
+            writer.close()
+        return {"file": filename, "name": label_or_type, "count": count}
+
+    # Import
+
+    def _iter_csv_batches(self, path: str) -> Iterator[Tuple[List[Tuple[str, str]], List[List[str]]]]:
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            columns = _parse_header(next(reader))
+            batch = []
+            for row in reader:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    yield columns, batch
+                    batch = []
+            if batch:
+                yield columns, batch
+
+    def _iter_file_rows(self, path: str, kind: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield batches of rows normalized to {"id", "labels", "properties"} for nodes or
+        {"start", "end", "type", "properties"} for relationships, from CSV or Arrow files
+        """
+        if path.endswith(".csv"):
+            for columns, batch in self._iter_csv_batches(path):
+                rows = []
+                for values in batch:
+                    row = {"properties": {}}
+                    for (name, column_type), text in zip(columns, values):
+                        if column_type.startswith("ID"):
+                            row["id"] = text
+                        elif column_type == "LABEL":
+                            row["labels"] = [label for label in text.split(ARRAY_DELIMITER) if label]
+                        elif column_type.startswith("START_ID"):
+                            row["start"] = text
+                        elif column_type.startswith("END_ID"):
+                            row["end"] = text
+                        elif column_type == "TYPE":
+                            row["type"] = text
+                        elif column_type != "IGNORE":
+                            value = _parse_csv_value(text, column_type)
+                            if value is not None:
+                                row["properties"][name] = value
+                    rows.append(row)
+                yield rows
+            return
+
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is required for Parquet and Arrow import")
+        if path.endswith(".parquet"):
+            batches = pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=self.batch_size)
+        else:
+            reader = pyarrow.ipc.open_file(path)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        id_keys = {key for key, _ in (NODE_ID_COLUMNS if kind == "node" else RELATIONSHIP_ID_COLUMNS)}
+        for record_batch in batches:
+            rows = []
+            for record in record_batch.to_pylist():
+                properties = {key: value for key, value in record.items() if key not in id_keys and value is not None}
+                if kind == "node":
+                    rows.append({"id": record["_id"], "labels": record["_labels"], "properties": properties})
+                else:
+                    rows.append({"start": record["_start_id"], "end": record["_end_id"], "type": record["_type"],
+                                 "properties": properties})
+            yield rows
+
+    def import_files(self, in_dir: str, story_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Import nodes_* and relationships_* files (CSV, Parquet or Arrow) from in_dir in batches.
+        Imported nodes get new element ids; story_id, if given, replaces their story_id.
+        Returns the number of nodes and relationships created.
+        """
+        node_files = sorted(glob.glob(os.path.join(in_dir, "nodes_*.*")))
+        relationship_files = sorted(glob.glob(os.path.join(in_dir, "relationships_*.*")))
+        created = {"nodes": 0, "relationships": 0}
+        overrides = {"story_id": story_id} if story_id is not None else {}
+
+        with self.neo4j_builder.driver.session() as session:
+            session.run(f"CREATE INDEX bulk_import_id IF NOT EXISTS FOR (n:{IMPORT_LABEL}) ON (n.{IMPORT_ID})").consume()
+            for path in node_files:
+                for rows in self._iter_file_rows(path, "node"):
+                    raise_if_cancelled()
+                    created["nodes"] += self._import_node_batch(session, rows, overrides)
+            for path in relationship_files:
+                for rows in self._iter_file_rows(path, "relationship"):
+                    raise_if_cancelled()
+                    created["relationships"] += self._import_relationship_batch(session, rows, overrides)
+            # Drop the temporary label and id in batches so large imports do not build one huge transaction
+            session.run(f"""
+                MATCH (n:{IMPORT_LABEL})
+                CALL {{
+                    WITH n
+                    REMOVE n:{IMPORT_LABEL}, n.{IMPORT_ID}
+                }} IN TRANSACTIONS OF {self.batch_size} ROWS
+            """).consume()
+        return created
+
+    def _import_node_batch(self, session, rows: List[Dict[str, Any]], overrides: Dict[str, Any]) -> int:
+        rows_by_labels = {}
+        for row in rows:
+            labels = tuple(row.get("labels") or ["Node"])
+            rows_by_labels.setdefault(labels, []).append({
+                "id": row["id"],
+                "properties": {**row["properties"], **overrides}
+            })
+        created = 0
+        for labels, label_rows in rows_by_labels.items():
+            label_expression = ":".join(_quote(label) for label in labels + (IMPORT_LABEL,))
+            cypher = f"""
+                UNWIND $rows AS row
+                CREATE (n:{label_expression})
+                SET n = row.properties, n.{IMPORT_ID} = row.id
+            """
+            created += session.run(cypher, rows=label_rows).consume().counters.nodes_created
+        return created
+
+    def _import_relationship_batch(self, session, rows: List[Dict[str, Any]], overrides: Dict[str, Any]) -> int:
+        rows_by_type = {}
+        for row in rows:
+            rows_by_type.setdefault(row["type"], []).append({
+                "start": row["start"],
+                "end": row["end"],
+                "properties": {**row["properties"], **overrides}
+            })
+        created = 0
+        for relationship_type, type_rows in rows_by_type.items():
+            cypher = f"""
+                UNWIND $rows AS row
+                MATCH (a:{IMPORT_LABEL} {{{IMPORT_ID}: row.start}})
+                MATCH (b:{IMPORT_LABEL} {{{IMPORT_ID}: row.end}})
+                CREATE (a)-[r:{_quote(relationship_type)}]->(b)
+                SET r = row.properties
+            """
+            created += session.run(cypher, rows=type_rows).consume().counters.relationships_created
+        return created
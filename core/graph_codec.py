@@ -0,0 +1,153 @@
+from typing import Dict, List, Any
+
+COLUMNAR_ENCODING = "columnar-v1"
+
+
+class _StringTable:
+    """Assigns a stable integer index to each distinct string"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self._index[value] = index
+            self.strings.append(value)
+        return index
+
+
+def _property_columns(rows: List[Dict], strings: _StringTable) -> List[List[Any]]:
+    """
+    Pivot a list of property dicts into [key_index, column] pairs.
+    Every column has one entry per row, None where the row lacks the key. When some
+    rows hold an explicit None for the key, a third element lists those row numbers,
+    so absent and null values stay distinct.
+    """
+    columns: Dict[str, List[Any]] = {}
+    nulls: Dict[str, List[int]] = {}
+    row_count = len(rows)
+    for row_number, properties in enumerate(rows):
+        for key, value in (properties or {}).items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * row_count
+            column[row_number] = value
+            if value is None:
+                nulls.setdefault(key, []).append(row_number)
+    return [
+        [strings.add(key), column, nulls[key]] if key in nulls else [strings.add(key), column]
+        for key, column in columns.items()
+    ]
+
+
+def to_columnar(graph_data: Dict[str, List[Dict]]) -> Dict[str, Any]:
+    """
+    Convert row-oriented graph data (as returned by Neo4jGraphBuilder.get_graph_data)
+    into a columnar layout:
+        - "strings": deduplicated table of labels, relationship types and property keys
+        - "nodes": the node id column, label indexes and property columns
+        - "relationships": source/target as integer row indexes into the node table,
+          type indexes and property columns
+    An endpoint that is not in the node table (e.g. outside a page of nodes) is listed in
+    the relationships' "external_ids", present only when needed, and indexed as node count
+    plus its position there, so every relationship is kept.
+    """
+    strings = _StringTable()
+    nodes = graph_data.get("nodes", [])
+    relationships = graph_data.get("relationships", [])
+
+    row_of = {}
+    node_ids = []
+    node_labels = []
+    for row_number, node in enumerate(nodes):
+        row_of[node["id"]] = row_number
+        node_ids.append(node["id"])
+        node_labels.append([strings.add(label) for label in node.get("labels", [])])
+
+    external_ids = []
+
+    def endpoint(node_id: str) -> int:
+        row_number = row_of.get(node_id)
+        if row_number is None:
+            row_number = row_of[node_id] = len(nodes) + len(external_ids)
+            external_ids.append(node_id)
+        return row_number
+
+    sources = []
+    targets = []
+    types = []
+    for rel in relationships:
+        sources.append(endpoint(rel["source"]))
+        targets.append(endpoint(rel["target"]))
+        types.append(strings.add(rel["type"]))
+    rel_table = {
+        "count": len(types),
+        "source": sources,
+        "target": targets,
+        "type": types,
+        "properties": _property_columns([rel.get("properties") for rel in relationships], strings)
+    }
+    if external_ids:
+        rel_table["external_ids"] = external_ids
+
+    return {
+        "encoding": COLUMNAR_ENCODING,
+        "nodes": {
+            "count": len(node_ids),
+            "id": node_ids,
+            "labels": node_labels,
+            "properties": _property_columns([node.get("properties") for node in nodes], strings)
+        },
+        "relationships": rel_table,
+        "strings": strings.strings
+    }
+
+
+def _rows_from_columns(count: int, columns: List[List[Any]], strings: List[str]) -> List[Dict]:
+    rows = [{} for _ in range(count)]
+    for key_index, column, *null_rows in columns:
+        key = strings[key_index]
+        for row_number, value in enumerate(column):
+            if value is not None:
+                rows[row_number][key] = value
+        for row_number in (null_rows[0] if null_rows else []):
+            rows[row_number][key] = None
+    return rows
+
+
+def from_columnar(columnar: Dict[str, Any]) -> Dict[str, List[Dict]]:
+    """Inverse of to_columnar, returning the row-oriented graph data"""
+    if columnar.get("encoding") != COLUMNAR_ENCODING:
+        raise ValueError(f"Unsupported graph encoding: {columnar.get('encoding')}")
+
+    strings = columnar["strings"]
+    node_table = columnar["nodes"]
+    rel_table = columnar["relationships"]
+
+    node_properties = _rows_from_columns(node_table["count"], node_table["properties"], strings)
+    nodes = [
+        {
+            "id": node_id,
+            "labels": [strings[index] for index in labels],
+            "properties": properties
+        }
+        for node_id, labels, properties in zip(node_table["id"], node_table["labels"], node_properties)
+    ]
+
+    rel_properties = _rows_from_columns(rel_table["count"], rel_table["properties"], strings)
+    node_ids = node_table["id"] + rel_table.get("external_ids", [])
+    relationships = [
+        {
+            "source": node_ids[source],
+            "target": node_ids[target],
+            "type": strings[type_index],
+            "properties": properties
+        }
+        for source, target, type_index, properties in zip(
+            rel_table["source"], rel_table["target"], rel_table["type"], rel_properties
+        )
+    ]
+    return {"nodes": nodes, "relationships": relationships}
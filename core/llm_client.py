@@ -3,19 +3,40 @@ import re
 import json
 import logging
 import threading
-from datetime import datetime
 import base64
-from typing import Dict, Any, Generator, List, Optional
-from openai import OpenAI
-from flask import jsonify
-from core.utils import clean_json_string
+from types import SimpleNamespace
+from typing import Dict, Any, Callable, Generator, List, Optional
+from core.utils import clean_json_string, salvage_truncated_json
+from core.single_flight import SingleFlight, request_key
+from core.llm_tiering import ModelTiering
+from core.cancellation import current_token, raise_if_cancelled
+from core.profiling import annotate, profiled, span
+from core.log_config import payload_fields
+
+RESPONSE_FORMATS = ("json_schema", "json_object", "none")
+# Default {LLM}_RESPONSE_FORMAT of providers known to accept response_format; others get plain completions
+RESPONSE_FORMAT_DEFAULTS = {"OPENAI": "json_schema"}
+CONTINUATION_PROMPT = (
+	"Your previous response was cut off at the output limit; the complete part of it is above. "
+	"Respond with JSON of the same structure containing only the remaining elements that are "
+	"not in it yet. Do not repeat elements that were already returned."
+)
+
+
+class LLMResponseError(Exception):
+	"""The LLM call failed or did not produce valid JSON"""
+
+
+class LLMOutputError(LLMResponseError):
+	"""The LLM answered, but its output was not valid JSON, was truncated or failed validation"""
+
 
 class LLMClient:
 	def __init__(self):
 		self.selected_llm_main = os.getenv('SELECTED_LLM_MAIN', 'OPENAI').upper()
 		self.selected_llm_nsfw = os.getenv('SELECTED_LLM_NSFW', 'GROK').upper()
-		print("selected_llm_main:", self.selected_llm_main)
-		print("selected_llm_nsfw:", self.selected_llm_nsfw)
+		self.logger = logging.getLogger(__name__)
+		self.logger.info(f"selected_llm_main: {self.selected_llm_main}, selected_llm_nsfw: {self.selected_llm_nsfw}")
 		
 		# Get configuration based on selected LLM
 		self.main_api_key = os.getenv(f'{self.selected_llm_main}_API_KEY')
@@ -32,36 +53,65 @@ class LLMClient:
 		if not all([self.nsfw_api_key, self.nsfw_api_base, self.nsfw_model]):
 			raise ValueError(f"Missing configuration for {self.selected_llm_nsfw}")
 
-		# Initialize main client
-		self.main_client = OpenAI(
-			api_key=self.main_api_key,
-			base_url=self.main_api_base,
-		)
+		# Structured output per provider ({LLM}_RESPONSE_FORMAT): json_schema, json_object or none
+		# (default: RESPONSE_FORMAT_DEFAULTS, else none). A provider that rejects response_format
+		# is switched to none on the first failure.
+		self.response_formats = {}
+		for provider in (self.selected_llm_main, self.selected_llm_nsfw):
+			response_format = os.getenv(f'{provider}_RESPONSE_FORMAT', RESPONSE_FORMAT_DEFAULTS.get(provider, 'none')).lower()
+			if response_format not in RESPONSE_FORMATS:
+				raise ValueError(f"Invalid {provider}_RESPONSE_FORMAT: {response_format}. Valid formats are: {', '.join(RESPONSE_FORMATS)}")
+			self.response_formats[provider] = response_format
+		# Follow-up requests for the rest of a response truncated at max_tokens
+		self.max_continuations = int(os.getenv('LLM_MAX_CONTINUATIONS', '2'))
 
-		# Initialize nsfw client
-		self.nsfw_client = OpenAI(
-			api_key=self.nsfw_api_key,
-			base_url=self.nsfw_api_base,
-		)
-		self.logger = logging.getLogger(__name__)
+		# Model per tier ({LLM}_MODEL_FAST / {LLM}_MODEL_STRONG, both default to {LLM}_MODEL);
+		# generate_json picks the tier and max_tokens per call, see ModelTiering
+		self.model_tiers = {}
+		for provider, model in ((self.selected_llm_main, self.main_model), (self.selected_llm_nsfw, self.nsfw_model)):
+			self.model_tiers[provider] = {
+				"fast": os.getenv(f'{provider}_MODEL_FAST', model),
+				"strong": os.getenv(f'{provider}_MODEL_STRONG', model)
+			}
+		self.tiering = ModelTiering()
+		# Retry a fast-tier call that produced invalid output on the strong tier
+		self.escalate_on_failure = os.getenv('LLM_ESCALATE_ON_FAILURE', '1') == '1'
+
+		# OpenAI clients are created on first use (see main_client / nsfw_client)
+		self._main_client = None
+		self._nsfw_client = None
+		self._client_lock = threading.Lock()
+		# Identical generate_json calls in flight at the same time share one API call
+		self._json_flights = SingleFlight()
 		self.cancel_event = threading.Event()
-		
-		# Set up error logging to file
-		self.setup_error_logging()
 
-	def setup_error_logging(self):
-		"""Setup logging to write errors to a file in the data folder"""
-		log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'logs')
-		os.makedirs(log_dir, exist_ok=True)
-		
-		error_log_file = os.path.join(log_dir, 'llm_errors.log')
-		file_handler = logging.FileHandler(error_log_file)
-		file_handler.setLevel(logging.ERROR)
-		
-		formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-		file_handler.setFormatter(formatter)
-		
-		self.logger.addHandler(file_handler)
+	def _create_client(self, api_key: str, api_base: str):
+		# Imported here because the openai package alone takes most of the app's import time
+		from openai import OpenAI
+		return OpenAI(
+			api_key=api_key,
+			base_url=api_base,
+		)
+
+	@property
+	def main_client(self):
+		if self._main_client is None:
+			with self._client_lock:
+				if self._main_client is None:
+					self._main_client = self._create_client(self.main_api_key, self.main_api_base)
+		return self._main_client
+
+	@property
+	def nsfw_client(self):
+		if self._nsfw_client is None:
+			with self._client_lock:
+				if self._nsfw_client is None:
+					self._nsfw_client = self._create_client(self.nsfw_api_key, self.nsfw_api_base)
+		return self._nsfw_client
+
+	def warm_up(self):
+		"""Create both OpenAI clients ahead of the first request"""
+		return self.main_client is not None and self.nsfw_client is not None
 
 	def _get_client_and_model(self, model: str = None, nsfw: bool = False):
 		"""
@@ -76,9 +126,14 @@ class LLMClient:
 		self.cancel_event.clear()
 
 	def cancel_generation(self):
-		print("CANCEL_GENERATION")
+		"""Cancel every text stream of this client; per-request cancellation uses core.cancellation tokens"""
+		self.logger.debug("CANCEL_GENERATION")
 		self.cancel_event.set()
 
+	def _generation_cancelled(self) -> bool:
+		token = current_token()
+		return self.cancel_event.is_set() or (token is not None and token.cancelled)
+
 	def get_available_models(self) -> List[str]:
 		"""
 		Get the list of available models.
@@ -104,40 +159,235 @@ class LLMClient:
 			return self.nsfw_client, self.nsfw_model
 		return self.main_client, model or self.main_model
 
+	@profiled("LLMClient.generate_json")
 	def generate_json(
 		self,
 		prompt: str,
 		system_prompt: str,
 		model: str = None,
 		temperature: float = 0.7,
-		max_tokens: int = 10000,
+		max_tokens: Optional[int] = None,
 		nsfw: bool = False,
-	) -> Dict[str, Any]:
-		client, model = self._get_client_and_model(model, nsfw)
-		print("generate_json:", model)
+		response_schema: Optional[Dict[str, Any]] = None,
+		prompt_name: Optional[str] = None,
+		validate: Optional[Callable[[Any], None]] = None,
+	) -> str:
+		"""
+		Generate a JSON response and return it as a string.
+
+		Unless model / max_tokens are given, the model tier and token limit are chosen
+		from the input size and the output size learned for prompt_name (see
+		ModelTiering). If a fast-tier response is not valid JSON, is truncated before any
+		complete element or validate(data) raises ValueError (LLMOutputError), the call is
+		retried once on the strong tier; connection and API errors are not retried.
+
+		Uses the provider's structured-output mode when enabled (json_schema when a
+		response_schema is given, otherwise json_object). If the response is cut off at
+		max_tokens, its complete array elements are kept and up to max_continuations
+		follow-up requests ask for the remaining elements, which are merged in.
+		Raises LLMOutputError if no valid JSON could be produced, LLMResponseError if the
+		request failed, and OperationCancelled if the current cancellation token is cancelled.
+		"""
+		raise_if_cancelled()
+		provider = self.selected_llm_nsfw if nsfw else self.selected_llm_main
+		client = self.nsfw_client if nsfw else self.main_client
+		if nsfw:
+			# The NSFW provider always uses its own models
+			model = None
+		input_chars = len(prompt) + len(system_prompt)
+		plan = self.tiering.plan(prompt_name, input_chars)
+		annotate(prompt_name=prompt_name, tier=plan.tier, input_chars=input_chars)
 		try:
-			response = client.chat.completions.create(
-				model=model,
-				messages=[
-					{"role": "system", "content": system_prompt},
-					{"role": "user", "content": prompt}
-				],
-				temperature=temperature,
-				max_tokens=max_tokens
-			)
-			
-			content = response.choices[0].message.content
-			content = clean_json_string(content)
-			
-			return content
+			return self._generate_validated_json(client, provider, model, plan, prompt, system_prompt, temperature,
+												 max_tokens, response_schema, prompt_name, validate)
+		except LLMOutputError as e:
+			tiers = self.model_tiers[provider]
+			if model or not self.escalate_on_failure or plan.tier != "fast" or tiers["fast"] == tiers["strong"]:
+				raise
+			self.logger.warning(f"Escalating {prompt_name or 'generate_json'} to {tiers['strong']} after: {e}")
+			return self._generate_validated_json(client, provider, model, self.tiering.escalated(plan), prompt,
+												 system_prompt, temperature, max_tokens, response_schema,
+												 prompt_name, validate)
+
+	def _generate_validated_json(self, client, provider: str, model: Optional[str], plan, prompt: str,
+								 system_prompt: str, temperature: float, max_tokens: Optional[int],
+								 response_schema: Optional[Dict[str, Any]], prompt_name: Optional[str],
+								 validate: Optional[Callable[[Any], None]]) -> str:
+		model = model or self.model_tiers[provider][plan.tier]
+		max_tokens = max_tokens or plan.max_tokens
+		key = request_key(model, provider, system_prompt, prompt, temperature, max_tokens, response_schema)
+		content = self._json_flights.do(key, self._generate_json, client, provider, model, prompt, system_prompt,
+										temperature, max_tokens, response_schema, prompt_name)
+		if validate is not None:
+			try:
+				validate(json.loads(content))
+			except ValueError as e:
+				raise LLMOutputError(f"Response failed validation: {e}") from e
+		return content
 
-		except json.JSONDecodeError as e:
-			self.logger.error(f"Failed to parse response as JSON: {e}")
-			return jsonify({'error': "Failed to generate valid JSON response"}), 500
+	def _response_format(self, provider: str, response_schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+		response_format = self.response_formats.get(provider, "none")
+		if response_format == "json_schema" and response_schema is not None:
+			return {
+				"type": "json_schema",
+				"json_schema": {"name": response_schema.get("title", "response"), "schema": response_schema}
+			}
+		if response_format in ("json_schema", "json_object"):
+			return {"type": "json_object"}
+		return None
 
+	def _create_json_completion(self, client, provider: str, model: str, messages: List[Dict[str, str]],
+								temperature: float, max_tokens: int, response_schema: Optional[Dict[str, Any]]):
+		response_format = self._response_format(provider, response_schema)
+		params = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+		try:
+			return self._complete(client, **params, **({"response_format": response_format} if response_format else {}))
+		except Exception as e:
+			if not response_format or "response_format" not in str(e):
+				raise
+			self.logger.warning(f"{provider} rejected response_format, falling back to plain completions: {e}")
+			self.response_formats[provider] = "none"
+			return self._complete(client, **params)
+
+	@profiled()
+	def _complete(self, client, **params):
+		"""
+		A chat completion. Under a cancellation token (core.cancellation) the completion
+		is streamed instead, and cancelling the token closes the HTTP stream, so the
+		request stops consuming the provider and this thread immediately. The streamed
+		chunks are assembled into a response with the same shape as a blocking one.
+		"""
+		annotate(model=params.get("model"), max_tokens=params.get("max_tokens"))
+		token = current_token()
+		if token is None:
+			response = client.chat.completions.create(**params)
+			self._annotate_usage(response)
+			return response
+
+		token.raise_if_cancelled()
+		stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **params)
+		unregister = token.on_cancel(stream.close)
+		content = []
+		finish_reason = None
+		usage = None
+		try:
+			for chunk in stream:
+				token.raise_if_cancelled()
+				if chunk.choices:
+					choice = chunk.choices[0]
+					if choice.delta and choice.delta.content:
+						content.append(choice.delta.content)
+					finish_reason = choice.finish_reason or finish_reason
+				if getattr(chunk, "usage", None):
+					usage = chunk.usage
+		except Exception:
+			# Closing the stream from cancel() surfaces here as a connection error
+			token.raise_if_cancelled()
+			raise
+		finally:
+			unregister()
+			stream.close()
+		token.raise_if_cancelled()
+		message = SimpleNamespace(content="".join(content))
+		response = SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+		self._annotate_usage(response)
+		return response
+
+	@staticmethod
+	def _annotate_usage(response) -> None:
+		"""Record token usage and finish reason on the current profile span (see core.profiling)"""
+		usage = getattr(response, "usage", None)
+		annotate(
+			prompt_tokens=getattr(usage, "prompt_tokens", None),
+			completion_tokens=getattr(usage, "completion_tokens", None),
+			finish_reason=response.choices[0].finish_reason if response.choices else None
+		)
+
+	def _generate_json(self, client, provider: str, model: str, prompt: str, system_prompt: str,
+					   temperature: float, max_tokens: int, response_schema: Optional[Dict[str, Any]],
+					   prompt_name: Optional[str] = None) -> str:
+		self.logger.debug(f"generate_json: {model} {max_tokens}")
+		input_chars = len(prompt) + len(system_prompt)
+		messages = [
+			{"role": "system", "content": system_prompt},
+			{"role": "user", "content": prompt}
+		]
+		try:
+			response = self._create_json_completion(client, provider, model, messages, temperature, max_tokens, response_schema)
 		except Exception as e:
 			self.logger.error(f"Error in generate_json: {str(e)}")
-			return jsonify({'error': "An error occurred while processing the request"}), 500
+			raise LLMResponseError(f"An error occurred while processing the request: {e}") from e
+
+		choice = response.choices[0]
+		content = clean_json_string(choice.message.content or "")
+		output_tokens = self._completion_tokens(response)
+		if choice.finish_reason != "length":
+			self.tiering.observe(prompt_name, input_chars, output_tokens)
+			try:
+				with span("LLMClient.parse_json", chars=len(content)):
+					json.loads(content)
+			except json.JSONDecodeError as e:
+				self.logger.error(f"Failed to parse response as JSON: {e}")
+				raise LLMOutputError(f"Failed to generate valid JSON response: {e}") from e
+			return content
+
+		with span("LLMClient.salvage_json", chars=len(content)):
+			result = salvage_truncated_json(content)
+		if result is None:
+			self.tiering.observe(prompt_name, input_chars, output_tokens, truncated=True)
+			self.logger.error("Response truncated at max_tokens before any complete element")
+			raise LLMOutputError(f"Response truncated at max_tokens ({max_tokens}) before any complete element")
+
+		for continuation in range(self.max_continuations):
+			self.logger.debug(f"generate_json: continuing truncated response ({continuation + 1}/{self.max_continuations})")
+			continuation_messages = messages + [
+				{"role": "assistant", "content": json.dumps(result)},
+				{"role": "user", "content": CONTINUATION_PROMPT}
+			]
+			try:
+				response = self._create_json_completion(client, provider, model, continuation_messages,
+														temperature, max_tokens, response_schema)
+			except Exception as e:
+				self.logger.error(f"Error in generate_json continuation: {str(e)}")
+				break
+			choice = response.choices[0]
+			content = clean_json_string(choice.message.content or "")
+			output_tokens += self._completion_tokens(response)
+			if choice.finish_reason == "length":
+				remainder = salvage_truncated_json(content)
+			else:
+				try:
+					remainder = json.loads(content)
+				except json.JSONDecodeError as e:
+					self.logger.error(f"Failed to parse continuation as JSON: {e}")
+					break
+			if remainder is None:
+				break
+			result = self._merge_json(result, remainder)
+			if choice.finish_reason != "length":
+				break
+		self.tiering.observe(prompt_name, input_chars, output_tokens, truncated=choice.finish_reason == "length")
+		return json.dumps(result)
+
+	@staticmethod
+	def _completion_tokens(response) -> int:
+		usage = getattr(response, "usage", None)
+		return getattr(usage, "completion_tokens", None) or 0
+
+	@staticmethod
+	def _merge_json(result: Any, remainder: Any) -> Any:
+		"""Append the array elements of a continuation response to the salvaged response"""
+		if isinstance(result, list) and isinstance(remainder, list):
+			return result + remainder
+		if isinstance(result, dict) and isinstance(remainder, dict):
+			merged = dict(result)
+			for key, value in remainder.items():
+				if isinstance(merged.get(key), list) and isinstance(value, list):
+					merged[key] = merged[key] + value
+				else:
+					merged.setdefault(key, value)
+			return merged
+		return result
 
 	def _validate_json_schema(self, data: Dict[str, Any], schema: Dict[str, Any]) -> None:
 		"""
@@ -161,7 +411,7 @@ class LLMClient:
 	# You can add other methods from the original app.py here, such as:
 	def generate_text(self, prompt: str, system_prompt: str, model: str = None, temperature: float = 0.7, max_tokens: int = 1000, nsfw: bool = False):
 		client, model = self._get_client_and_model(model, nsfw)
-		print("generate_text:", model)
+		self.logger.debug(f"generate_text: {model}")
 		response = client.chat.completions.create(
 			model=model,
 			messages=[
@@ -183,7 +433,7 @@ class LLMClient:
 		nsfw: bool = False,
 	) -> Generator[Dict[str, Any], None, None]:
 		client, model = self._get_client_and_model(model, nsfw)
-		print("generate_streamed_json:", model)
+		self.logger.debug(f"generate_streamed_json: {model}")
 		try:
 			response = client.chat.completions.create(
 				model=model,
@@ -211,7 +461,7 @@ class LLMClient:
 		nsfw: bool = False
 	) -> Generator[Dict[str, Any], None, None]:
 		client, model = self._get_client_and_model(model, nsfw)
-		print("generate_streamed_text:", model)
+		self.logger.debug(f"generate_streamed_text: {model}")
 		try:
 			response = client.chat.completions.create(
 				model=model,
@@ -225,8 +475,8 @@ class LLMClient:
 				timeout=10,
 				stream_options={"include_usage": True}
 			)
-			if self.cancel_event.is_set():
-				print("CANCELLED")
+			if self._generation_cancelled():
+				self.logger.debug("CANCELLED")
 				yield {"chunk": "[CANCELLED]"}
 				return
 			yield from self._process_text_stream(response, prompt)
@@ -235,7 +485,6 @@ class LLMClient:
 			yield {"error": f"An error occurred: {str(e)}"}
 	
 	def _process_json_stream(self, response):
-		print(response)
 		json_buffer = ""
 		for chunk in response:
 			if chunk.choices and chunk.choices[0].delta.content:
@@ -283,7 +532,8 @@ class LLMClient:
 		
 		try:
 			for chunk in response:
-				if self.cancel_event.is_set():
+				if self._generation_cancelled():
+					response.close()
 					yield {"chunk": "[CANCELLED]"}
 					return
 
@@ -297,11 +547,7 @@ class LLMClient:
 						msg = msg.replace('}{', '} {')  # Split adjacent JSON objects
 						msg = re.sub(r'}\s*{', '} {', msg)  # Handle cases with whitespace
 					else:
-						error_msg = (
-							f"Error processing prompt: {prompt}\n"
-						)
-						self.logger.error(error_msg)
-						self._write_error_to_file(error_msg)
+						self.logger.error("Error processing prompt: empty chunk", extra=payload_fields(prompt=prompt))
 						continue
 						
 						# Check for "I'm sorry" at the beginning of the response
@@ -347,30 +593,15 @@ class LLMClient:
 			yield {"chunk": "[DONE]"}
 			
 		except Exception as e:
-			# Log the error along with the full response
-			error_msg = (
-				f"Error processing stream: {str(e)}\n"
-				f"Error type: {type(e).__name__}\n"
-				f"Full response received:\n{full_response}\n"
-				f"Current sentence buffer:\n{current_sentence}"
-				f"Prompt:\n{prompt}"
+			# Log the error along with the response so far (long payloads are sampled, see core.log_config)
+			self.logger.error(
+				f"Error processing stream: {e}",
+				extra={"error_type": type(e).__name__,
+					   **payload_fields(response=full_response, sentence_buffer=current_sentence, prompt=prompt)}
 			)
-			# self.logger.error(error_msg)
-			self._write_error_to_file(error_msg)
 			# Instead of raising, we'll yield an error message
 			yield {"error": f"An error occurred: {str(e)}"}
 	
-	def _write_error_to_file(self, error_msg):
-		"""Write detailed error information to a timestamped file"""
-		log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'logs', 'errors')
-		os.makedirs(log_dir, exist_ok=True)
-		
-		timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-		error_file = os.path.join(log_dir, f'error_{timestamp}.log')
-		
-		with open(error_file, 'w') as f:
-			f.write(error_msg)
-
 	def generate_voice(
 		self,
 		messages: List[Dict[str, Any]],
@@ -0,0 +1,71 @@
+import os
+import threading
+from typing import Dict, NamedTuple, Optional
+
+# Rough characters-per-token ratio for English prose and JSON
+CHARS_PER_TOKEN = 4
+
+
+class TierPlan(NamedTuple):
+    tier: str
+    max_tokens: int
+
+
+class ModelTiering:
+    """
+    Chooses a model tier ("fast" or "strong") and a max_tokens limit for a JSON call.
+
+    The output size of each prompt (by prompt name) is learned as an exponentially
+    weighted moving average of completion tokens per input character, observed from the
+    usage of earlier calls. max_tokens is that estimate times LLM_OUTPUT_HEADROOM,
+    clamped to [LLM_MIN_MAX_TOKENS, LLM_MAX_MAX_TOKENS]; prompts without observations
+    yet get LLM_MAX_MAX_TOKENS. Calls whose input fits LLM_FAST_MAX_INPUT_TOKENS and whose
+    expected output fits LLM_FAST_MAX_OUTPUT_TOKENS use the fast tier, the rest the
+    strong tier; without observations the input size alone decides.
+    """
+
+    def __init__(self):
+        self.fast_max_input_tokens = int(os.getenv('LLM_FAST_MAX_INPUT_TOKENS', '3000'))
+        self.fast_max_output_tokens = int(os.getenv('LLM_FAST_MAX_OUTPUT_TOKENS', '2000'))
+        self.min_max_tokens = int(os.getenv('LLM_MIN_MAX_TOKENS', '1024'))
+        self.max_max_tokens = int(os.getenv('LLM_MAX_MAX_TOKENS', '10000'))
+        self.headroom = float(os.getenv('LLM_OUTPUT_HEADROOM', '1.5'))
+        self.smoothing = float(os.getenv('LLM_OUTPUT_SMOOTHING', '0.3'))
+        self._ratios: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def estimate_output_tokens(self, prompt_name: Optional[str], input_chars: int) -> Optional[int]:
+        """Expected completion tokens, or None when nothing was observed for this prompt yet"""
+        ratio = self._ratios.get(prompt_name) if prompt_name else None
+        if ratio is None:
+            return None
+        return int(ratio * input_chars)
+
+    def plan(self, prompt_name: Optional[str], input_chars: int) -> TierPlan:
+        expected = self.estimate_output_tokens(prompt_name, input_chars)
+        if expected is None:
+            max_tokens = self.max_max_tokens
+        else:
+            max_tokens = min(self.max_max_tokens, max(self.min_max_tokens, int(expected * self.headroom)))
+        input_tokens = input_chars // CHARS_PER_TOKEN
+        fits_fast = input_tokens <= self.fast_max_input_tokens and (
+            expected is None or expected <= self.fast_max_output_tokens
+        )
+        return TierPlan("fast" if fits_fast else "strong", max_tokens)
+
+    def escalated(self, plan: TierPlan) -> TierPlan:
+        """The plan for retrying a failed fast-tier call on the strong tier"""
+        return TierPlan("strong", min(self.max_max_tokens, plan.max_tokens * 2))
+
+    def observe(self, prompt_name: Optional[str], input_chars: int, output_tokens: int, truncated: bool = False) -> None:
+        """
+        Record the completion tokens of a finished call. A truncated output only gives a
+        lower bound, so it is counted with the headroom added to push the estimate up.
+        """
+        if not prompt_name or input_chars <= 0 or output_tokens <= 0:
+            return
+        ratio = output_tokens * (self.headroom if truncated else 1.0) / input_chars
+        with self._lock:
+            previous = self._ratios.get(prompt_name)
+            self._ratios[prompt_name] = ratio if previous is None else \
+                previous + self.smoothing * (ratio - previous)
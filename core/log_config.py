@@ -0,0 +1,196 @@
+"""
+Process-wide logging: request threads only enqueue records, and a single
+QueueListener thread formats and writes them.
+
+setup_logging() attaches a QueueHandler to the root logger and starts a listener with:
+    - the console (text, LOG_LEVEL, default INFO)
+    - data/logs/app.jsonl: JSON records at LOG_FILE_LEVEL (default INFO), rotated
+      at LOG_ROTATE_WHEN (default midnight), LOG_BACKUP_COUNT files kept
+    - data/logs/errors.jsonl: JSON records at ERROR and above, rotated at
+      LOG_MAX_BYTES (default 10 MB), LOG_BACKUP_COUNT (default 5) files kept
+With LOG_FILE_PER_PROCESS=1 (the default under gunicorn.conf.py and for process-pool
+ingests) each process writes app.<pid>.jsonl and errors.<pid>.jsonl instead, since
+rotation is not safe with several processes writing the same file.
+The queue holds at most LOG_QUEUE_SIZE records; when the writer falls behind
+(e.g. an error storm on a slow disk), further records are dropped and counted
+instead of blocking the caller. It is safe to call setup_logging() repeatedly
+and after a fork: it sets up once per process. Entry points call it (app.py,
+gunicorn.conf.py and the scripts); library code only gets loggers.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'logs')
+
+# Attributes every LogRecord has; anything else was passed through extra= and goes into the JSON record
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_setup_lock = threading.Lock()
+_setup_pid: Optional[int] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, thread, message and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but the traceback stays a field of its own for JsonFormatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        with self._dropped_lock:
+            dropped = self.dropped
+        try:
+            if dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"Dropped {dropped} log records: the log queue was full",
+                }))
+                with self._dropped_lock:
+                    self.dropped -= dropped
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # The queue may be full of records; wait for room rather than lose the stop signal
+        self.queue.put(self._sentinel)
+
+
+def sample_payload(text: Any, max_chars: Optional[int] = None, sample_rate: Optional[float] = None) -> Optional[str]:
+    """
+    A prompt or response for a log record. Payloads over LOG_PAYLOAD_MAX_CHARS
+    (default 2000) are kept whole for a LOG_PAYLOAD_SAMPLE_RATE fraction (default
+    0.05) of records; otherwise only their head and tail are kept.
+    """
+    if text is None:
+        return None
+    text = str(text)
+    max_chars = max_chars or int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '2000'))
+    if sample_rate is None:
+        sample_rate = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.05'))
+    if len(text) <= max_chars or random.random() < sample_rate:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n...[{len(text) - 2 * half} chars omitted]...\n{text[-half:]}"
+
+
+def payload_fields(**payloads: Any) -> Dict[str, Optional[str]]:
+    """extra= fields for a log record, each payload passed through sample_payload"""
+    return {name: sample_payload(value) for name, value in payloads.items()}
+
+
+def _file_name(name: str) -> str:
+    # Processes each write their own files with LOG_FILE_PER_PROCESS=1, so rotations do not race
+    if os.getenv('LOG_FILE_PER_PROCESS', '0') == '1':
+        return os.path.join(LOG_DIR, f"{name}.{os.getpid()}.jsonl")
+    return os.path.join(LOG_DIR, f"{name}.jsonl")
+
+
+def setup_logging() -> None:
+    """Set up the queue-backed logging pipeline of this process (no-op if already done)"""
+    global _setup_pid, _listener, _queue_handler
+    with _setup_lock:
+        if _setup_pid == os.getpid():
+            return
+        root = logging.getLogger()
+        if _queue_handler is not None:
+            # Forked from a process that had set up logging: its listener thread did not survive the fork
+            root.removeHandler(_queue_handler)
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+        file_level = logging.getLevelName(os.getenv('LOG_FILE_LEVEL', 'INFO').upper())
+        backup_count = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+        console = logging.StreamHandler()
+        console.setLevel(level)
+        console.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+        app_file = logging.handlers.TimedRotatingFileHandler(
+            _file_name("app"), when=os.getenv('LOG_ROTATE_WHEN', 'midnight'), backupCount=backup_count,
+            encoding="utf-8", delay=True
+        )
+        app_file.setLevel(file_level)
+        app_file.setFormatter(JsonFormatter())
+
+        error_file = logging.handlers.RotatingFileHandler(
+            _file_name("errors"), maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+            backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        error_file.setLevel(logging.ERROR)
+        error_file.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _listener = _QueueListener(
+            log_queue, console, app_file, error_file, respect_handler_level=True
+        )
+        _listener.start()
+
+        # Records reach the queue only through the root logger; console output now goes through the listener too
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(min(level, file_level))
+        _setup_pid = os.getpid()
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the listener"""
+    global _setup_pid
+    with _setup_lock:
+        if _listener is not None and _setup_pid == os.getpid():
+            _listener.stop()
+            logging.getLogger().removeHandler(_queue_handler)
+            _setup_pid = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,387 @@
+import copy
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.cancellation import raise_if_cancelled
+from core.neo4j_graph_builder import (CHUNK_PROPERTIES, Neo4jGraphBuilder, chunk_properties_entries,
+                                      decode_neighborhood_cursor, decode_node_cursor, encode_cursor,
+                                      retracted_properties, strip_internal)
+
+
+class InMemoryGraphBuilder:
+    """
+    A process-local stand-in for Neo4jGraphBuilder with the same methods and return
+    formats, for load tests and local runs without a database (GRAPH_BUILDER=memory).
+    Every query sleeps MEMORY_GRAPH_LATENCY_MS (default 0) to model a database round
+    trip. Data is per process and lost on restart.
+    """
+
+    BATCH_SIZE = Neo4jGraphBuilder.BATCH_SIZE
+    MAX_NEIGHBORHOOD_DEPTH = Neo4jGraphBuilder.MAX_NEIGHBORHOOD_DEPTH
+    MAX_NEIGHBORHOOD_NODES = Neo4jGraphBuilder.MAX_NEIGHBORHOOD_NODES
+    MAX_PAGE_SIZE = Neo4jGraphBuilder.MAX_PAGE_SIZE
+
+    def __init__(self):
+        self.latency = float(os.getenv('MEMORY_GRAPH_LATENCY_MS', '0')) / 1000
+        self._lock = threading.RLock()
+        self._next_id = 0
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self._relationships: Dict[str, Dict[str, Any]] = {}
+        # Relationship ids by node id, both directions
+        self._adjacency: Dict[str, set] = {}
+        # Incremental story chunk fingerprints: {story_id: {hash: position}}
+        self._story_chunks: Dict[str, Dict[str, int]] = {}
+        # Analytics summaries by scope (see save_analytics)
+        self._analytics: Dict[str, Dict] = {}
+
+    def _round_trip(self) -> None:
+        raise_if_cancelled()
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _new_id(self) -> str:
+        self._next_id += 1
+        # Zero-padded so that ids sort in creation order, as the paging cursors expect
+        return f"mem:{self._next_id:012d}"
+
+    def _node_data(self, node_id: str) -> Dict[str, Any]:
+        node = self._nodes[node_id]
+        return {"id": node_id, "labels": list(node["labels"]), "properties": strip_internal(node["properties"], True)}
+
+    def _relationship_data(self, relationship_id: str) -> Dict[str, Any]:
+        rel = self._relationships[relationship_id]
+        return {"source": rel["source"], "target": rel["target"], "type": rel["type"],
+                "properties": dict(rel["properties"])}
+
+    def _add_node(self, labels: List[str], properties: Dict) -> str:
+        node_id = self._new_id()
+        self._nodes[node_id] = {"labels": list(labels), "properties": {k: v for k, v in properties.items() if v is not None}}
+        self._adjacency[node_id] = set()
+        return node_id
+
+    def _add_relationship(self, source: str, target: str, relationship_type: str, properties: Dict) -> Optional[str]:
+        if source not in self._nodes or target not in self._nodes:
+            return None
+        relationship_id = self._new_id()
+        self._relationships[relationship_id] = {
+            "source": source, "target": target, "type": relationship_type,
+            "properties": {k: v for k, v in (properties or {}).items() if v is not None}
+        }
+        self._adjacency[source].add(relationship_id)
+        self._adjacency[target].add(relationship_id)
+        return relationship_id
+
+    def _delete_node(self, node_id: str) -> None:
+        for relationship_id in self._adjacency.pop(node_id, set()):
+            self._delete_relationship(relationship_id)
+        self._nodes.pop(node_id, None)
+
+    def _delete_relationship(self, relationship_id: str) -> None:
+        rel = self._relationships.pop(relationship_id, None)
+        if rel is None:
+            return
+        for node_id in (rel["source"], rel["target"]):
+            self._adjacency.get(node_id, set()).discard(relationship_id)
+
+    def warm_up(self, connections: int = None) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def test_connection(self) -> bool:
+        return True
+
+    def create_node(self, label: str, properties: Dict) -> Dict:
+        self._round_trip()
+        with self._lock:
+            node_id = self._add_node([label], properties)
+            return {"elementId": node_id, "properties": dict(self._nodes[node_id]["properties"])}
+
+    def create_relationship(self, from_node_id: str, to_node_id: str,
+                            relationship_type: str, properties: Dict = {}) -> Optional[Dict]:
+        self._round_trip()
+        with self._lock:
+            relationship_id = self._add_relationship(from_node_id, to_node_id, relationship_type, properties)
+            return self._relationship_data(relationship_id) if relationship_id else None
+
+    def create_nodes(self, label: str, rows: List[Dict]) -> List[Dict]:
+        created = []
+        for start in range(0, len(rows), self.BATCH_SIZE):
+            self._round_trip()
+            with self._lock:
+                for row in rows[start:start + self.BATCH_SIZE]:
+                    node_id = self._add_node([label], row["properties"])
+                    created.append({"key": row["key"], "elementId": node_id,
+                                    "properties": dict(self._nodes[node_id]["properties"])})
+        return created
+
+    def create_relationships(self, relationship_type: str, rows: List[Dict]) -> List[Dict]:
+        created = []
+        for start in range(0, len(rows), self.BATCH_SIZE):
+            self._round_trip()
+            with self._lock:
+                for row in rows[start:start + self.BATCH_SIZE]:
+                    relationship_id = self._add_relationship(row["source"], row["target"], relationship_type,
+                                                             row.get("properties"))
+                    if relationship_id:
+                        created.append(self._relationship_data(relationship_id))
+        return created
+
+    def get_node_by_id(self, node_id: str) -> Optional[Dict]:
+        self._round_trip()
+        with self._lock:
+            return self._node_data(node_id) if node_id in self._nodes else None
+
+    def get_nodes_by_label(self, label: str) -> List[Dict]:
+        self._round_trip()
+        with self._lock:
+            return [self._node_data(node_id) for node_id, node in self._nodes.items() if label in node["labels"]]
+
+    def get_nodes_by_label_page(self, label: str, limit: int = 100, cursor: Optional[str] = None,
+                                story_id: Optional[str] = None) -> Dict[str, Any]:
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        after = decode_node_cursor(cursor) if cursor else None
+        self._round_trip()
+        with self._lock:
+            node_ids = sorted(
+                node_id for node_id, node in self._nodes.items()
+                if label in node["labels"]
+                and (after is None or node_id > after)
+                and (story_id is None or node["properties"].get("story_id") == story_id)
+            )
+            nodes = [self._node_data(node_id) for node_id in node_ids[:limit + 1]]
+        next_cursor = encode_cursor(nodes[limit - 1]["id"]) if len(nodes) > limit else None
+        return {"nodes": nodes[:limit], "cursor": next_cursor}
+
+    def _neighbor_distances(self, node_id: str, depth: int, relationship_types: Optional[List[str]],
+                            story_id: Optional[str]) -> Tuple[List[Tuple[int, str]], bool]:
+        visited = {node_id}
+        distances = []
+        frontier = [node_id]
+        for distance in range(1, depth + 1):
+            self._round_trip()
+            cap = self.MAX_NEIGHBORHOOD_NODES - len(distances)
+            next_frontier = set()
+            with self._lock:
+                for frontier_id in frontier:
+                    for relationship_id in self._adjacency.get(frontier_id, ()):
+                        rel = self._relationships[relationship_id]
+                        if relationship_types is not None and rel["type"] not in relationship_types:
+                            continue
+                        neighbor_id = rel["target"] if rel["source"] == frontier_id else rel["source"]
+                        if story_id is not None and self._nodes[neighbor_id]["properties"].get("story_id") != story_id:
+                            continue
+                        if neighbor_id not in visited:
+                            next_frontier.add(neighbor_id)
+            visited.update(next_frontier)
+            frontier = sorted(next_frontier)
+            distances.extend((distance, neighbor_id) for neighbor_id in frontier[:cap])
+            if len(frontier) > cap:
+                return distances, True
+            if not frontier:
+                break
+        return distances, False
+
+    def get_neighborhood(self, node_id: str, depth: int = 1, relationship_types: Optional[List[str]] = None,
+                         limit: int = 100, cursor: Optional[str] = None,
+                         story_id: Optional[str] = None) -> Dict[str, Any]:
+        """Same paging contract as Neo4jGraphBuilder.get_neighborhood"""
+        depth = max(1, min(depth, self.MAX_NEIGHBORHOOD_DEPTH))
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        after = decode_neighborhood_cursor(cursor) if cursor else None
+
+        distances, truncated = self._neighbor_distances(node_id, depth, relationship_types, story_id)
+        start = 0
+        if after is not None:
+            while start < len(distances) and distances[start] <= after:
+                start += 1
+        page = distances[start:start + limit]
+        page_ids = [neighbor_id for _, neighbor_id in page]
+        if after is None:
+            page_ids.insert(0, node_id)
+        known_ids = {node_id} | {neighbor_id for _, neighbor_id in distances[:start + limit]}
+
+        self._round_trip()
+        with self._lock:
+            nodes = [self._node_data(page_id) for page_id in page_ids if page_id in self._nodes]
+            relationship_ids = set()
+            for page_id in page_ids:
+                for relationship_id in self._adjacency.get(page_id, ()):
+                    rel = self._relationships[relationship_id]
+                    other_id = rel["target"] if rel["source"] == page_id else rel["source"]
+                    if other_id in known_ids and (relationship_types is None or rel["type"] in relationship_types):
+                        relationship_ids.add(relationship_id)
+            relationships = [self._relationship_data(relationship_id) for relationship_id in sorted(relationship_ids)]
+
+        next_cursor = encode_cursor(list(page[-1])) if page and start + limit < len(distances) else None
+        return {
+            "nodes": nodes,
+            "relationships": relationships,
+            "cursor": next_cursor,
+            "truncated": truncated
+        }
+
+    def get_relationships(self, from_node_id: str, to_node_id: str) -> List[Dict]:
+        self._round_trip()
+        with self._lock:
+            return [
+                self._relationship_data(relationship_id)
+                for relationship_id in self._adjacency.get(from_node_id, ())
+                if self._relationships[relationship_id]["source"] == from_node_id
+                and self._relationships[relationship_id]["target"] == to_node_id
+            ]
+
+    def delete_node(self, node_id: str) -> bool:
+        self._round_trip()
+        with self._lock:
+            if node_id not in self._nodes:
+                return False
+            self._delete_node(node_id)
+            return True
+
+    def update_node(self, node_id: str, properties: Dict) -> Optional[Dict]:
+        self._round_trip()
+        with self._lock:
+            if node_id not in self._nodes:
+                return None
+            self._nodes[node_id]["properties"].update(properties)
+            return self._node_data(node_id)
+
+    def clear_database(self) -> bool:
+        self._round_trip()
+        with self._lock:
+            had_nodes = bool(self._nodes)
+            self._nodes.clear()
+            self._relationships.clear()
+            self._adjacency.clear()
+            self._story_chunks.clear()
+            self._analytics.clear()
+            return had_nodes
+
+    def clear_story(self, story_id: str) -> bool:
+        self._round_trip()
+        with self._lock:
+            node_ids = [
+                node_id for node_id, node in self._nodes.items()
+                if node["properties"].get("story_id") == story_id
+            ]
+            for node_id in node_ids:
+                self._delete_node(node_id)
+            self._story_chunks.pop(story_id, None)
+            return bool(node_ids)
+
+    def get_story_chunks(self, story_id: str) -> Dict[str, int]:
+        self._round_trip()
+        with self._lock:
+            return dict(self._story_chunks.get(story_id, {}))
+
+    def record_story_chunks(self, story_id: str, chunks: List[Dict]) -> None:
+        self._round_trip()
+        with self._lock:
+            story_chunks = self._story_chunks.setdefault(story_id, {})
+            for chunk in chunks:
+                story_chunks[chunk["hash"]] = chunk["position"]
+
+    def retract_story_chunks(self, story_id: str, hashes: List[str]) -> Dict[str, int]:
+        self._round_trip()
+        hashes = set(hashes)
+        with self._lock:
+            relationship_ids = [
+                relationship_id for relationship_id, rel in self._relationships.items()
+                if rel["properties"].get("chunk_hash") in hashes
+                and self._nodes[rel["source"]]["properties"].get("story_id") == story_id
+            ]
+            for relationship_id in relationship_ids:
+                self._delete_relationship(relationship_id)
+
+            nodes_deleted = 0
+            for node_id, node in list(self._nodes.items()):
+                properties = node["properties"]
+                chunks = properties.get("chunks")
+                if properties.get("story_id") != story_id or not chunks or not hashes.intersection(chunks):
+                    continue
+                node["properties"] = retracted_properties(properties, hashes)
+                if node["properties"] is None:
+                    self._delete_node(node_id)
+                    nodes_deleted += 1
+
+            story_chunks = self._story_chunks.get(story_id, {})
+            for chunk_hash in hashes:
+                story_chunks.pop(chunk_hash, None)
+        return {"nodes_deleted": nodes_deleted, "relationships_deleted": len(relationship_ids)}
+
+    def merge_story_nodes(self, story_id: str, chunk_hash: str, label: str, rows: List[Dict]) -> List[Dict]:
+        merged = []
+        entries = chunk_properties_entries(chunk_hash, rows)
+        prefix = f"{chunk_hash}:"
+        for start in range(0, len(rows), self.BATCH_SIZE):
+            self._round_trip()
+            with self._lock:
+                index = {
+                    node["properties"].get("name"): node_id for node_id, node in self._nodes.items()
+                    if label in node["labels"] and node["properties"].get("story_id") == story_id
+                }
+                for row, entry in zip(rows[start:start + self.BATCH_SIZE], entries[start:start + self.BATCH_SIZE]):
+                    node_id = index.get(row["name"])
+                    if node_id is None:
+                        node_id = index[row["name"]] = self._add_node([label], {"story_id": story_id, "name": row["name"],
+                                                                                 "chunks": []})
+                    properties = self._nodes[node_id]["properties"]
+                    properties.update({k: v for k, v in row["properties"].items() if v is not None})
+                    chunks = properties.get("chunks") or []
+                    properties["chunks"] = chunks if chunk_hash in chunks else chunks + [chunk_hash]
+                    properties[CHUNK_PROPERTIES] = [
+                        other for other in properties.get(CHUNK_PROPERTIES) or [] if not other.startswith(prefix)
+                    ] + [entry]
+                    node = self._node_data(node_id)
+                    merged.append({"key": row["key"], "elementId": node_id, "labels": node["labels"],
+                                   "properties": node["properties"]})
+        return merged
+
+    def get_graph_data(self, story_id: Optional[str] = None, without_story: bool = False,
+                       include_analytics: bool = False) -> Dict[str, List[Dict]]:
+        self._round_trip()
+        with self._lock:
+            node_ids = [
+                node_id for node_id, node in self._nodes.items()
+                if (story_id is None or node["properties"].get("story_id") == story_id)
+                and (not without_story or node["properties"].get("story_id") is None)
+            ]
+            relationships = [
+                self._relationship_data(relationship_id)
+                for node_id in node_ids
+                for relationship_id in sorted(self._adjacency[node_id])
+                if self._relationships[relationship_id]["source"] == node_id
+            ]
+            nodes = [
+                {"id": node_id, "labels": list(self._nodes[node_id]["labels"]),
+                 "properties": strip_internal(self._nodes[node_id]["properties"], include_analytics)}
+                for node_id in node_ids
+            ]
+            return {"nodes": nodes, "relationships": relationships}
+
+    def set_node_properties(self, rows: List[Dict]) -> int:
+        updated = 0
+        for start in range(0, len(rows), self.BATCH_SIZE):
+            self._round_trip()
+            with self._lock:
+                for row in rows[start:start + self.BATCH_SIZE]:
+                    node = self._nodes.get(row["id"])
+                    if node is not None:
+                        node["properties"].update(row["properties"])
+                        updated += 1
+        return updated
+
+    def save_analytics(self, scope: str, summary: Dict) -> None:
+        self._round_trip()
+        with self._lock:
+            self._analytics[scope] = copy.deepcopy(summary)
+
+    def get_analytics(self, scope: str) -> Optional[Dict]:
+        self._round_trip()
+        with self._lock:
+            summary = self._analytics.get(scope)
+            return copy.deepcopy(summary) if summary is not None else None
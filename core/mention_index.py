@@ -0,0 +1,146 @@
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher finding every occurrence of a set of strings in one pass over
+    the text. Matching is case-insensitive and only whole-word matches are reported.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        # Trie as parallel lists: goto transitions, failure links and output values per state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+        for pattern, value in patterns:
+            self._add(pattern.lower(), value)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, value: Any) -> None:
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), value))
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yield (start, end, value) for every whole-word match in text"""
+        lowered = text.lower()
+        state = 0
+        for index, char in enumerate(lowered):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._output[state]:
+                start = index - length + 1
+                end = index + 1
+                if (start == 0 or not lowered[start - 1].isalnum()) and (end == len(lowered) or not lowered[end].isalnum()):
+                    yield start, end, value
+
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def _paragraph_spans(text: str) -> List[Tuple[int, int]]:
+    spans = []
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+class MentionIndex:
+    """
+    Locates where each graph node is mentioned in a text, by its name and its aliases,
+    and groups the text into windows whose co-occurring nodes could be related.
+    """
+
+    def __init__(self, nodes: List[Dict[str, Any]]):
+        """nodes are in get_graph_data format: {"id", "labels", "properties": {"name", "aliases"?}}"""
+        self.labels = {node["id"]: (node.get("labels") or [None])[0] for node in nodes}
+        patterns = []
+        for node in nodes:
+            properties = node.get("properties") or {}
+            names = [properties.get("name")] + list(properties.get("aliases") or [])
+            for name in names:
+                if isinstance(name, str) and len(name.strip()) > 1:
+                    patterns.append((name.strip(), node["id"]))
+        self.matcher = AhoCorasick(patterns)
+
+    def mentions(self, text: str) -> List[Tuple[int, int, Any]]:
+        """(start, end, node_id) for every mention, in text order"""
+        return sorted(self.matcher.find(text))
+
+    def windows(self, text: str, window_chars: int = 4000) -> List[Dict[str, Any]]:
+        """
+        Pack consecutive paragraphs into windows of at most window_chars (a longer
+        paragraph is its own window) and return, for each window, its span and the
+        ids of the nodes mentioned in it.
+        """
+        mentions = self.mentions(text)
+        windows = []
+        mention_index = 0
+        window_start = window_end = None
+        for start, end in _paragraph_spans(text):
+            if window_start is not None and end - window_start > window_chars:
+                windows.append((window_start, window_end))
+                window_start = None
+            if window_start is None:
+                window_start = start
+            window_end = end
+        if window_start is not None:
+            windows.append((window_start, window_end))
+
+        result = []
+        for start, end in windows:
+            node_ids = set()
+            while mention_index < len(mentions) and mentions[mention_index][0] < end:
+                if mentions[mention_index][0] >= start:
+                    node_ids.add(mentions[mention_index][2])
+                mention_index += 1
+            result.append({"start": start, "end": end, "node_ids": node_ids})
+        return result
+
+    def candidate_pairs(self, node_ids: Set[Any], valid_label_pairs: Set[Tuple[str, str]]) -> Set[Tuple[Any, Any]]:
+        """Ordered (source, target) pairs of distinct nodes whose labels some relationship type allows"""
+        return {
+            (source, target)
+            for source in node_ids for target in node_ids
+            if source != target and (self.labels.get(source), self.labels.get(target)) in valid_label_pairs
+        }
+
+
+def valid_label_pairs(relationships_schema: Dict[str, Any]) -> Set[Tuple[str, str]]:
+    """(source label, target label) pairs allowed by any type in relationships_schema.json"""
+    pairs = set()
+    for definition in relationships_schema.get("relationship_types", {}).values():
+        for source in definition.get("valid_sources", []):
+            for target in definition.get("valid_targets", []):
+                pairs.add((source, target))
+    return pairs
@@ -1,9 +1,128 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+import base64
+import json
 import os
-from neo4j import GraphDatabase
 import logging
+import threading
+
+from core.cancellation import raise_if_cancelled
+from core.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+
+def _quote(identifier: str) -> str:
+    """Backtick-quote a label or relationship type for interpolation into Cypher"""
+    return "`" + identifier.replace("`", "``") + "`"
+
+
+def encode_cursor(position: Any) -> str:
+    """Encode a pagination position as an opaque URL-safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+# Prefix of the node properties written by graph analytics; get_graph_data leaves them out unless asked
+ANALYTICS_PREFIX = "_analytics_"
+# Property contributions of each chunk to a merged story node, as "<chunk hash>:<JSON object>" strings
+CHUNK_PROPERTIES = "_chunk_properties"
+# Properties of merged story nodes that merge_story_nodes maintains itself rather than taking from a chunk
+_STORY_NODE_KEYS = {"story_id", "name", "chunks", CHUNK_PROPERTIES}
+
+
+def strip_internal(properties: Dict[str, Any], include_analytics: bool = False) -> Dict[str, Any]:
+    """properties without CHUNK_PROPERTIES and, unless include_analytics, the analytics metrics"""
+    return {
+        key: value for key, value in properties.items()
+        if key != CHUNK_PROPERTIES and (include_analytics or not key.startswith(ANALYTICS_PREFIX))
+    }
+
+
+def retracted_properties(properties: Dict[str, Any], hashes: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """
+    The properties of a merged story node once the given chunks are retracted, or None
+    if no other chunk claims it. Properties are rebuilt from the CHUNK_PROPERTIES of the
+    remaining chunks, applied in chunk order as merge_story_nodes applied them, so a value
+    only a retracted chunk contributed is removed and an overwritten one is restored.
+    Properties no chunk recorded (analytics metrics, nodes merged before CHUNK_PROPERTIES
+    existed) are kept.
+    """
+    hashes = set(hashes)
+    chunks = [chunk_hash for chunk_hash in properties.get("chunks") or [] if chunk_hash not in hashes]
+    if not chunks:
+        return None
+    entries = properties.get(CHUNK_PROPERTIES) or []
+    contributions = {}
+    for entry in entries:
+        chunk_hash, _, data = entry.partition(":")
+        contributions[chunk_hash] = json.loads(data)
+    owned = {key for contribution in contributions.values() for key in contribution} - _STORY_NODE_KEYS
+    rebuilt = {key: value for key, value in properties.items() if key not in owned}
+    for chunk_hash in chunks:
+        rebuilt.update(
+            (key, value) for key, value in contributions.get(chunk_hash, {}).items() if key not in _STORY_NODE_KEYS
+        )
+    rebuilt["chunks"] = chunks
+    rebuilt[CHUNK_PROPERTIES] = [entry for entry in entries if entry.partition(":")[0] not in hashes]
+    return rebuilt
+
+
+def chunk_properties_entries(chunk_hash: str, rows: List[Dict]) -> List[str]:
+    """
+    The CHUNK_PROPERTIES entry ("<chunk hash>:<JSON object>") of each merge_story_nodes row,
+    recording what the chunk contributed to the node; rows naming the same node share one
+    """
+    contributed: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        contributed.setdefault(row["name"], {}).update(
+            (key, value) for key, value in row["properties"].items() if value is not None
+        )
+    # ";" can only occur inside JSON strings, where \u003b is equivalent; the entries then survive the
+    # ";"-delimited arrays of CSV exports (core.graph_bulk_io)
+    encoded = {
+        name: json.dumps(properties, sort_keys=True, default=str).replace(";", "\\u003b")
+        for name, properties in contributed.items()
+    }
+    return [f"{chunk_hash}:{encoded[row['name']]}" for row in rows]
+
+
+def _public_node(node: Dict[str, Any], include_analytics: bool = True) -> Dict[str, Any]:
+    return {**node, "properties": strip_internal(node["properties"], include_analytics)}
+
+
+def decode_cursor(cursor: str) -> Any:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def decode_node_cursor(cursor: str) -> str:
+    """The element id a node page cursor points after; raises ValueError for anything else"""
+    position = decode_cursor(cursor)
+    if not isinstance(position, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+
+def decode_neighborhood_cursor(cursor: str) -> Tuple[int, str]:
+    """The (distance, element id) a neighborhood cursor points after; raises ValueError for anything else"""
+    position = decode_cursor(cursor)
+    if not (isinstance(position, list) and len(position) == 2
+            and isinstance(position[0], int) and not isinstance(position[0], bool)
+            and isinstance(position[1], str)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position[0], position[1]
+
 
 class Neo4jGraphBuilder:
+    # Rows sent per UNWIND query by the batch write methods; cancellation is checked between batches
+    BATCH_SIZE = 500
+    # Bounds for the traversal queries
+    MAX_NEIGHBORHOOD_DEPTH = 3
+    MAX_NEIGHBORHOOD_NODES = 10000
+    MAX_PAGE_SIZE = 1000
+
     def __init__(self):
         """Initialize Neo4j connection using environment variables"""
         # Configure logging to suppress notifications
@@ -13,11 +132,47 @@ class Neo4jGraphBuilder:
         self.uri = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
         self.user = os.getenv('NEO4J_USER', 'neo4j')
         self.password = os.getenv('NEO4J_PASSWORD', 'your-password')
-        self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        # The driver is created on first use, so constructing the builder never touches the network
+        self._driver = None
+        self._driver_lock = threading.Lock()
+        self._analytics_index_ready = False
+
+    @property
+    def driver(self):
+        """The Neo4j driver, created on first access"""
+        if self._driver is None:
+            with self._driver_lock:
+                if self._driver is None:
+                    from neo4j import GraphDatabase
+                    self._driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        return self._driver
+
+    def warm_up(self, connections: int = None) -> bool:
+        """
+        Verify connectivity and pre-open pool connections ahead of the first request.
+        Each concurrently open session holds its own connection, which returns to the
+        pool when the session closes.
+        """
+        if connections is None:
+            connections = int(os.getenv('NEO4J_WARM_CONNECTIONS', '2'))
+        try:
+            self.driver.verify_connectivity()
+            sessions = [self.driver.session() for _ in range(max(connections, 1))]
+            try:
+                for session in sessions:
+                    session.run("RETURN 1").consume()
+            finally:
+                for session in sessions:
+                    session.close()
+            return True
+        except Exception as e:
+            logger.error(f"Neo4j warm-up failed: {str(e)}")
+            return False
 
     def close(self):
         """Close the Neo4j driver connection"""
-        self.driver.close()
+        if self._driver is not None:
+            self._driver.close()
 
     def test_connection(self) -> bool:
         """Test the Neo4j connection"""
@@ -26,11 +181,13 @@ class Neo4jGraphBuilder:
                 result = session.run('RETURN "Connection successful!" as message')
                 return bool(result.single())
         except Exception as e:
-            print(f"Database connection failed: {str(e)}")
+            logger.error(f"Database connection failed: {str(e)}")
             return False
 
+    @profiled()
     def create_node(self, label: str, properties: Dict) -> Dict:
         """Create a node with the given label and properties"""
+        raise_if_cancelled()
         with self.driver.session() as session:
             cypher = f"""
                 CREATE (n:{label} $properties)
@@ -42,9 +199,11 @@ class Neo4jGraphBuilder:
             result = session.run(cypher, properties=properties)
             return result.single()['node']
 
+    @profiled()
     def create_relationship(self, from_node_id: int, to_node_id: int, 
                           relationship_type: str, properties: Dict = {}) -> Dict:
         """Create a relationship between two nodes"""
+        raise_if_cancelled()
         with self.driver.session() as session:
             cypher = f"""
                 MATCH (from), (to)
@@ -58,6 +217,50 @@ class Neo4jGraphBuilder:
                                properties=properties)
             return result.single()['r']
 
+    @profiled()
+    def create_nodes(self, label: str, rows: List[Dict]) -> List[Dict]:
+        """
+        Create many nodes with the same label using batched UNWIND queries.
+        Each row is {"key": any, "properties": Dict}; the key is echoed back so
+        callers can map their own ids to the created element ids.
+        """
+        cypher = f"""
+            UNWIND $rows AS row
+            CREATE (n:{_quote(label)})
+            SET n = row.properties
+            RETURN row.key AS key, elementId(n) AS elementId, properties(n) AS properties
+        """
+        created = []
+        with self.driver.session() as session:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                raise_if_cancelled()
+                result = session.run(cypher, rows=rows[start:start + self.BATCH_SIZE])
+                created.extend(record.data() for record in result)
+        return created
+
+    @profiled()
+    def create_relationships(self, relationship_type: str, rows: List[Dict]) -> List[Dict]:
+        """
+        Create many relationships of the same type using batched UNWIND queries.
+        Each row is {"source": elementId, "target": elementId, "properties": Dict}.
+        Returns the created relationships in get_graph_data format.
+        """
+        cypher = f"""
+            UNWIND $rows AS row
+            MATCH (from) WHERE elementId(from) = row.source
+            MATCH (to) WHERE elementId(to) = row.target
+            CREATE (from)-[r:{_quote(relationship_type)}]->(to)
+            SET r = row.properties
+            RETURN row.source AS source, row.target AS target, type(r) AS type, properties(r) AS properties
+        """
+        created = []
+        with self.driver.session() as session:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                raise_if_cancelled()
+                result = session.run(cypher, rows=rows[start:start + self.BATCH_SIZE])
+                created.extend(record.data() for record in result)
+        return created
+
     def get_node_by_id(self, node_id: int) -> Optional[Dict]:
         """Get a node by its ID"""
         with self.driver.session() as session:
@@ -80,6 +283,128 @@ class Neo4jGraphBuilder:
             result = session.run(cypher)
             return [record['n'] for record in result]
 
+    @profiled()
+    def get_nodes_by_label_page(self, label: str, limit: int = 100, cursor: Optional[str] = None,
+                                story_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get one page of the nodes with a label, ordered by element id.
+        Returns {"nodes": [...], "cursor": str or None}; pass the cursor back for the next page.
+        """
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        after = decode_node_cursor(cursor) if cursor else None
+        with self.driver.session() as session:
+            cypher = f"""
+                MATCH (n:{_quote(label)})
+                WHERE ($after IS NULL OR elementId(n) > $after)
+                  AND ($story_id IS NULL OR n.story_id = $story_id)
+                RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+                ORDER BY id
+                LIMIT $limit
+            """
+            # One extra row tells whether there is a next page
+            result = session.run(cypher, after=after, story_id=story_id, limit=limit + 1)
+            nodes = [_public_node(record.data()) for record in result]
+        next_cursor = encode_cursor(nodes[limit - 1]["id"]) if len(nodes) > limit else None
+        return {"nodes": nodes[:limit], "cursor": next_cursor}
+
+    def _neighbor_distances(self, session, node_id: str, depth: int,
+                            relationship_types: Optional[List[str]],
+                            story_id: Optional[str]) -> Tuple[List[Tuple[int, str]], bool]:
+        """
+        Breadth-first search returning [(distance, element_id), ...] for nodes within depth hops,
+        one bounded query per hop. The second value is True when more than MAX_NEIGHBORHOOD_NODES
+        nodes were found.
+        """
+        cypher = """
+            UNWIND $frontier AS frontier_id
+            MATCH (n)-[r]-(m)
+            WHERE elementId(n) = frontier_id
+              AND ($types IS NULL OR type(r) IN $types)
+              AND ($story_id IS NULL OR m.story_id = $story_id)
+            RETURN DISTINCT elementId(m) AS id
+            LIMIT $cap
+        """
+        visited = {node_id}
+        distances = []
+        frontier = [node_id]
+        for distance in range(1, depth + 1):
+            raise_if_cancelled()
+            cap = self.MAX_NEIGHBORHOOD_NODES - len(distances)
+            # Rows may repeat visited nodes; one row beyond the cap tells whether it was exceeded
+            result = session.run(cypher, frontier=frontier, types=relationship_types,
+                                 story_id=story_id, cap=cap + 1 + len(visited))
+            frontier = []
+            for record in result:
+                if record["id"] not in visited:
+                    visited.add(record["id"])
+                    frontier.append(record["id"])
+            frontier.sort()
+            distances.extend((distance, neighbor_id) for neighbor_id in frontier[:cap])
+            if len(frontier) > cap:
+                return distances, True
+            if not frontier:
+                break
+        return distances, False
+
+    @profiled()
+    def get_neighborhood(self, node_id: str, depth: int = 1, relationship_types: Optional[List[str]] = None,
+                         limit: int = 100, cursor: Optional[str] = None,
+                         story_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get the nodes within depth hops of a node, following only relationship_types if given.
+        Nodes are paged in (distance, element id) order; each page includes the relationships
+        between its nodes and the nodes of earlier pages (including the start node, which
+        is returned on the first page).
+        Returns {"nodes": [...], "relationships": [...], "cursor": str or None, "truncated": bool}.
+        """
+        depth = max(1, min(depth, self.MAX_NEIGHBORHOOD_DEPTH))
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        after = decode_neighborhood_cursor(cursor) if cursor else None
+
+        with self.driver.session() as session:
+            distances, truncated = self._neighbor_distances(session, node_id, depth, relationship_types, story_id)
+            start = 0
+            if after is not None:
+                while start < len(distances) and distances[start] <= after:
+                    start += 1
+            page = distances[start:start + limit]
+            page_ids = [neighbor_id for _, neighbor_id in page]
+            if after is None:
+                page_ids.insert(0, node_id)
+            known_ids = [node_id] + [neighbor_id for _, neighbor_id in distances[:start + limit]]
+
+            nodes_cypher = """
+                MATCH (n)
+                WHERE elementId(n) IN $ids
+                RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+            """
+            nodes = [_public_node(record.data()) for record in session.run(nodes_cypher, ids=page_ids)]
+
+            relationships_cypher = """
+                UNWIND $ids AS page_id
+                MATCH (n)-[r]-(m)
+                WHERE elementId(n) = page_id
+                  AND elementId(m) IN $known
+                  AND ($types IS NULL OR type(r) IN $types)
+                WITH DISTINCT r
+                RETURN elementId(startNode(r)) AS source, elementId(endNode(r)) AS target,
+                       type(r) AS type, properties(r) AS properties
+            """
+            relationships = [
+                record.data() for record in
+                session.run(relationships_cypher, ids=page_ids, known=known_ids, types=relationship_types)
+            ]
+
+        order = {neighbor_id: index for index, neighbor_id in enumerate(page_ids)}
+        nodes.sort(key=lambda node: order[node["id"]])
+        next_cursor = encode_cursor(list(page[-1])) if page and start + limit < len(distances) else None
+        return {
+            "nodes": nodes,
+            "relationships": relationships,
+            "cursor": next_cursor,
+            "truncated": truncated
+        }
+
     def get_relationships(self, from_node_id: int, to_node_id: int) -> List[Dict]:
         """Get relationships between two nodes"""
         with self.driver.session() as session:
@@ -125,6 +450,129 @@ class Neo4jGraphBuilder:
             result = session.run(cypher)
             return result.consume().counters.nodes_deleted > 0
 
+    @profiled()
+    def clear_story(self, story_id: str) -> bool:
+        """Clear the nodes and relationships belonging to a single story"""
+        with self.driver.session() as session:
+            cypher = """
+                MATCH (n)
+                WHERE n.story_id = $story_id
+                DETACH DELETE n
+            """
+            result = session.run(cypher, story_id=story_id)
+            return result.consume().counters.nodes_deleted > 0
+
+    @profiled()
+    def get_story_chunks(self, story_id: str) -> Dict[str, int]:
+        """Fingerprints of the chunks an incremental story was built from, as {hash: position}"""
+        with self.driver.session() as session:
+            cypher = """
+                MATCH (c:StoryChunk)
+                WHERE c.story_id = $story_id
+                RETURN c.hash AS hash, c.position AS position
+            """
+            result = session.run(cypher, story_id=story_id)
+            return {record["hash"]: record["position"] for record in result}
+
+    @profiled()
+    def record_story_chunks(self, story_id: str, chunks: List[Dict]) -> None:
+        """Create or reposition chunk fingerprints; each chunk is {"hash": str, "position": int}"""
+        with self.driver.session() as session:
+            cypher = """
+                UNWIND $chunks AS chunk
+                MERGE (c:StoryChunk {story_id: $story_id, hash: chunk.hash})
+                SET c.position = chunk.position
+            """
+            session.run(cypher, story_id=story_id, chunks=chunks).consume()
+
+    @profiled()
+    def retract_story_chunks(self, story_id: str, hashes: List[str]) -> Dict[str, int]:
+        """
+        Remove the graph facts owned by the given chunks of an incremental story:
+        relationships they produced, their claim on merged nodes (nodes no chunk
+        claims any more are deleted, the properties of the others are rebuilt from
+        the remaining chunks, see retracted_properties) and their fingerprints.
+        """
+        with self.driver.session() as session:
+            relationships_cypher = """
+                MATCH (n)-[r]->()
+                WHERE n.story_id = $story_id AND r.chunk_hash IN $hashes
+                DELETE r
+            """
+            relationships_deleted = session.run(
+                relationships_cypher, story_id=story_id, hashes=hashes
+            ).consume().counters.relationships_deleted
+
+            claimed_cypher = """
+                MATCH (n)
+                WHERE n.story_id = $story_id AND any(h IN n.chunks WHERE h IN $hashes)
+                RETURN elementId(n) AS id, properties(n) AS properties
+            """
+            deleted_ids = []
+            rows = []
+            for record in session.run(claimed_cypher, story_id=story_id, hashes=hashes):
+                properties = retracted_properties(record["properties"], hashes)
+                if properties is None:
+                    deleted_ids.append(record["id"])
+                else:
+                    rows.append({"id": record["id"], "properties": properties})
+
+            delete_cypher = """
+                UNWIND $ids AS id
+                MATCH (n) WHERE elementId(n) = id
+                DETACH DELETE n
+            """
+            update_cypher = """
+                UNWIND $rows AS row
+                MATCH (n) WHERE elementId(n) = row.id
+                SET n = row.properties
+            """
+            nodes_deleted = 0
+            for start in range(0, len(deleted_ids), self.BATCH_SIZE):
+                nodes_deleted += session.run(
+                    delete_cypher, ids=deleted_ids[start:start + self.BATCH_SIZE]
+                ).consume().counters.nodes_deleted
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                session.run(update_cypher, rows=rows[start:start + self.BATCH_SIZE]).consume()
+
+            chunks_cypher = """
+                MATCH (c:StoryChunk)
+                WHERE c.story_id = $story_id AND c.hash IN $hashes
+                DELETE c
+            """
+            session.run(chunks_cypher, story_id=story_id, hashes=hashes).consume()
+        return {"nodes_deleted": nodes_deleted, "relationships_deleted": relationships_deleted}
+
+    @profiled()
+    def merge_story_nodes(self, story_id: str, chunk_hash: str, label: str, rows: List[Dict]) -> List[Dict]:
+        """
+        Merge nodes of an incremental story on (label, story_id, name), adding chunk_hash
+        to each node's chunks list and patching its properties. What the chunk contributed
+        is also recorded in CHUNK_PROPERTIES, so retract_story_chunks can take it back.
+        Each row is {"key": any, "name": str, "properties": Dict}; returns
+        {"key", "elementId", "labels", "properties"} per row.
+        """
+        cypher = f"""
+            UNWIND $rows AS row
+            MERGE (n:{_quote(label)} {{story_id: $story_id, name: row.name}})
+            ON CREATE SET n.chunks = []
+            SET n += row.properties
+            SET n.chunks = CASE WHEN $chunk_hash IN n.chunks THEN n.chunks ELSE n.chunks + $chunk_hash END
+            SET n.{CHUNK_PROPERTIES} = [
+                entry IN coalesce(n.{CHUNK_PROPERTIES}, []) WHERE NOT entry STARTS WITH $chunk_prefix
+            ] + row.chunk_entry
+            RETURN row.key AS key, elementId(n) AS elementId, labels(n) AS labels, properties(n) AS properties
+        """
+        rows = [{**row, "chunk_entry": entry} for row, entry in zip(rows, chunk_properties_entries(chunk_hash, rows))]
+        merged = []
+        with self.driver.session() as session:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                raise_if_cancelled()
+                result = session.run(cypher, story_id=story_id, chunk_hash=chunk_hash, chunk_prefix=f"{chunk_hash}:",
+                                     rows=rows[start:start + self.BATCH_SIZE])
+                merged.extend(_public_node(record.data()) for record in result)
+        return merged
+
     def initialize_sample_graph(self) -> bool:
         """Initialize a sample knowledge graph"""
         try:
@@ -156,14 +604,25 @@ class Neo4jGraphBuilder:
                 session.run(cypher)
                 return True
         except Exception as e:
-            print(f"Error initializing sample graph: {str(e)}")
+            logger.error(f"Error initializing sample graph: {str(e)}")
             return False
 
-    def get_graph_data(self) -> Dict[str, List[Dict]]:
-        """Get all nodes and relationships in the graph"""
+    @profiled()
+    def get_graph_data(self, story_id: Optional[str] = None, without_story: bool = False,
+                       include_analytics: bool = False) -> Dict[str, List[Dict]]:
+        """
+        Get all nodes and relationships in the graph, or only those of one story, or with
+        without_story only the nodes that belong to no story. Analytics metrics
+        (ANALYTICS_PREFIX properties) are left out unless include_analytics is set;
+        CHUNK_PROPERTIES always is.
+        """
         with self.driver.session() as session:
             cypher = """
                 MATCH (n)
+                WHERE ($story_id IS NULL OR n.story_id = $story_id)
+                  AND (NOT $without_story OR n.story_id IS NULL)
+                  AND NOT n:StoryChunk
+                  AND NOT n:GraphAnalytics
                 OPTIONAL MATCH (n)-[r]->(m)
                 RETURN COLLECT(DISTINCT {
                     id: elementId(n),
@@ -177,9 +636,46 @@ class Neo4jGraphBuilder:
                     properties: properties(r)
                 } END) as relationships
             """
-            result = session.run(cypher)
+            result = session.run(cypher, story_id=story_id, without_story=without_story)
             record = result.single()
             return {
-                'nodes': [node for node in record['nodes'] if node],
+                'nodes': [_public_node(node, include_analytics) for node in record['nodes'] if node],
                 'relationships': [rel for rel in record['relationships'] if rel]
-            } 
\ No newline at end of file
+            }
+
+    @profiled()
+    def set_node_properties(self, rows: List[Dict]) -> int:
+        """Add properties to existing nodes in batches ([{"id": elementId, "properties": {...}}]); returns nodes updated"""
+        cypher = """
+            UNWIND $rows AS row
+            MATCH (n) WHERE elementId(n) = row.id
+            SET n += row.properties
+            RETURN count(n) AS updated
+        """
+        updated = 0
+        with self.driver.session() as session:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                raise_if_cancelled()
+                updated += session.run(cypher, rows=rows[start:start + self.BATCH_SIZE]).single()["updated"]
+        return updated
+
+    def save_analytics(self, scope: str, summary: Dict) -> None:
+        """Store an analytics summary as a GraphAnalytics node keyed by scope (a story id, "" for no story)"""
+        with self.driver.session() as session:
+            if not self._analytics_index_ready:
+                session.run(
+                    "CREATE INDEX graph_analytics_scope IF NOT EXISTS FOR (a:GraphAnalytics) ON (a.scope)"
+                ).consume()
+                self._analytics_index_ready = True
+            session.run(
+                "MERGE (a:GraphAnalytics {scope: $scope}) SET a.summary = $summary",
+                scope=scope, summary=json.dumps(summary)
+            ).consume()
+
+    def get_analytics(self, scope: str) -> Optional[Dict]:
+        """The summary stored by save_analytics, or None"""
+        with self.driver.session() as session:
+            record = session.run(
+                "MATCH (a:GraphAnalytics {scope: $scope}) RETURN a.summary AS summary", scope=scope
+            ).single()
+            return json.loads(record["summary"]) if record and record["summary"] else None
@@ -0,0 +1,302 @@
+"""
+Opt-in per-request profiling: a span timeline plus a sampling profile.
+
+A Profile is made current for a request with profile_scope(); while it is,
+profiled() functions and span() blocks record timed spans, and a background
+sampler reads sys._current_frames() every PROFILE_SAMPLE_INTERVAL_MS for the
+threads working inside the profile's spans. Work submitted to thread pools
+through core.cancellation.propagate carries the current profile along.
+
+With no current profile, profiled() and span() cost one context variable read.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'logs', 'profiles')
+_NULL_SPAN = nullcontext()
+
+_current_profile: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("profile_span", default=None)
+
+
+class Profile:
+    """Spans and stack samples of one profiled request"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                 sample_interval_ms: float = None, max_spans: int = None):
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.sample_interval_ms = sample_interval_ms or float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+        self.max_spans = max_spans or int(os.getenv('PROFILE_MAX_SPANS', '10000'))
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped_spans = 0
+        # Folded stacks ("root;...;leaf") -> sample count
+        self.samples: Dict[str, int] = {}
+        self.sample_count = 0
+        self._lock = threading.Lock()
+        # Thread ident -> number of open spans of this profile on that thread
+        self._threads: Dict[int, int] = {}
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def _enter_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def _exit_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._threads.get(ident, 0) - 1
+            if depth > 0:
+                self._threads[ident] = depth
+            else:
+                self._threads.pop(ident, None)
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        parent = _current_span.get()
+        record = {
+            "id": uuid.uuid4().hex[:12],
+            "parent": parent["id"] if parent else None,
+            "name": name,
+            "thread": threading.current_thread().name,
+            "start_ms": self._elapsed_ms(),
+            "duration_ms": None,
+            "attributes": dict(attributes or {}),
+        }
+        reset = _current_span.set(record)
+        self._enter_thread()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            self._exit_thread()
+            _current_span.reset(reset)
+            record["duration_ms"] = self._elapsed_ms() - record["start_ms"]
+            with self._lock:
+                if len(self.spans) < self.max_spans:
+                    self.spans.append(record)
+                else:
+                    self.dropped_spans += 1
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        """Add one stack sample of each thread working in this profile"""
+        with self._lock:
+            idents = list(self._threads)
+        stacks = []
+        for ident in idents:
+            frame = frames.get(ident)
+            if frame is not None:
+                stacks.append(_fold(frame))
+        with self._lock:
+            self.sample_count += 1
+            for stack in stacks:
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def finish(self) -> None:
+        self.duration_ms = self._elapsed_ms()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "attributes": self.attributes,
+                "started_at": self.started_at,
+                "duration_ms": self.duration_ms,
+                "sample_interval_ms": self.sample_interval_ms,
+                "sample_count": self.sample_count,
+                "spans": sorted(self.spans, key=lambda record: record["start_ms"]),
+                "dropped_spans": self.dropped_spans,
+                "samples": dict(sorted(self.samples.items(), key=lambda item: -item[1])),
+            }
+
+
+def _fold(frame) -> str:
+    """A stack as a folded "file:function;...;file:function" line, root first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _Sampler:
+    """One thread per process that samples the stacks of all active profiles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: List[Profile] = []
+        self._active = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._active.set()
+
+    def remove(self, profile: Profile) -> None:
+        with self._lock:
+            if profile in self._profiles:
+                self._profiles.remove(profile)
+            if not self._profiles:
+                self._active.clear()
+
+    def _run(self) -> None:
+        while True:
+            self._active.wait()
+            with self._lock:
+                profiles = list(self._profiles)
+            if not profiles:
+                continue
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+            del frames
+            time.sleep(min(profile.sample_interval_ms for profile in profiles) / 1000)
+
+
+_sampler = _Sampler()
+
+
+def current_profile() -> Optional[Profile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_scope(profile: Profile) -> Iterator[Profile]:
+    """Make profile current and sample the calling thread until the block exits"""
+    reset = _current_profile.set(profile)
+    profile._enter_thread()
+    _sampler.add(profile)
+    try:
+        with profile.span(profile.name, profile.attributes):
+            yield profile
+    finally:
+        _sampler.remove(profile)
+        profile._exit_thread()
+        profile.finish()
+        _current_profile.reset(reset)
+
+
+def span(name: str, **attributes):
+    """A span of the current profile, or a no-op context manager when not profiling"""
+    profile = _current_profile.get()
+    if profile is None:
+        return _NULL_SPAN
+    return profile.span(name, attributes)
+
+
+def annotate(**attributes) -> None:
+    """Add attributes to the innermost open span (e.g. token counts known only after a call)"""
+    if _current_profile.get() is None:
+        return
+    record = _current_span.get()
+    if record is not None:
+        record["attributes"].update(attributes)
+
+
+def profiled(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator: record each call as a span (named after the function by default) when profiling"""
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return fn(*args, **kwargs)
+            with profile.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class ProfileStore:
+    """Profiles written as JSON files under a directory, newest kept up to max_files"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = None):
+        self.directory = directory
+        self.max_files = max_files or int(os.getenv('PROFILE_MAX_FILES', '200'))
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str) -> str:
+        if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith("."):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, profile: Profile) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile.id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile.to_dict(), f, default=str)
+        os.replace(tmp_path, path)
+        self._prune()
+        return path
+
+    def _files(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name for name in os.listdir(self.directory) if name.endswith(".json")), reverse=True)
+
+    def _prune(self) -> None:
+        with self._lock:
+            for name in self._files()[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summaries of the newest profiles"""
+        summaries = []
+        for name in self._files()[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                "id": data["id"],
+                "name": data["name"],
+                "attributes": data["attributes"],
+                "started_at": data["started_at"],
+                "duration_ms": data["duration_ms"],
+                "span_count": len(data["spans"]),
+                "sample_count": data["sample_count"],
+            })
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(profile_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+
+def folded_stacks(data: Dict[str, Any]) -> str:
+    """A saved profile's samples in the folded format of flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in data["samples"].items())
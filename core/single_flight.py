@@ -0,0 +1,69 @@
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from core.cancellation import OperationCancelled, current_token
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts, for use as a SingleFlight key"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the function,
+    callers arriving while it is in flight wait for it and receive the same result
+    (or the same exception). Nothing is cached once the call completes.
+
+    The function runs under the leader's cancellation token. If the leader is
+    cancelled, waiting callers do not inherit the cancellation: one of them re-runs
+    the function. A waiting caller whose own token is cancelled stops waiting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.executions += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            token = current_token()
+            while not call.done.wait(0.05 if token is not None else None):
+                token.raise_if_cancelled()
+            if isinstance(call.error, OperationCancelled):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
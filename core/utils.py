@@ -1,7 +1,57 @@
+import json
 import re
+
 def clean_json_string(json_string):
     # Remove potential markdown code block formatting
     json_string = re.sub(r'^```json\s*', '', json_string, flags=re.MULTILINE)
     json_string = re.sub(r'\s*```$', '', json_string, flags=re.MULTILINE)
     # Remove any leading/trailing whitespace
-    return json_string.strip()
\ No newline at end of file
+    return json_string.strip()
+
+def salvage_truncated_json(json_string):
+    """
+    Recover the complete part of a JSON document that was cut off mid-output.
+
+    Keeps every complete element of the top-level arrays (the root array, or arrays
+    that are values of the root object), drops the partial element after them and
+    closes the open brackets. Returns the parsed value, or None if nothing complete
+    could be recovered.
+    """
+    json_string = clean_json_string(json_string)
+    stack = []
+    in_string = escaped = False
+    cut = None
+    for index, char in enumerate(json_string):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if stack and stack[-1] == "[" and len(stack) <= 2:
+                    cut = (index + 1, list(stack))
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+            if char == "[" and len(stack) <= 2:
+                cut = (index + 1, list(stack))
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if stack and stack[-1] == "[" and len(stack) <= 2:
+                cut = (index + 1, list(stack))
+        elif char == "," and stack and stack[-1] == "[" and len(stack) <= 2:
+            # A number, true, false or null element ends at the comma after it
+            cut = (index, list(stack))
+    if cut is None:
+        return None
+    end, open_brackets = cut
+    closing = "".join("]" if bracket == "[" else "}" for bracket in reversed(open_brackets))
+    try:
+        return json.loads(json_string[:end] + closing)
+    except ValueError:
+        return None
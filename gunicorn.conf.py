@@ -0,0 +1,22 @@
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# LLM calls routinely take tens of seconds
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+# Workers rotating the same log file would lose records; each worker gets its own files (see core/log_config.py)
+os.environ.setdefault("LOG_FILE_PER_PROCESS", "1")
+
+
+def post_fork(server, worker):
+    """Start the worker's own logging pipeline: the master's listener thread does not survive the fork"""
+    from core.log_config import setup_logging
+    setup_logging()
+
+
+def post_worker_init(worker):
+    """Warm each worker up after it has imported the app (set WARM_UP=0 to skip)"""
+    if os.getenv("WARM_UP", "1") != "0":
+        from app import warm_up
+        warm_up()
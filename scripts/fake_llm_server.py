@@ -0,0 +1,206 @@
+"""
+A local OpenAI-compatible chat completions endpoint for load tests.
+
+Usage:
+    python -m scripts.fake_llm_server [--port 8089] [--latency lognormal:2.0,0.5]
+        [--error-rate 0.01] [--seed 1]
+
+Serves POST /v1/chat/completions, blocking or streamed (stream=true), with usage.
+Each response takes a latency drawn from the configured distribution:
+    fixed:SECONDS            e.g. fixed:1.5
+    uniform:LOW,HIGH         e.g. uniform:0.5,3
+    lognormal:MEDIAN,SIGMA   e.g. lognormal:2.0,0.5 (long right tail, like real LLMs)
+    exponential:MEAN         e.g. exponential:1.0
+
+The content is valid JSON for the graph extraction prompts: capitalized words of
+the "Text to analyze" become Character nodes, and consecutive nodes are linked with
+KNOWS relationships. --error-rate answers that fraction of requests with HTTP 500.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+TEXT_PATTERN = re.compile(r"Text to analyze:\n(.*?)\n\s*\n\s*Extract", re.DOTALL)
+NODE_ID_PATTERN = re.compile(r"""['"]id['"]:\s*['"]([^'"]+)['"]""")
+NAME_PATTERN = re.compile(r"\b[A-Z][a-z]{2,}\b")
+MAX_ENTITIES = 12
+CHARS_PER_TOKEN = 4
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """A sampler for a latency distribution spec (see the module docstring)"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+def _names(prompt: str) -> List[str]:
+    match = TEXT_PATTERN.search(prompt)
+    text = match.group(1) if match else prompt
+    names = []
+    for name in NAME_PATTERN.findall(text):
+        if name not in names:
+            names.append(name)
+    return names[:MAX_ENTITIES]
+
+
+def extraction_content(system_prompt: str, prompt: str) -> Dict[str, Any]:
+    """Plausible output for whichever graph extraction prompt this is"""
+    if "node and relationship extractor" in system_prompt:
+        nodes = [{"id": f"n{i}", "type": "Character", "properties": {"name": name}}
+                 for i, name in enumerate(_names(prompt))]
+        relationships = [
+            {"source_node": a["id"], "target_node": b["id"], "type": "KNOWS",
+             "properties": {"relationship_type": "acquaintance"}}
+            for a, b in zip(nodes, nodes[1:])
+        ]
+        return {"nodes": nodes, "relationships": relationships}
+    if "relationship extractor" in system_prompt:
+        node_ids = NODE_ID_PATTERN.findall(prompt)
+        return {"relationships": [
+            {"source_node": a, "target_node": b, "type": "KNOWS", "properties": {"relationship_type": "acquaintance"}}
+            for a, b in zip(node_ids, node_ids[1:])
+        ]}
+    if "node attribute extractor" in system_prompt:
+        return {"nodes": [{"type": "Character", "properties": {"name": name}} for name in _names(prompt)]}
+    return {"result": "ok"}
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: Callable[[random.Random], float], error_rate: float = 0.0, seed: int = None):
+        super().__init__(address, FakeLLMHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = 0
+
+    def draw(self):
+        """(latency seconds, fail) for the next request"""
+        with self._rng_lock:
+            self.requests += 1
+            return self.latency(self._rng), self._rng.random() < self.error_rate
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = request.get("messages", [])
+        system_prompt = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        latency, fail = self.server.draw()
+
+        if fail:
+            time.sleep(latency / 2)
+            self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+
+        content = json.dumps(extraction_content(system_prompt, prompt))
+        usage = {
+            "prompt_tokens": sum(len(m.get("content") or "") for m in messages) // CHARS_PER_TOKEN,
+            "completion_tokens": len(content) // CHARS_PER_TOKEN,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "fake")
+
+        if not request.get("stream"):
+            time.sleep(latency)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = [content[i:i + 64] for i in range(0, len(content), 64)] or [""]
+        try:
+            for index, piece in enumerate(pieces):
+                time.sleep(latency / len(pieces))
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece},
+                                 "finish_reason": "stop" if index == len(pieces) - 1 else None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            if (request.get("stream_options") or {}).get("include_usage"):
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream (e.g. a cancelled request)
+            pass
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible endpoint for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="lognormal:2.0,0.5", help="Latency distribution (see module docstring)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeLLMServer((args.host, args.port), parse_latency(args.latency), args.error_rate, args.seed)
+    print(f"Fake LLM listening on http://{args.host}:{args.port}/v1 (latency {args.latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
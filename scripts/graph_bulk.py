@@ -0,0 +1,69 @@
+"""
+Bulk export and import of the knowledge graph.
+
+Usage:
+    python -m scripts.graph_bulk export OUT_DIR [--story-id ID] [--format csv|parquet|arrow]
+        [--batch-size 10000]
+    python -m scripts.graph_bulk import IN_DIR [--story-id ID] [--batch-size 10000]
+
+Export writes one file per node label and relationship type plus a manifest.json. CSV
+files use neo4j-admin headers (typed from data/graph/*.json), so a large export can be
+loaded into an empty database offline with the neo4j-admin command recorded in the
+manifest. Parquet and Arrow files (requires pyarrow) have the same columns and are
+meant for analytics tools.
+
+Import reads CSV, Parquet or Arrow files back into a running database in batched
+transactions. Nodes get new ids; --story-id imports the graph under another story.
+"""
+import argparse
+import json
+import sys
+
+from dotenv import load_dotenv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk export and import of the knowledge graph")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the graph to files")
+    export_parser.add_argument("out_dir", help="Directory to write the files to")
+    export_parser.add_argument("--story-id", default=None, help="Only export this story (default: everything)")
+    export_parser.add_argument("--format", choices=("csv", "parquet", "arrow"), default="csv",
+                               help="File format (default: csv, neo4j-admin compatible)")
+
+    import_parser = subparsers.add_parser("import", help="Import files written by export")
+    import_parser.add_argument("in_dir", help="Directory containing nodes_* and relationships_* files")
+    import_parser.add_argument("--story-id", default=None, help="Set story_id on everything imported")
+
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument("--batch-size", type=int, default=10000, help="Rows per batch")
+    args = parser.parse_args()
+
+    load_dotenv()
+    from core.graph_bulk_io import GraphBulkIO
+    from core.log_config import setup_logging
+    from core.neo4j_graph_builder import Neo4jGraphBuilder
+
+    setup_logging()
+    builder = Neo4jGraphBuilder()
+    bulk_io = GraphBulkIO(builder, batch_size=args.batch_size)
+    try:
+        if args.command == "export":
+            manifest = bulk_io.export(args.out_dir, story_id=args.story_id, file_format=args.format)
+            for entry in manifest["nodes"] + manifest["relationships"]:
+                print(f"{entry['file']}: {entry['count']} rows")
+            if manifest["dropped_properties"]:
+                print(f"Properties not in the schema were not exported: {json.dumps(manifest['dropped_properties'])}",
+                      file=sys.stderr)
+            if "neo4j_admin_command" in manifest:
+                print(f"Offline load: {manifest['neo4j_admin_command']}")
+        else:
+            created = bulk_io.import_files(args.in_dir, story_id=args.story_id)
+            print(f"Created {created['nodes']} nodes and {created['relationships']} relationships")
+    finally:
+        builder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Report where the time goes when a worker imports the app.
+
+Usage:
+    python -m scripts.import_profile [--module app] [--top 15] [--budget-ms 300]
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and prints
+the total import time and the slowest packages by cumulative and self time.
+Exits with status 1 when the total exceeds --budget-ms.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def profile_imports(module: str):
+    """Return (wall_ms, [(name, self_us, cumulative_us, depth), ...]) for importing module"""
+    command = [sys.executable, "-X", "importtime", "-c",
+               f"import time; t = time.perf_counter(); import {module}; "
+               f"print((time.perf_counter() - t) * 1000)"]
+    result = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    wall_ms = float(result.stdout.strip().splitlines()[-1])
+    return wall_ms, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the app")
+    parser.add_argument("--module", default="app", help="Module to import (default: app)")
+    parser.add_argument("--top", type=int, default=15, help="Number of entries per table")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail when the import takes longer")
+    args = parser.parse_args()
+
+    wall_ms, entries = profile_imports(args.module)
+    print(f"Importing {args.module}: {wall_ms:.1f} ms wall, {len(entries)} modules")
+
+    # Direct imports of the module only, so nested modules are not double counted
+    direct = [entry for entry in entries if entry[3] == 1]
+    print(f"\nSlowest direct imports of {args.module} (cumulative):")
+    for name, _, cumulative_us, _ in sorted(direct, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    print("\nSlowest modules (self):")
+    for name, self_us, _, _ in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    if args.budget_ms is not None and wall_ms > args.budget_ms:
+        print(f"\nOver budget: {wall_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Bulk-ingest a directory of story text files into the knowledge graph.
+
+Usage:
+    python -m scripts.ingest_corpus CORPUS_DIR [--pattern "*.txt"] [--chunk-chars 4000]
+        [--workers 4] [--executor thread|process] [--mode serial|pipelined|partitioned]
+        [--checkpoint PATH] [--restart]
+
+Each file is a story (story_id = path relative to CORPUS_DIR) and is ingested with
+GraphExtractor.update_story on a thread or process pool: the file is streamed into
+content-defined chunks of about --chunk-chars, the chunks are extracted concurrently
+and entities are merged per story on (label, name), so a novel becomes one connected
+graph rather than one graph per chunk.
+
+Completed stories are appended to a checkpoint log as they finish, and within a story
+each chunk's fingerprint is stored in the graph as soon as the chunk is written.
+Running the same command again skips completed stories; an interrupted or partially
+failed story is resubmitted and only its chunks without a fingerprint are extracted,
+so a run resumes at the last completed chunk. Throughput (chunks/s, estimated
+tokens/s, nodes/s) is reported periodically and at the end.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from core.log_config import setup_logging
+
+CHECKPOINT_VERSION = 2
+# Rough characters-per-token ratio for English prose, used for the tokens/s estimate
+CHARS_PER_TOKEN = 4
+
+_extractor = None
+
+
+def _build_extractor(chunk_chars: int):
+    from core.llm_client import LLMClient
+    from core.neo4j_graph_builder import Neo4jGraphBuilder
+    from services.graph_extractor import GraphExtractor
+    extractor = GraphExtractor(Neo4jGraphBuilder(), LLMClient())
+    extractor.story_chunk_chars = chunk_chars
+    return extractor
+
+
+def _init_worker(chunk_chars: int):
+    """Process pool initializer: each worker process gets its own driver and LLM clients"""
+    global _extractor
+    load_dotenv()
+    setup_logging()
+    _extractor = _build_extractor(chunk_chars)
+
+
+def ingest_story(story_id: str, path: str, mode: Optional[str]) -> Dict[str, Any]:
+    """Extract one story and return a summary of the outcome (runs inside the pool)"""
+    start = time.perf_counter()
+    metadata = {}
+    try:
+        size = os.path.getsize(path)
+        # The file is read line by line as update_story chunks it, never whole
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            result = _extractor.update_story(story_id, f, mode=mode)
+        status = result.get("status", {})
+        metadata = result.get("metadata", {})
+        success = bool(status.get("success"))
+        message = status.get("message", "")
+    except Exception as e:
+        success, message, size = False, str(e), 0
+    chunks = metadata.get("chunks", {})
+    return {
+        "story_id": story_id,
+        "success": success,
+        "message": message,
+        "chunks": chunks.get("extracted", 0),
+        "reused": chunks.get("reused", 0),
+        "failed_chunks": chunks.get("failed", 0),
+        "nodes": metadata.get("node_count", 0),
+        "relationships": metadata.get("relationship_count", 0),
+        "tokens": size // CHARS_PER_TOKEN,
+        "seconds": time.perf_counter() - start
+    }
+
+
+class Checkpoint:
+    """
+    Set of completed story ids, persisted as an append-only JSON lines log: a header
+    line ({"version", "chunk_chars"}) followed by one {"story_id"} line per completed
+    story. Marking a story appends a single line; the log is compacted (deduplicated,
+    torn last line dropped) when it is opened.
+    """
+
+    def __init__(self, path: str, chunk_chars: int, restart: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.header = {"version": CHECKPOINT_VERSION, "chunk_chars": chunk_chars}
+        self._completed = set()
+        if os.path.exists(path) and not restart:
+            self._load(chunk_chars)
+        self._compact()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self, chunk_chars: int) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        header = json.loads(lines[0]) if lines else {}
+        if header.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint {self.path} has an unsupported version; pass --restart")
+        if header.get("chunk_chars") != chunk_chars:
+            raise ValueError(
+                f"Checkpoint {self.path} was written with --chunk-chars {header.get('chunk_chars')}; "
+                f"use the same value or pass --restart"
+            )
+        for line in lines[1:]:
+            try:
+                self._completed.add(json.loads(line)["story_id"])
+            except (ValueError, KeyError, TypeError):
+                # A line torn by an interrupted write; its story is simply ingested again
+                continue
+
+    def _compact(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.header) + "\n")
+            for story_id in sorted(self._completed):
+                f.write(json.dumps({"story_id": story_id}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def is_completed(self, story_id: str) -> bool:
+        return story_id in self._completed
+
+    def mark_completed(self, story_id: str) -> None:
+        with self.lock:
+            if story_id in self._completed:
+                return
+            self._completed.add(story_id)
+            self._file.write(json.dumps({"story_id": story_id}) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self._file.close()
+
+
+class Throughput:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stories = self.failed = self.skipped = 0
+        self.chunks = self.reused = self.tokens = self.nodes = self.relationships = 0
+
+    def add(self, outcome: Dict[str, Any]) -> None:
+        # A failed story may still have extracted some of its chunks
+        self.chunks += outcome["chunks"]
+        self.reused += outcome["reused"]
+        if not outcome["success"]:
+            self.failed += 1
+            return
+        self.stories += 1
+        self.tokens += outcome["tokens"]
+        self.nodes += outcome["nodes"]
+        self.relationships += outcome["relationships"]
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (
+            f"{self.stories} stories ({self.failed} failed, {self.skipped} skipped), "
+            f"{self.chunks} chunks extracted ({self.reused} reused) in {elapsed:.0f}s | "
+            f"{self.chunks / elapsed:.2f} chunks/s, {self.tokens / elapsed:.0f} tokens/s (est.), "
+            f"{self.nodes / elapsed:.2f} nodes/s, {self.relationships / elapsed:.2f} relationships/s"
+        )
+
+
+def iter_corpus(corpus_dir: str, pattern: str) -> Iterator[Tuple[str, str]]:
+    """Yield (story_id, path) for matching files, in a stable order"""
+    import fnmatch
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if fnmatch.fnmatch(name, pattern):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, corpus_dir).replace(os.sep, "/"), path
+
+
+def run(args) -> int:
+    global _extractor
+    checkpoint = Checkpoint(args.checkpoint, args.chunk_chars, restart=args.restart)
+    stats = Throughput()
+
+    if args.executor == "process":
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                       initargs=(args.chunk_chars,))
+    else:
+        _extractor = _build_extractor(args.chunk_chars)
+        executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="ingest")
+
+    # Bound the stories in flight to a small multiple of the pool size
+    max_in_flight = args.workers * 2
+    in_flight = set()
+    last_report = time.perf_counter()
+
+    def collect(done):
+        nonlocal last_report
+        for future in done:
+            outcome = future.result()
+            stats.add(outcome)
+            if outcome["success"]:
+                checkpoint.mark_completed(outcome["story_id"])
+            else:
+                print(f"FAILED {outcome['story_id']}: {outcome['message']}", file=sys.stderr)
+        if time.perf_counter() - last_report >= args.report_every:
+            print(stats.report(), file=sys.stderr)
+            last_report = time.perf_counter()
+
+    try:
+        for story_id, path in iter_corpus(args.corpus_dir, args.pattern):
+            if checkpoint.is_completed(story_id):
+                stats.skipped += 1
+                continue
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(ingest_story, story_id, path, args.mode))
+        done, in_flight = wait(in_flight)
+        collect(done)
+    except KeyboardInterrupt:
+        print("Interrupted, waiting for running stories to finish...", file=sys.stderr)
+        for future in in_flight:
+            future.cancel()
+        done, _ = wait([future for future in in_flight if not future.cancelled()])
+        collect(done)
+        print(stats.report(), file=sys.stderr)
+        print(f"Checkpoint saved to {args.checkpoint}; rerun the same command to resume", file=sys.stderr)
+        return 130
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        checkpoint.close()
+
+    print(stats.report())
+    return 1 if stats.failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable bulk ingest of a story corpus")
+    parser.add_argument("corpus_dir", help="Directory of story text files (searched recursively)")
+    parser.add_argument("--pattern", default="*.txt", help="File name pattern (default: *.txt)")
+    parser.add_argument("--chunk-chars", type=int, default=4000,
+                        help="Target characters per story chunk (see services.story_chunks)")
+    parser.add_argument("--workers", type=int, default=4, help="Pool size")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="Thread pool (default; extraction is I/O bound) or process pool")
+    parser.add_argument("--mode", choices=("serial", "pipelined", "partitioned"), default=None,
+                        help="Extraction mode of each chunk: partitioned makes one call per schema type group, "
+                             "serial and pipelined one node and one relationship call (default: EXTRACTION_MODE)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint log (default: CORPUS_DIR/.ingest_checkpoint.jsonl)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--report-every", type=float, default=30.0, help="Seconds between progress reports")
+    args = parser.parse_args()
+    if args.checkpoint is None:
+        args.checkpoint = os.path.join(args.corpus_dir, ".ingest_checkpoint.jsonl")
+
+    load_dotenv()
+    if args.executor == "process":
+        # Pool processes write their own log files (see core/log_config.py)
+        os.environ.setdefault("LOG_FILE_PER_PROCESS", "1")
+    setup_logging()
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
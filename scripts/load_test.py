@@ -0,0 +1,264 @@
+"""
+Concurrent load test of the HTTP service under Gunicorn.
+
+Usage:
+    python -m scripts.load_test [--configs 2x8,4x8] [--stages 1,2,4,8,16,32]
+        [--stage-seconds 20] [--latency lognormal:2.0,0.5] [--error-rate 0]
+        [--db-latency-ms 2] [--mode pipelined] [--text-file story.txt]
+        [--p95-budget-ms 20000] [--json-out results.json]
+
+Everything runs locally: a fake OpenAI-compatible endpoint (scripts.fake_llm_server)
+with the given latency distribution stands in for the LLM, and GRAPH_BUILDER=memory
+stands in for Neo4j, so the numbers measure the service itself (Gunicorn workers and
+threads, Flask, extraction pools) against a known LLM latency.
+
+For each Gunicorn config (WORKERSxTHREADS) the app is started, then closed-loop
+clients POST /api/v1/graph/extract at each concurrency stage in turn. Per stage the
+report shows completed requests, throughput, p50/p95/p99 latency and error rate.
+A stage saturates when throughput stops growing (less than 10% over the previous
+stage), p95 exceeds --p95-budget-ms or more than 1% of requests fail. The summary
+recommends the config and concurrency with the highest throughput before saturation.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from scripts.fake_llm_server import FakeLLMServer, parse_latency
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_TEXT = (
+    "Mara left the harbor town of Eastwick at dawn with her brother Tobin. At the "
+    "crossroads they met Aldric, an old cartographer who had known their father, and "
+    "he led them to the ruined tower of Greymoor where Selene kept her library.\n\n"
+    "Tobin distrusted Selene from the start, but Mara traded the silver compass for a "
+    "map of the northern passes, and Aldric agreed to guide them as far as Highfold."
+)
+# Throughput must grow by this fraction per stage, otherwise the stage is saturated
+MIN_THROUGHPUT_GAIN = 0.10
+MAX_ERROR_RATE = 0.01
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def start_app(port: int, workers: int, threads: int, llm_port: int, args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_THREADS": str(threads),
+        "GRAPH_BUILDER": "memory",
+        "MEMORY_GRAPH_LATENCY_MS": str(args.db_latency_ms),
+        "SELECTED_LLM_MAIN": "FAKE",
+        "SELECTED_LLM_NSFW": "FAKE",
+        "FAKE_API_KEY": "load-test",
+        "FAKE_API_BASE": f"http://127.0.0.1:{llm_port}/v1",
+        "FAKE_MODEL": "fake",
+    })
+    if args.mode:
+        env["EXTRACTION_MODE"] = args.mode
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Gunicorn exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/api/v1/graph/jobs")
+            if connection.getresponse().status == 200:
+                connection.close()
+                return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Gunicorn did not become ready within 60 s")
+
+
+def stop_app(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_stage(port: int, concurrency: int, seconds: float, text: str, timeout: float) -> Dict[str, Any]:
+    """Closed-loop clients: each sends its next request as soon as the previous one completes"""
+    deadline = time.monotonic() + seconds
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        while time.monotonic() < deadline:
+            body = json.dumps({"text": text, "story_id": f"load-{uuid.uuid4().hex}"})
+            start = time.perf_counter()
+            try:
+                connection.request("POST", "/api/v1/graph/extract", body=body,
+                                   headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                payload = response.read()
+                ok = response.status == 200 and json.loads(payload).get("status", {}).get("success", False)
+                error = None if ok else f"HTTP {response.status}" if response.status != 200 else "extraction failed"
+            except Exception as e:
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+                error = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                if error is None:
+                    latencies.append(elapsed)
+                else:
+                    errors[error] = errors.get(error, 0) + 1
+        connection.close()
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    failed = sum(errors.values())
+    total = len(latencies) + failed
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": (percentile(latencies, 0.50) or 0) * 1000,
+        "p95_ms": (percentile(latencies, 0.95) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 0.99) or 0) * 1000,
+        "mean_ms": (sum(latencies) / len(latencies) * 1000) if latencies else 0,
+        "error_rate": failed / total if total else 0.0,
+        "errors": errors,
+    }
+
+
+def mark_saturation(stages: List[Dict[str, Any]], p95_budget_ms: float) -> Optional[Dict[str, Any]]:
+    """Flag saturated stages and return the best stage before saturation"""
+    best = None
+    previous = None
+    for stage in stages:
+        reasons = []
+        if stage["error_rate"] > MAX_ERROR_RATE:
+            reasons.append("errors")
+        if stage["p95_ms"] > p95_budget_ms:
+            reasons.append("p95")
+        if previous is not None and stage["throughput"] < previous["throughput"] * (1 + MIN_THROUGHPUT_GAIN):
+            reasons.append("throughput flat")
+        stage["saturated"] = reasons
+        if not reasons and (best is None or stage["throughput"] > best["throughput"]):
+            best = stage
+        previous = stage
+    return best
+
+
+def print_stages(label: str, stages: List[Dict[str, Any]]) -> None:
+    print(f"\n{label}")
+    print(f"  {'conc':>5} {'reqs':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}  saturated")
+    for stage in stages:
+        print(f"  {stage['concurrency']:>5} {stage['requests']:>6} {stage['throughput']:>7.2f} "
+              f"{stage['p50_ms']:>8.0f} {stage['p95_ms']:>8.0f} {stage['p99_ms']:>8.0f} "
+              f"{stage['error_rate'] * 100:>6.1f}%  {', '.join(stage['saturated']) or '-'}")
+
+
+def parse_configs(spec: str) -> List[Tuple[int, int]]:
+    configs = []
+    for item in spec.split(","):
+        workers, _, threads = item.lower().partition("x")
+        configs.append((int(workers), int(threads)))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of /api/v1/graph/extract under Gunicorn")
+    parser.add_argument("--configs", default="2x8", help="Gunicorn WORKERSxTHREADS configs to compare (default: 2x8)")
+    parser.add_argument("--stages", default="1,2,4,8,16,32", help="Client concurrency per stage")
+    parser.add_argument("--stage-seconds", type=float, default=20.0, help="Duration of each stage")
+    parser.add_argument("--latency", default="lognormal:2.0,0.5", help="Fake LLM latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake LLM error rate")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Simulated graph database round trip")
+    parser.add_argument("--mode", default=None, help="Extraction mode: serial, pipelined, joint or partitioned")
+    parser.add_argument("--text-file", default=None, help="Text to extract (default: a short built-in story)")
+    parser.add_argument("--p95-budget-ms", type=float, default=20000.0, help="p95 latency above which a stage is saturated")
+    parser.add_argument("--request-timeout", type=float, default=300.0, help="Client timeout per request")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the app")
+    parser.add_argument("--llm-port", type=int, default=8089, help="Port for the fake LLM")
+    parser.add_argument("--json-out", default=None, help="Write all results to this JSON file")
+    args = parser.parse_args()
+
+    text = SAMPLE_TEXT
+    if args.text_file:
+        with open(args.text_file, "r") as f:
+            text = f.read()
+    stages = [int(value) for value in args.stages.split(",")]
+
+    llm_server = FakeLLMServer(("127.0.0.1", args.llm_port), parse_latency(args.latency), args.error_rate)
+    threading.Thread(target=llm_server.serve_forever, daemon=True).start()
+    print(f"Fake LLM on port {args.llm_port} (latency {args.latency}, error rate {args.error_rate})")
+
+    results = []
+    try:
+        for workers, threads in parse_configs(args.configs):
+            process = start_app(args.port, workers, threads, args.llm_port, args)
+            try:
+                config_stages = []
+                for concurrency in stages:
+                    print(f"{workers}x{threads}: {concurrency} concurrent clients for {args.stage_seconds:.0f} s...",
+                          file=sys.stderr)
+                    config_stages.append(run_stage(args.port, concurrency, args.stage_seconds, text,
+                                                   args.request_timeout))
+            finally:
+                stop_app(process)
+            best = mark_saturation(config_stages, args.p95_budget_ms)
+            results.append({"workers": workers, "threads": threads, "stages": config_stages, "best": best})
+            print_stages(f"Gunicorn {workers} workers x {threads} threads:", config_stages)
+    finally:
+        llm_server.shutdown()
+
+    print("\nRecommendation:")
+    candidates = [result for result in results if result["best"]]
+    if not candidates:
+        print("  Every stage saturated; lower the first stage's concurrency or raise --p95-budget-ms")
+    else:
+        winner = max(candidates, key=lambda result: result["best"]["throughput"])
+        best = winner["best"]
+        slots = winner["workers"] * winner["threads"]
+        # Little's law: with no queueing in the app, throughput = concurrency / mean latency
+        efficiency = best["throughput"] * best["mean_ms"] / 1000 / best["concurrency"]
+        print(f"  GUNICORN_WORKERS={winner['workers']} GUNICORN_THREADS={winner['threads']}: "
+              f"{best['throughput']:.2f} req/s at {best['concurrency']} concurrent requests "
+              f"(p95 {best['p95_ms']:.0f} ms)")
+        print(f"  Concurrency efficiency {efficiency:.0%} (100% = requests never wait for a worker thread)")
+        if best["concurrency"] >= slots:
+            print(f"  Requests at this load fill all {slots} worker threads; more threads per worker "
+                  f"(I/O bound LLM waits) should raise throughput further")
+        else:
+            print(f"  {slots - best['concurrency']} of {slots} worker threads were spare at the best stage; "
+                  f"saturation came from elsewhere (LLM latency, extraction pools, CPU)")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
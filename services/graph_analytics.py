@@ -0,0 +1,293 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from core.neo4j_graph_builder import ANALYTICS_PREFIX, Neo4jGraphBuilder
+from core.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+CHARACTER_LABEL = "Character"
+LOCATION_LABEL = "Location"
+# Metrics written by the analytics stage, stored as ANALYTICS_PREFIX node properties
+NODE_METRICS = ("degree", "in_degree", "out_degree", "pagerank", "component")
+
+
+def _label(node: Dict[str, Any]) -> Optional[str]:
+    return node["labels"][0] if node.get("labels") else None
+
+
+def _ref(node: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": node["id"], "label": _label(node), "name": node["properties"].get("name")}
+
+
+def pagerank(node_ids: List[str], edges: List[Tuple[str, str]], damping: float = 0.85,
+             max_iterations: int = 50, tolerance: float = 1e-6) -> Dict[str, float]:
+    """PageRank by power iteration; dangling nodes spread their rank evenly. Scores sum to 1."""
+    count = len(node_ids)
+    if not count:
+        return {}
+    out_links: Dict[str, List[str]] = {node_id: [] for node_id in node_ids}
+    for source, target in edges:
+        out_links[source].append(target)
+    rank = {node_id: 1.0 / count for node_id in node_ids}
+    for _ in range(max_iterations):
+        dangling = sum(rank[node_id] for node_id, targets in out_links.items() if not targets)
+        base = (1.0 - damping) / count + damping * dangling / count
+        new_rank = dict.fromkeys(node_ids, base)
+        for source, targets in out_links.items():
+            if targets:
+                share = damping * rank[source] / len(targets)
+                for target in targets:
+                    new_rank[target] += share
+        delta = sum(abs(new_rank[node_id] - rank[node_id]) for node_id in node_ids)
+        rank = new_rank
+        if delta < tolerance:
+            break
+    return rank
+
+
+def connected_components(node_ids: List[str], edges: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Weakly connected components by union-find; component 0 is the largest"""
+    parent = {node_id: node_id for node_id in node_ids}
+
+    def find(node_id: str) -> str:
+        while parent[node_id] != node_id:
+            parent[node_id] = parent[parent[node_id]]
+            node_id = parent[node_id]
+        return node_id
+
+    for source, target in edges:
+        root_source, root_target = find(source), find(target)
+        if root_source != root_target:
+            parent[max(root_source, root_target)] = min(root_source, root_target)
+
+    members: Dict[str, List[str]] = {}
+    for node_id in node_ids:
+        members.setdefault(find(node_id), []).append(node_id)
+    ordered = sorted(members.values(), key=lambda group: (-len(group), min(group)))
+    return {node_id: index for index, group in enumerate(ordered) for node_id in group}
+
+
+@profiled()
+def compute_analytics(graph_data: Dict[str, List[Dict]], summary_size: int = 100,
+                      damping: float = 0.85, max_iterations: int = 50) -> Tuple[Dict[str, Dict], Dict[str, Any]]:
+    """
+    Degree, PageRank, components, location traffic and character co-occurrence of a graph
+    (get_graph_data format). Returns the metrics of each node ({node id: {property: value}})
+    and a summary with the top summary_size entries of each ranking.
+    Co-occurrence strength of two characters is the number of story chunks both appear in
+    plus the number of relationships between them.
+    """
+    nodes = {node["id"]: node for node in graph_data["nodes"]}
+    node_ids = sorted(nodes)
+    edges = [(rel["source"], rel["target"]) for rel in graph_data["relationships"]
+             if rel["source"] in nodes and rel["target"] in nodes]
+
+    in_degree = dict.fromkeys(node_ids, 0)
+    out_degree = dict.fromkeys(node_ids, 0)
+    for source, target in edges:
+        out_degree[source] += 1
+        in_degree[target] += 1
+    ranks = pagerank(node_ids, edges, damping, max_iterations)
+    components = connected_components(node_ids, edges)
+    metrics = {
+        node_id: {
+            "degree": in_degree[node_id] + out_degree[node_id],
+            "in_degree": in_degree[node_id],
+            "out_degree": out_degree[node_id],
+            "pagerank": round(ranks[node_id], 8),
+            "component": components[node_id],
+        }
+        for node_id in node_ids
+    }
+
+    # Location traffic: relationships touching each location and the distinct characters behind them
+    traffic: Dict[str, Dict[str, Any]] = {
+        node_id: {"relationships": 0, "characters": set()}
+        for node_id in node_ids if _label(nodes[node_id]) == LOCATION_LABEL
+    }
+    # Co-occurrence: pairs of characters in the same chunks or directly related
+    pair_relationships: Dict[Tuple[str, str], int] = {}
+    for source, target in edges:
+        for location, other in ((source, target), (target, source)):
+            if location in traffic:
+                traffic[location]["relationships"] += 1
+                if _label(nodes[other]) == CHARACTER_LABEL:
+                    traffic[location]["characters"].add(other)
+        if source != target and _label(nodes[source]) == CHARACTER_LABEL and _label(nodes[target]) == CHARACTER_LABEL:
+            pair = (min(source, target), max(source, target))
+            pair_relationships[pair] = pair_relationships.get(pair, 0) + 1
+
+    characters_by_chunk: Dict[str, List[str]] = {}
+    for node_id in node_ids:
+        if _label(nodes[node_id]) == CHARACTER_LABEL:
+            for chunk_hash in set(nodes[node_id]["properties"].get("chunks") or []):
+                characters_by_chunk.setdefault(chunk_hash, []).append(node_id)
+    pair_chunks: Dict[Tuple[str, str], int] = {}
+    for characters in characters_by_chunk.values():
+        for pair in combinations(sorted(characters), 2):
+            pair_chunks[pair] = pair_chunks.get(pair, 0) + 1
+
+    co_occurrence = sorted(
+        (
+            {
+                "source": _ref(nodes[pair[0]]),
+                "target": _ref(nodes[pair[1]]),
+                "strength": pair_chunks.get(pair, 0) + pair_relationships.get(pair, 0),
+                "shared_chunks": pair_chunks.get(pair, 0),
+                "relationships": pair_relationships.get(pair, 0),
+            }
+            for pair in set(pair_chunks) | set(pair_relationships)
+        ),
+        key=lambda entry: (-entry["strength"], entry["source"]["id"], entry["target"]["id"])
+    )
+    location_traffic = sorted(
+        (
+            {**_ref(nodes[node_id]), "characters": len(entry["characters"]), "relationships": entry["relationships"]}
+            for node_id, entry in traffic.items()
+        ),
+        key=lambda entry: (-entry["characters"], -entry["relationships"], entry["id"])
+    )
+    centrality = sorted(
+        ({**_ref(nodes[node_id]), **metrics[node_id]} for node_id in node_ids),
+        key=lambda entry: (-entry["pagerank"], -entry["degree"], entry["id"])
+    )
+    component_sizes: Dict[int, int] = {}
+    for component in components.values():
+        component_sizes[component] = component_sizes.get(component, 0) + 1
+
+    summary = {
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "node_count": len(node_ids),
+        "relationship_count": len(edges),
+        "components": {
+            "count": len(component_sizes),
+            "sizes": [component_sizes[index] for index in sorted(component_sizes)][:summary_size]
+        },
+        "centrality": centrality[:summary_size],
+        "location_traffic": location_traffic[:summary_size],
+        "co_occurrence": co_occurrence[:summary_size],
+    }
+    return metrics, summary
+
+
+class GraphAnalytics:
+    """
+    Precomputed analytics of each story graph (and of the graph without a story).
+
+    After an ingest, mark_dirty(story_id) recomputes that story only: node metrics
+    (NODE_METRICS) are written as node properties prefixed with ANALYTICS_PREFIX where
+    they changed, so get_graph_data and the extraction prompts leave them out, and the summary
+    is stored in the graph (save_analytics) and cached in process for ANALYTICS_CACHE_TTL
+    seconds, so get() is a dictionary or single-node lookup instead of a graph scan.
+    ANALYTICS_REFRESH selects when recomputation runs: "async" (default, on a background
+    thread that coalesces repeated marks of a story), "sync" (in the ingest call) or "off"
+    (on the next read).
+    """
+
+    def __init__(self, neo4j_builder: Neo4jGraphBuilder):
+        self.neo4j_builder = neo4j_builder
+        self.refresh_mode = os.getenv('ANALYTICS_REFRESH', 'async')
+        self.cache_ttl = float(os.getenv('ANALYTICS_CACHE_TTL', '30'))
+        self.summary_size = int(os.getenv('ANALYTICS_SUMMARY_SIZE', '100'))
+        self.damping = float(os.getenv('ANALYTICS_PAGERANK_DAMPING', '0.85'))
+        self.max_iterations = int(os.getenv('ANALYTICS_PAGERANK_ITERATIONS', '50'))
+        # story_id (None: the graph without a story) -> (time cached, summary)
+        self._cache: Dict[Optional[str], Tuple[float, Dict[str, Any]]] = {}
+        # Stories waiting for the background refresh; _scheduled while a drain task runs
+        self._dirty = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @staticmethod
+    def _scope(story_id: Optional[str]) -> str:
+        return story_id or ""
+
+    def mark_dirty(self, story_id: Optional[str]) -> None:
+        """Schedule recomputation after a story (or, for None, the whole database) was written"""
+        with self._lock:
+            if story_id is None:
+                # Extraction without a story replaces the whole database, stories included
+                self._cache.clear()
+            else:
+                self._cache.pop(story_id, None)
+            self._dirty.add(story_id)
+            schedule = self.refresh_mode == "async" and not self._scheduled
+            if schedule:
+                self._scheduled = True
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="graph-analytics")
+        if schedule:
+            self._executor.submit(self._drain)
+        elif self.refresh_mode == "sync":
+            self._refresh_logged(story_id)
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._dirty:
+                    self._scheduled = False
+                    return
+                story_id = next(iter(self._dirty))
+            self._refresh_logged(story_id)
+
+    def _refresh_logged(self, story_id: Optional[str]) -> None:
+        try:
+            self.refresh(story_id)
+        except Exception as e:
+            logger.exception(f"Error refreshing graph analytics for {story_id or 'the default graph'}: {e}")
+
+    def refresh(self, story_id: Optional[str]) -> Dict[str, Any]:
+        """Recompute the analytics of one story (None: nodes without a story) and store them"""
+        with self._lock:
+            # Writes that land while this runs mark the story again and trigger another pass
+            self._dirty.discard(story_id)
+        # The whole story is recomputed, not just the touched components: PageRank and the
+        # component numbering depend on every node of the story, and one pass over a story is
+        # cheap next to the LLM calls that changed it
+        graph_data = self.neo4j_builder.get_graph_data(
+            story_id, without_story=story_id is None, include_analytics=True
+        )
+        metrics, summary = compute_analytics(graph_data, self.summary_size, self.damping, self.max_iterations)
+        summary["story_id"] = story_id
+
+        # Only nodes whose metrics changed are written, so a small edit touches few nodes
+        current = {node["id"]: node["properties"] for node in graph_data["nodes"]}
+        rows = [
+            {"id": node_id, "properties": {ANALYTICS_PREFIX + name: value for name, value in values.items()}}
+            for node_id, values in metrics.items()
+            if any(current[node_id].get(ANALYTICS_PREFIX + name) != value for name, value in values.items())
+        ]
+        if rows:
+            self.neo4j_builder.set_node_properties(rows)
+        self.neo4j_builder.save_analytics(self._scope(story_id), summary)
+        with self._lock:
+            self._cache[story_id] = (time.monotonic(), summary)
+        return summary
+
+    def get(self, story_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        The analytics summary of a story: cached, else stored, else computed now. With
+        ANALYTICS_REFRESH=async a story written since its last refresh returns the stored
+        summary until the background refresh finishes; otherwise it is recomputed here.
+        """
+        with self._lock:
+            cached = self._cache.get(story_id)
+            dirty = story_id in self._dirty
+        if dirty and self.refresh_mode != "async":
+            return self.refresh(story_id)
+        if cached and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        summary = self.neo4j_builder.get_analytics(self._scope(story_id))
+        if summary is None:
+            return self.refresh(story_id)
+        with self._lock:
+            self._cache[story_id] = (time.monotonic(), summary)
+        return summary
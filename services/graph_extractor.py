@@ -1,18 +1,161 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 import json
+import logging
 import os
+import threading
 
 # from core.prompt_manager import PromptManager
 # from core.llm_client import LLMClient
-from core.neo4j_graph_builder import Neo4jGraphBuilder
+from core.cancellation import OperationCancelled, cancellation_scope, propagate
+from core.neo4j_graph_builder import Neo4jGraphBuilder, strip_internal
+from core.profiling import profiled
 from core.llm_client import LLMClient
+from core.mention_index import MentionIndex, valid_label_pairs
+from core.single_flight import SingleFlight, request_key
+from services.graph_analytics import GraphAnalytics
 from services.prompt_manager import PromptManager
+from services.story_chunks import StoryChunk, iter_story_chunks, split_story
+
+GRAPH_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'graph')
+EXTRACTION_MODES = ("serial", "pipelined", "joint", "partitioned")
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _load_schema(filename: str) -> Dict[str, Any]:
+    """Load a schema file from data/graph once"""
+    with open(os.path.join(GRAPH_DIR, filename), 'r') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def _load_schema_json(filename: str) -> str:
+    """A schema file as a compact JSON string, for prompts"""
+    return json.dumps(_load_schema(filename))
+
+
+@lru_cache(maxsize=None)
+def _schema_version() -> str:
+    """Fingerprint of both schema files"""
+    return request_key(_load_schema_json('nodes_schema.json'), _load_schema_json('relationships_schema.json'))
+
+
+@lru_cache(maxsize=None)
+def _schema_partitions(filename: str, key: str, size: int) -> Tuple[Dict[str, Any], ...]:
+    """A schema file split into schemas of at most size entries of schema[key] each"""
+    schema = _load_schema(filename)
+    types = list(schema.get(key, {}).items())
+    return tuple({**schema, key: dict(types[start:start + size])} for start in range(0, len(types), max(size, 1)))
+
+
+def _merge_nodes(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deduplicate nodes by (type, case-insensitive name), filling in properties missing from the first one"""
+    merged = {}
+    for node in nodes:
+        properties = node.get("properties") or {}
+        name = properties.get("name")
+        if "type" not in node or not isinstance(name, str):
+            continue
+        key = (node["type"], name.strip().lower())
+        if key not in merged:
+            merged[key] = {"type": node["type"], "properties": dict(properties)}
+            continue
+        existing = merged[key]["properties"]
+        for property_name, value in properties.items():
+            if existing.get(property_name) is None:
+                existing[property_name] = value
+    return list(merged.values())
+
+
+def _expect_lists(*keys: str):
+    """Validator for LLMClient.generate_json: the response is an object with a list under each key"""
+    def validate(data: Any) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        for key in keys:
+            if not isinstance(data.get(key, []), list):
+                raise ValueError(f"Expected a list for '{key}'")
+    return validate
+
+
+def _node_item_schema(nodes_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON Schema of one extracted node of the types in a nodes schema"""
+    return {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "type": {"type": "string", "enum": list(nodes_schema.get("node_types", {}))},
+            "properties": {"type": "object", "properties": {"name": {"type": "string"}}, "required": ["name"]}
+        },
+        "required": ["type", "properties"]
+    }
+
+
+def _relationship_item_schema(relationships_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON Schema of one extracted relationship of the types in a relationships schema"""
+    return {
+        "type": "object",
+        "properties": {
+            "source_node": {"type": "string"},
+            "target_node": {"type": "string"},
+            "type": {"type": "string", "enum": list(relationships_schema.get("relationship_types", {}))},
+            "properties": {"type": "object"}
+        },
+        "required": ["source_node", "target_node", "type"]
+    }
+
+
+def _response_schema(title: str, **items: Dict[str, Any]) -> Dict[str, Any]:
+    """response_schema for LLMClient.generate_json: an object with an array of items under each key"""
+    return {
+        "title": title,
+        "type": "object",
+        "properties": {key: {"type": "array", "items": item} for key, item in items.items()},
+        "required": list(items)
+    }
+
+
+@lru_cache(maxsize=None)
+def _nodes_response_schema() -> Dict[str, Any]:
+    """response_schema of GRAPH_NODE_EXTRACTOR with every node type"""
+    return _response_schema("graph_nodes", nodes=_node_item_schema(_load_schema('nodes_schema.json')))
+
 
 class GraphExtractor:
     def __init__(self, neo4j_builder: Neo4jGraphBuilder, llm_client=LLMClient):
         # llm_client is optional for now
         self.neo4j_builder = neo4j_builder
         self.llm_client = llm_client
+        self.extraction_mode = os.getenv('EXTRACTION_MODE', 'serial')
+        self.batch_max_workers = int(os.getenv('BATCH_MAX_WORKERS', '4'))
+        self.pipeline_max_workers = int(os.getenv('PIPELINE_MAX_WORKERS', '8'))
+        self.relationship_prefilter = os.getenv('RELATIONSHIP_PREFILTER', '0') == '1'
+        self.prefilter_window_chars = int(os.getenv('PREFILTER_WINDOW_CHARS', '4000'))
+        self.story_chunk_chars = int(os.getenv('STORY_CHUNK_CHARS', '4000'))
+        # Changed chunks of an incremental story extracted concurrently before the next ones are read
+        self.story_chunk_window = max(1, int(os.getenv('STORY_CHUNK_WINDOW', '16')))
+        # Node/relationship types per LLM call in the partitioned mode
+        self.schema_partition_size = max(1, int(os.getenv('SCHEMA_PARTITION_SIZE', '1')))
+        # Serializes MERGE writes and retractions of incremental stories, so concurrent chunks can neither
+        # duplicate an entity nor overwrite the properties a retraction rebuilds
+        self._merge_lock = threading.Lock()
+        # Identical extractions in flight at the same time run once and share the result
+        self._flights = SingleFlight()
+        # Degree, centrality, components etc. recomputed per story after each ingest
+        self.analytics = GraphAnalytics(neo4j_builder)
+        # Shared by all requests so total concurrency is bounded by the pool sizes
+        self._batch_executor = None
+        self._pipeline_executor = None
+        self._executor_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """Load prompts and schemas ahead of the first request"""
+        PromptManager.load_prompts()
+        _load_schema_json('nodes_schema.json')
+        _load_schema_json('relationships_schema.json')
 
     def create_test_knowledge_graph(self) -> Dict[str, Any]:
         """
@@ -49,7 +192,7 @@ class GraphExtractor:
             }
 
         try:
-            print("Creating test knowledge graph")
+            logger.info("Creating test knowledge graph")
             # Clear existing data
             self.neo4j_builder.clear_database()
             
@@ -230,31 +373,81 @@ class GraphExtractor:
             }
         }
 
-    def extract_graph_nodes_and_relations(self, text: str) -> Dict[str, List[Dict[str, Any]]]:
+    @profiled()
+    def extract_graph_nodes_and_relations(self, text: str, story_id: Optional[str] = None,
+                                          mode: Optional[str] = None,
+                                          prefilter: Optional[bool] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Extract both nodes and relationships from text using predefined patterns.
+        Extract both nodes and relationships from text using the LLM.
         Returns a dictionary containing nodes and relationships.
-        
-        Note: This is a placeholder implementation. The actual LLM-based implementation
-        will be added later.
+
+        Without a story_id the whole database is replaced by the extracted graph.
+        With a story_id only that story's previous graph is replaced, its nodes are
+        tagged with a story_id property and only its graph is returned.
+
+        mode selects the extraction strategy (default: EXTRACTION_MODE env var):
+            - "serial": two LLM calls with the database written and re-read in between
+            - "pipelined": node writes overlap the relationship LLM call, which refers
+              to nodes by local ids; the result is built from the written records
+            - "joint": a single LLM call returns both nodes and relationships
+            - "partitioned": pipelined, with one concurrent LLM call per group of
+              SCHEMA_PARTITION_SIZE node types and per group of relationship types
+
+        prefilter (default: RELATIONSHIP_PREFILTER env var) restricts relationship extraction
+        in the serial, pipelined and partitioned modes to the text windows where related entities
+        co-occur; see _extract_relationships.
+
+        Concurrent calls with the same text, options, schema version and prompt version
+        are coalesced: one extraction runs and every caller receives its result.
+        Afterwards the analytics of the story are refreshed (see GraphAnalytics).
+
+        Runs under the caller's cancellation token (core.cancellation), which is carried
+        into the pool threads: cancelling it closes in-flight LLM streams, stops pending
+        database batches and raises OperationCancelled. The graph of the scope may then be
+        partially written; extracting it again replaces it (update_story instead resumes
+        with the chunks that did not finish).
         """
-        GRAPH_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'graph')
+        # Ownership properties written on every node and used to clear and read back the graph
+        scope = {}
+        if story_id is not None:
+            scope["story_id"] = story_id
+
+        mode = mode or self.extraction_mode
+        if prefilter is None:
+            prefilter = self.relationship_prefilter
+        key = request_key("extract", text, scope, mode, prefilter, _schema_version(), PromptManager.version())
         try:
-            with open(os.path.join(GRAPH_DIR, 'nodes_schema.json'), 'r') as f:
-                schema_json = json.load(f)
-            schema_json = json.dumps(schema_json)
+            return self._flights.do(key, self._extract, text, scope, mode, prefilter)
+        finally:
+            # Even a failed or cancelled extraction may have written part of the graph
+            self.analytics.mark_dirty(story_id)
+
+    def _extract(self, text: str, scope: Dict[str, str], mode: str, prefilter: bool) -> Dict[str, List[Dict[str, Any]]]:
+        if mode == "serial":
+            return self._extract_serial(text, scope, prefilter)
+        if mode == "pipelined":
+            return self._extract_pipelined(text, scope, prefilter)
+        if mode == "joint":
+            return self._extract_joint(text, scope)
+        if mode == "partitioned":
+            return self._extract_partitioned(text, scope, prefilter)
+        return {
+            "status": {
+                "success": False,
+                "message": f"Invalid extraction mode: {mode}. Valid modes are: {', '.join(EXTRACTION_MODES)}"
+            }
+        }
+
+    def _extract_serial(self, text: str, scope: Dict[str, str], prefilter: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Node LLM call, node writes, graph read, relationship LLM call, relationship writes, graph read"""
+        try:
+            schema_json = _load_schema_json('nodes_schema.json')
             # Get the system and user prompts
             system_prompt_nodes = PromptManager.get_prompt("system", "GRAPH_NODE_EXTRACTOR")
             user_prompt_nodes = PromptManager.get_prompt("user", "GRAPH_NODE_EXTRACTOR", text=text, schema_json=schema_json)
-            # print("--------------------------------")
-            # print(system_prompt_nodes)
-            # print("--------------------------------")
-            # print("--------------------------------")
-            # print(user_prompt_nodes)
-            # print("--------------------------------")
 
         except Exception as e:
-            print(f"Error loading prompts: {e}")
+            logger.error(f"Error loading prompts: {e}")
             return {
                 "status": {
                     "success": False,
@@ -266,12 +459,15 @@ class GraphExtractor:
             response = self.llm_client.generate_json(
                     prompt=user_prompt_nodes,
                     system_prompt=system_prompt_nodes,
-                    nsfw=False
+                    nsfw=False,
+                    prompt_name="GRAPH_NODE_EXTRACTOR",
+                    response_schema=_nodes_response_schema(),
+                    validate=_expect_lists("nodes")
             )
 
             extracted_data = json.loads(response)
         except Exception as e:
-            print(f"Error generating LLM Response: {e}")
+            logger.error(f"Error generating LLM Response: {e}")
             return {
                 "status": {
                     "success": False,
@@ -281,22 +477,23 @@ class GraphExtractor:
         
         try:
             nodes = extracted_data.get("nodes", [])
-            self.neo4j_builder.clear_database()
+            self._clear_scope(scope)
             node_ids = {}
             for node_data in nodes:
                 properties = node_data["properties"]
                 # Ensure required properties exist and clean properties
                 if "name" not in node_data["properties"]:
                     continue
+                properties.update(scope)
                     
                 node = self.neo4j_builder.create_node(node_data["type"], properties)
                 node_ids[properties["name"]] = node["elementId"]
                 # Get the complete graph data
-            graph_data = self.neo4j_builder.get_graph_data()
+            graph_data = self.neo4j_builder.get_graph_data(**scope)
             graphdb_nodes = graph_data["nodes"]
             node_types = list(set(node["type"] for node in nodes))
         except Exception as e:
-            print(f"Error creating graph nodes: {e}")
+            logger.error(f"Error creating graph nodes: {e}")
             return {
                 "status": {
                     "success": False,
@@ -305,55 +502,391 @@ class GraphExtractor:
             }
         
         try:
-            with open(os.path.join(GRAPH_DIR, 'relationships_schema.json'), 'r') as f:
-                schema_json = json.load(f)
-            schema_json = json.dumps(schema_json)
-            # Get the system and user prompts
-            system_prompt_relations = PromptManager.get_prompt("system", "GRAPH_RELATIONSHIP_EXTRACTOR")
-            user_prompt_relations = PromptManager.get_prompt("user", "GRAPH_RELATIONSHIP_EXTRACTOR", text=text, schema_json=schema_json, nodes_list=graphdb_nodes)
-            # print("--------------------------------")
-            # print(system_prompt_relations)
-            # print("--------------------------------")
-            # print("--------------------------------")
-            # print(user_prompt_relations)
-            # print("--------------------------------")
+            relationships = self._extract_relationships(text, graphdb_nodes, prefilter)
+
+            #add relationships to neo4j
+            for rel in relationships:
+                from_id = rel["source_node"]
+                to_id = rel["target_node"]
+                properties = rel["properties"]
+                self.neo4j_builder.create_relationship(from_id, to_id, rel["type"], rel["properties"])
+            
+            relationship_types = list(set(rel["type"] for rel in relationships))
+            graph_data = self.neo4j_builder.get_graph_data(**scope)
         except Exception as e:
-            print(f"Error loading relationship prompts: {e}")
+            logger.error(f"Error creating graph relationships: {e}")
             return {
                 "status": {
                     "success": False,
-                    "message": f"Error loading relationship prompts: {e}"
+                    "message": f"Error creating graph relationships: {e}"
                 }
             }
         
+        return self._graph_response(graph_data, node_types, relationship_types)
+
+
+    def _extract_pipelined(self, text: str, scope: Dict[str, str], prefilter: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Node LLM call, then node writes concurrently with the relationship LLM call"""
+        try:
+            system_prompt_nodes = PromptManager.get_prompt("system", "GRAPH_NODE_EXTRACTOR")
+            user_prompt_nodes = PromptManager.get_prompt("user", "GRAPH_NODE_EXTRACTOR", text=text,
+                                                         schema_json=_load_schema_json('nodes_schema.json'))
+        except Exception as e:
+            logger.error(f"Error loading prompts: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error loading prompts: {e}"
+                }
+            }
+
         try:
             response = self.llm_client.generate_json(
-                    prompt=user_prompt_relations,
-                    system_prompt=system_prompt_relations,
-                    nsfw=False
+                    prompt=user_prompt_nodes,
+                    system_prompt=system_prompt_nodes,
+                    nsfw=False,
+                    prompt_name="GRAPH_NODE_EXTRACTOR",
+                    response_schema=_nodes_response_schema(),
+                    validate=_expect_lists("nodes")
+            )
+            nodes = self._assign_local_ids(json.loads(response).get("nodes", []))
+        except Exception as e:
+            logger.error(f"Error generating LLM Response: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error generating LLM Response: {e}"
+                }
+            }
+
+        return self._write_nodes_during(
+            nodes, scope, lambda nodes_list: self._extract_relationships(text, nodes_list, prefilter)
+        )
+
+    def _write_nodes_during(self, nodes: List[Dict[str, Any]], scope: Dict[str, str],
+                            extract_relationships) -> Dict[str, Any]:
+        """
+        Write nodes (with local ids) on the pipeline pool while extract_relationships(nodes_list)
+        runs, then write the relationships and build the response from the written records.
+        The relationship prompt refers to nodes by local id, so it does not have to wait for the writes.
+        """
+        node_writes = self._get_pipeline_executor().submit(propagate(self._write_nodes), nodes, scope)
+        try:
+            relationships = extract_relationships(
+                [{"id": node["id"], "labels": [node["type"]], "properties": node["properties"]} for node in nodes]
+            )
+        except Exception as e:
+            logger.error(f"Error generating relationship LLM Response: {e}")
+            relationships = None
+            relationship_error = e
+
+        try:
+            written_nodes = node_writes.result()
+        except Exception as e:
+            logger.error(f"Error creating graph nodes: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error creating graph nodes: {e}"
+                }
+            }
+        if relationships is None:
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error generating relationship LLM Response: {relationship_error}"
+                }
+            }
+
+        return self._write_relationships_and_respond(written_nodes, relationships)
+
+    def _extract_partitioned(self, text: str, scope: Dict[str, str], prefilter: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Pipelined extraction with the schemas split into groups of SCHEMA_PARTITION_SIZE types:
+        one concurrent node call per node type group, merged and deduplicated by (type, name),
+        then one concurrent relationship call per relationship type group, each given only
+        the nodes its types can connect.
+        """
+        try:
+            node_groups = _schema_partitions('nodes_schema.json', 'node_types', self.schema_partition_size)
+            results = self._map_concurrently(lambda schema: self._extract_node_group(text, schema), list(node_groups))
+            nodes = self._assign_local_ids(_merge_nodes([node for group in results for node in group]))
+        except Exception as e:
+            logger.error(f"Error generating LLM Response: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error generating LLM Response: {e}"
+                }
+            }
+
+        return self._write_nodes_during(
+            nodes, scope, lambda nodes_list: self._extract_partitioned_relationships(text, nodes_list, prefilter)
+        )
+
+    @profiled()
+    def _extract_node_group(self, text: str, schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """GRAPH_NODE_EXTRACTOR for one group of node types; nodes of other types are dropped"""
+        node_types = schema["node_types"]
+        response = self.llm_client.generate_json(
+                prompt=PromptManager.get_prompt("user", "GRAPH_NODE_EXTRACTOR", text=text,
+                                                schema_json=json.dumps(schema)),
+                system_prompt=PromptManager.get_prompt("system", "GRAPH_NODE_EXTRACTOR"),
+                nsfw=False,
+                prompt_name=f"GRAPH_NODE_EXTRACTOR[{','.join(node_types)}]",
+                response_schema=_response_schema("graph_nodes", nodes=_node_item_schema(schema)),
+                validate=_expect_lists("nodes")
+        )
+        return [node for node in json.loads(response).get("nodes", []) if node.get("type") in node_types]
+
+    def _extract_partitioned_relationships(self, text: str, nodes_list: List[Dict[str, Any]],
+                                           prefilter: bool) -> List[Dict[str, Any]]:
+        calls = []
+        for schema in _schema_partitions('relationships_schema.json', 'relationship_types', self.schema_partition_size):
+            labels = set()
+            for definition in schema["relationship_types"].values():
+                labels.update(definition.get("valid_sources", []))
+                labels.update(definition.get("valid_targets", []))
+            group_nodes = [node for node in nodes_list if (node.get("labels") or [None])[0] in labels]
+            if len(group_nodes) >= 2:
+                calls.append((schema, group_nodes))
+
+        relationships = {}
+        results = self._map_concurrently(
+            lambda call: self._extract_relationships(text, call[1], prefilter, schema=call[0]), calls
+        )
+        for (schema, _), group_relationships in zip(calls, results):
+            for rel in group_relationships:
+                if rel.get("type") not in schema["relationship_types"]:
+                    continue
+                key = (str(rel.get("source_node")), str(rel.get("target_node")), rel.get("type"))
+                relationships.setdefault(key, rel)
+        return list(relationships.values())
+
+    @profiled()
+    def _extract_relationships(self, text: str, nodes_list: List[Dict[str, Any]],
+                               prefilter: bool = False,
+                               schema: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Run GRAPH_RELATIONSHIP_EXTRACTOR for nodes_list (get_graph_data format) over the text.
+
+        Without prefilter this is one LLM call over the full text with every node.
+        With prefilter, a MentionIndex finds where each node's name and aliases occur and
+        the text is split into paragraph windows of PREFILTER_WINDOW_CHARS. Only windows
+        where two mentioned nodes form a pair allowed by the relationship schema get an
+        LLM call, with that window's text and only those nodes. Calls run concurrently and
+        their relationships are merged.
+
+        schema restricts extraction to part of relationships_schema.json (see _extract_partitioned).
+        """
+        if not prefilter:
+            return self._extract_relationships_call(text, nodes_list, schema)
+
+        index = MentionIndex(nodes_list)
+        label_pairs = valid_label_pairs(schema or _load_schema('relationships_schema.json'))
+        nodes_by_id = {node["id"]: node for node in nodes_list}
+        calls = []
+        for window in index.windows(text, self.prefilter_window_chars):
+            pairs = index.candidate_pairs(window["node_ids"], label_pairs)
+            if not pairs:
+                continue
+            window_node_ids = sorted({node_id for pair in pairs for node_id in pair})
+            calls.append((text[window["start"]:window["end"]], [nodes_by_id[node_id] for node_id in window_node_ids]))
+
+        relationships = {}
+        for window_relationships in self._map_concurrently(
+                lambda call: self._extract_relationships_call(*call, schema), calls):
+            for rel in window_relationships:
+                key = (str(rel.get("source_node")), str(rel.get("target_node")), rel.get("type"))
+                relationships.setdefault(key, rel)
+        return list(relationships.values())
+
+    def _extract_relationships_call(self, text: str, nodes_list: List[Dict[str, Any]],
+                                    schema: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        prompt_name = "GRAPH_RELATIONSHIP_EXTRACTOR"
+        if schema is None:
+            schema_json = _load_schema_json('relationships_schema.json')
+        else:
+            schema_json = json.dumps(schema)
+            prompt_name += f"[{','.join(schema['relationship_types'])}]"
+        system_prompt_relations = PromptManager.get_prompt("system", "GRAPH_RELATIONSHIP_EXTRACTOR")
+        user_prompt_relations = PromptManager.get_prompt(
+            "user", "GRAPH_RELATIONSHIP_EXTRACTOR", text=text,
+            schema_json=schema_json,
+            nodes_list=nodes_list
+        )
+        response = self.llm_client.generate_json(
+                prompt=user_prompt_relations,
+                system_prompt=system_prompt_relations,
+                nsfw=False,
+                prompt_name=prompt_name,
+                response_schema=_response_schema(
+                    "graph_relationships",
+                    relationships=_relationship_item_schema(schema or _load_schema('relationships_schema.json'))
+                ),
+                validate=_expect_lists("relationships")
+        )
+        return json.loads(response).get("relationships", [])
+
+    def _map_concurrently(self, fn, items: List[Any]) -> List[Any]:
+        """
+        Apply fn to each item on the pipeline pool and return the results in order.
+        Runs inline when there is a single item or when already on a pipeline thread,
+        so nested use can never exhaust the pool.
+        """
+        if len(items) <= 1 or threading.current_thread().name.startswith("graph-pipeline"):
+            return [fn(item) for item in items]
+        executor = self._get_pipeline_executor()
+        return [future.result() for future in [executor.submit(propagate(fn), item) for item in items]]
+
+    def _extract_joint(self, text: str, scope: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
+        """A single LLM call returning nodes with local ids and relationships between them"""
+        try:
+            system_prompt = PromptManager.get_prompt("system", "GRAPH_JOINT_EXTRACTOR")
+            user_prompt = PromptManager.get_prompt(
+                "user", "GRAPH_JOINT_EXTRACTOR", text=text,
+                nodes_schema_json=_load_schema_json('nodes_schema.json'),
+                relationships_schema_json=_load_schema_json('relationships_schema.json')
             )
+        except Exception as e:
+            logger.error(f"Error loading prompts: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error loading prompts: {e}"
+                }
+            }
 
+        try:
+            response = self.llm_client.generate_json(
+                    prompt=user_prompt,
+                    system_prompt=system_prompt,
+                    nsfw=False,
+                    prompt_name="GRAPH_JOINT_EXTRACTOR",
+                    response_schema=_response_schema(
+                        "graph",
+                        nodes=_node_item_schema(_load_schema('nodes_schema.json')),
+                        relationships=_relationship_item_schema(_load_schema('relationships_schema.json'))
+                    ),
+                    validate=_expect_lists("nodes", "relationships")
+            )
             extracted_data = json.loads(response)
+            nodes = self._assign_local_ids(extracted_data.get("nodes", []))
             relationships = extracted_data.get("relationships", [])
+        except Exception as e:
+            logger.error(f"Error generating LLM Response: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error generating LLM Response: {e}"
+                }
+            }
 
-            #add relationships to neo4j
+        try:
+            written_nodes = self._write_nodes(nodes, scope)
+        except Exception as e:
+            logger.error(f"Error creating graph nodes: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error creating graph nodes: {e}"
+                }
+            }
+        return self._write_relationships_and_respond(written_nodes, relationships)
+
+    @staticmethod
+    def _assign_local_ids(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Keep nodes that have a type and a name, giving each a local id ("n0", "n1", ...)
+        unless the LLM already provided a unique one. Generated ids skip every id the
+        LLM provided, so relationships keep referring to the nodes it meant.
+        """
+        nodes = [
+            node_data for node_data in nodes
+            if "type" in node_data and "name" in (node_data.get("properties") or {})
+        ]
+        given_ids = {str(node_data["id"]) for node_data in nodes if node_data.get("id")}
+        valid_nodes = []
+        seen_ids = set()
+        for node_data in nodes:
+            properties = node_data["properties"]
+            local_id = str(node_data.get("id") or "")
+            if not local_id or local_id in seen_ids:
+                index = len(valid_nodes)
+                while f"n{index}" in seen_ids or f"n{index}" in given_ids:
+                    index += 1
+                local_id = f"n{index}"
+            seen_ids.add(local_id)
+            valid_nodes.append({"id": local_id, "type": node_data["type"], "properties": properties})
+        return valid_nodes
+
+    def _clear_scope(self, scope: Dict[str, str]) -> None:
+        """Clear the graph owned by the scope, or the whole database for an empty scope"""
+        if not scope:
+            self.neo4j_builder.clear_database()
+        else:
+            self.neo4j_builder.clear_story(scope["story_id"])
+
+    @profiled()
+    def _write_nodes(self, nodes: List[Dict[str, Any]], scope: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Replace the scope's graph with the given nodes.
+        Returns the written nodes in get_graph_data format, keyed by local id.
+        """
+        self._clear_scope(scope)
+
+        nodes_by_label = {}
+        for node in nodes:
+            properties = {**node["properties"], **scope}
+            nodes_by_label.setdefault(node["type"], []).append({"key": node["id"], "properties": properties})
+
+        written_nodes = {}
+        for label, rows in nodes_by_label.items():
+            for record in self.neo4j_builder.create_nodes(label, rows):
+                written_nodes[record["key"]] = {
+                    "id": record["elementId"],
+                    "labels": [label],
+                    "properties": record["properties"]
+                }
+        return written_nodes
+
+    @profiled()
+    def _write_relationships_and_respond(self, written_nodes: Dict[str, Dict[str, Any]],
+                                         relationships: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Write relationships between local node ids and build the response from the written records"""
+        try:
+            rows_by_type = {}
             for rel in relationships:
-                from_id = rel["source_node"]
-                to_id = rel["target_node"]
-                properties = rel["properties"]
-                self.neo4j_builder.create_relationship(from_id, to_id, rel["type"], rel["properties"])
-            
-            relationship_types = list(set(rel["type"] for rel in extracted_data["relationships"]))
-            graph_data = self.neo4j_builder.get_graph_data()
+                source = written_nodes.get(str(rel.get("source_node")))
+                target = written_nodes.get(str(rel.get("target_node")))
+                if not source or not target or not rel.get("type"):
+                    continue
+                rows_by_type.setdefault(rel["type"], []).append({
+                    "source": source["id"],
+                    "target": target["id"],
+                    "properties": rel.get("properties") or {}
+                })
+
+            graph_relationships = []
+            for rel_type, rows in rows_by_type.items():
+                graph_relationships.extend(self.neo4j_builder.create_relationships(rel_type, rows))
         except Exception as e:
-            print(f"Error creating graph relationships: {e}")
+            logger.error(f"Error creating graph relationships: {e}")
             return {
                 "status": {
                     "success": False,
                     "message": f"Error creating graph relationships: {e}"
                 }
             }
-        
+
+        graph_nodes = list(written_nodes.values())
+        graph_data = {"nodes": graph_nodes, "relationships": graph_relationships}
+        node_types = list(set(node["labels"][0] for node in graph_nodes))
+        return self._graph_response(graph_data, node_types, list(rows_by_type))
+
+    @staticmethod
+    def _graph_response(graph_data: Dict[str, List[Dict]], node_types: List[str],
+                        relationship_types: List[str]) -> Dict[str, Any]:
         return {
                 "metadata": {
                     "version": "1.0",
@@ -370,4 +903,312 @@ class GraphExtractor:
                 }
             }
 
+    def _get_pipeline_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._pipeline_executor is None:
+                self._pipeline_executor = ThreadPoolExecutor(
+                    max_workers=self.pipeline_max_workers,
+                    thread_name_prefix="graph-pipeline"
+                )
+            return self._pipeline_executor
+
+    @profiled()
+    def update_story(self, story_id: str, text: Union[str, Iterable[str]], prefilter: Optional[bool] = None,
+                     mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Incrementally (re)build the graph of a story from its full text.
+
+        The text (a string, or an iterable of lines such as an open file, which is read
+        as it is chunked) is split into content-defined chunks (services.story_chunks)
+        and each chunk's fingerprint is stored as a StoryChunk node. Entities are merged
+        per story on (label, name) and list the chunks that produced them; relationships
+        carry the chunk_hash that produced them. On resubmission only new chunks are
+        extracted (concurrently, STORY_CHUNK_WINDOW chunks at a time), and the facts owned
+        by chunks that disappeared are retracted, so a light edit costs a fraction of a
+        full extraction. Identical submissions of a string in flight at the same time are
+        coalesced.
+
+        mode (default: EXTRACTION_MODE env var) "partitioned" extracts each chunk with one
+        call per schema type group (see _extract_partitioned); every other mode uses one node
+        and one relationship call per chunk, since merged nodes must be written before their
+        relationships can refer to them.
+
+        Cancelling the caller's token (core.cancellation) retracts the chunks in progress;
+        chunks that finished keep their facts and fingerprints, so the next update of the
+        story extracts only the chunks that did not finish.
+        """
+        mode = mode or self.extraction_mode
+        if mode not in EXTRACTION_MODES:
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Invalid extraction mode: {mode}. Valid modes are: {', '.join(EXTRACTION_MODES)}"
+                }
+            }
+        partitioned = mode == "partitioned"
+        if prefilter is None:
+            prefilter = self.relationship_prefilter
+        try:
+            if not isinstance(text, str):
+                # A stream cannot be keyed without reading it, so it is not coalesced
+                return self._update_story(story_id, iter_story_chunks(text, self.story_chunk_chars),
+                                          prefilter, partitioned)
+            key = request_key("update_story", story_id, text, prefilter, partitioned, _schema_version(),
+                              PromptManager.version())
+            return self._flights.do(key, self._update_story, story_id, split_story(text, self.story_chunk_chars),
+                                    prefilter, partitioned)
+        finally:
+            self.analytics.mark_dirty(story_id)
+
+    def _update_story(self, story_id: str, chunks: Iterable[StoryChunk], prefilter: bool,
+                      partitioned: bool) -> Dict[str, Any]:
+        try:
+            existing = self.neo4j_builder.get_story_chunks(story_id)
+            if not existing:
+                # A story built by extract_graph_nodes_and_relations has nodes but no chunk fingerprints,
+                # and so does one whose first update stopped before any chunk finished. Merging into
+                # them would duplicate relationships and let the next edit retract every adopted node,
+                # so the first incremental update rebuilds the story from scratch.
+                self.neo4j_builder.clear_story(story_id)
+        except Exception as e:
+            logger.error(f"Error loading story chunks: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error loading story chunks: {e}"
+                }
+            }
+
+        # Only the hashes and positions of the whole story are kept; chunk texts are held one window at a time
+        positions: Dict[str, int] = {}
+        total = added = 0
+        failed = []
+        window: List[StoryChunk] = []
+
+        def extract_window() -> None:
+            nonlocal added
+            # Chunks without a fingerprint may still own facts from a run that died partway (a crash
+            # skips the retraction a failure or cancellation does), so they are retracted first
+            if existing:
+                with self._merge_lock:
+                    self.neo4j_builder.retract_story_chunks(story_id, [chunk.hash for chunk in window])
+            outcomes = self._map_concurrently(
+                lambda chunk: self._extract_story_chunk(story_id, chunk, prefilter, partitioned), window
+            )
+            added += len(window)
+            failed.extend(message for message in outcomes if message)
+            window.clear()
+
+        try:
+            for chunk in chunks:
+                total += 1
+                if chunk.hash in positions:
+                    continue
+                positions[chunk.hash] = chunk.position
+                if chunk.hash not in existing:
+                    window.append(chunk)
+                    if len(window) >= self.story_chunk_window:
+                        extract_window()
+            if window:
+                extract_window()
+        except Exception as e:
+            logger.error(f"Error extracting story chunks: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error extracting story chunks: {e}"
+                }
+            }
+
+        # Retracted last, so nodes that moved to a new chunk keep their element ids
+        removed = [chunk_hash for chunk_hash in existing if chunk_hash not in positions]
+        try:
+            if removed:
+                with self._merge_lock:
+                    self.neo4j_builder.retract_story_chunks(story_id, removed)
+        except Exception as e:
+            logger.error(f"Error retracting story chunks: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error retracting story chunks: {e}"
+                }
+            }
+
+        try:
+            # Extracted chunks recorded their own fingerprints; positions of unchanged chunks may have shifted
+            moved = [
+                {"hash": chunk_hash, "position": position}
+                for chunk_hash, position in positions.items()
+                if chunk_hash in existing and existing[chunk_hash] != position
+            ]
+            if moved:
+                self.neo4j_builder.record_story_chunks(story_id, moved)
+            graph_data = self.neo4j_builder.get_graph_data(story_id)
+        except Exception as e:
+            logger.error(f"Error reading story graph: {e}")
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error reading story graph: {e}"
+                }
+            }
+
+        node_types = list(set(node["labels"][0] for node in graph_data["nodes"] if node["labels"]))
+        relationship_types = list(set(rel["type"] for rel in graph_data["relationships"]))
+        response = self._graph_response(graph_data, node_types, relationship_types)
+        response["metadata"]["chunks"] = {
+            "total": total,
+            "reused": total - added,
+            "extracted": added - len(failed),
+            "retracted": len(removed),
+            "failed": len(failed)
+        }
+        if failed:
+            response["status"] = {
+                "success": False,
+                "message": f"{len(failed)} of {added} changed chunks failed: {failed[0]}"
+            }
+        return response
+
+    @profiled()
+    def _extract_story_chunk(self, story_id: str, chunk: StoryChunk, prefilter: bool,
+                             partitioned: bool = False) -> Optional[str]:
+        """
+        Extract and merge one chunk of an incremental story; returns an error message or None.
+        The chunk's fingerprint is recorded as soon as its facts are written, so an update that
+        stops partway resumes after its finished chunks. A failed or cancelled chunk is retracted
+        and gets no fingerprint, so the next update extracts it again.
+        """
+        try:
+            if partitioned:
+                node_groups = _schema_partitions('nodes_schema.json', 'node_types', self.schema_partition_size)
+                results = self._map_concurrently(
+                    lambda schema: self._extract_node_group(chunk.text, schema), list(node_groups)
+                )
+                nodes = self._assign_local_ids(_merge_nodes([node for group in results for node in group]))
+            else:
+                response = self.llm_client.generate_json(
+                        prompt=PromptManager.get_prompt("user", "GRAPH_NODE_EXTRACTOR", text=chunk.text,
+                                                        schema_json=_load_schema_json('nodes_schema.json')),
+                        system_prompt=PromptManager.get_prompt("system", "GRAPH_NODE_EXTRACTOR"),
+                        nsfw=False,
+                        prompt_name="GRAPH_NODE_EXTRACTOR",
+                        response_schema=_nodes_response_schema(),
+                        validate=_expect_lists("nodes")
+                )
+                nodes = self._assign_local_ids(json.loads(response).get("nodes", []))
+
+            rows_by_label = {}
+            for node in nodes:
+                # None values would erase properties contributed by other chunks
+                properties = {key: value for key, value in node["properties"].items() if value is not None}
+                rows_by_label.setdefault(node["type"], []).append(
+                    {"key": node["id"], "name": properties["name"], "properties": properties}
+                )
+            merged_nodes = {}
+            with self._merge_lock:
+                for label, rows in rows_by_label.items():
+                    for record in self.neo4j_builder.merge_story_nodes(story_id, chunk.hash, label, rows):
+                        properties = {
+                            key: value for key, value in strip_internal(record["properties"]).items() if key != "chunks"
+                        }
+                        merged_nodes[record["key"]] = {
+                            "id": record["elementId"],
+                            "labels": record["labels"],
+                            "properties": properties
+                        }
+
+            if partitioned:
+                relationships = self._extract_partitioned_relationships(
+                    chunk.text, list(merged_nodes.values()), prefilter
+                )
+            else:
+                relationships = self._extract_relationships(chunk.text, list(merged_nodes.values()), prefilter)
+            element_ids = {node["id"] for node in merged_nodes.values()}
+            rows_by_type = {}
+            for rel in relationships:
+                if rel.get("source_node") in element_ids and rel.get("target_node") in element_ids and rel.get("type"):
+                    rows_by_type.setdefault(rel["type"], []).append({
+                        "source": rel["source_node"],
+                        "target": rel["target_node"],
+                        "properties": {**(rel.get("properties") or {}), "story_id": story_id, "chunk_hash": chunk.hash}
+                    })
+            for rel_type, rows in rows_by_type.items():
+                self.neo4j_builder.create_relationships(rel_type, rows)
+            self.neo4j_builder.record_story_chunks(story_id, [{"hash": chunk.hash, "position": chunk.position}])
+            return None
+        except OperationCancelled:
+            # Undo this chunk's partial merge; the retraction itself must not be cancelled
+            with cancellation_scope(None), self._merge_lock:
+                self.neo4j_builder.retract_story_chunks(story_id, [chunk.hash])
+            raise
+        except Exception as e:
+            logger.error(f"Error extracting story chunk {chunk.position}: {e}")
+            try:
+                with self._merge_lock:
+                    self.neo4j_builder.retract_story_chunks(story_id, [chunk.hash])
+            except Exception as retract_error:
+                logger.error(f"Error retracting failed story chunk {chunk.position}: {retract_error}")
+            return f"chunk {chunk.position}: {e}"
+
+    def _get_batch_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(
+                    max_workers=self.batch_max_workers,
+                    thread_name_prefix="graph-batch"
+                )
+            return self._batch_executor
+
+    def _extract_batch_item(self, story_id: str, text: str) -> Dict[str, Any]:
+        try:
+            return self.extract_graph_nodes_and_relations(text, story_id=story_id)
+        except Exception as e:
+            return {
+                "status": {
+                    "success": False,
+                    "message": f"Error extracting document: {e}"
+                }
+            }
+
+    def extract_batch(self, documents: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Extract a graph for each document ({"id": str, "text": str}) on the shared
+        bounded pool, yielding {"id": ..., **result} as each document finishes.
+        Each document id is used as the story_id, so documents do not clear each other.
+        Invalid documents and failed extractions yield an error result for that
+        document only. Closing the generator cancels documents that have not started;
+        running ones stop when the current cancellation token is cancelled.
+        """
+        executor = self._get_batch_executor()
+        futures = {}
+        seen_ids = set()
+        try:
+            for index, document in enumerate(documents):
+                doc_id = document.get("id") if isinstance(document, dict) else None
+                text = document.get("text") if isinstance(document, dict) else None
+                if doc_id is None or not isinstance(text, str):
+                    message = "Document must have an id and a text"
+                elif str(doc_id) in seen_ids:
+                    message = f"Duplicate document id: {doc_id}"
+                else:
+                    seen_ids.add(str(doc_id))
+                    future = executor.submit(propagate(self._extract_batch_item), str(doc_id), text)
+                    futures[future] = (index, doc_id)
+                    continue
+                yield {
+                    "id": doc_id,
+                    "index": index,
+                    "status": {
+                        "success": False,
+                        "message": message
+                    }
+                }
 
+            for future in as_completed(futures):
+                index, doc_id = futures[future]
+                yield {"id": doc_id, "index": index, **future.result()}
+        finally:
+            for future in futures:
+                future.cancel()
@@ -1,67 +1,206 @@
+import logging
 import os
+import threading
+import time
 import yaml
-from typing import Dict, Any
+from string import Formatter
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, NamedTuple, Optional, Tuple
 from collections import defaultdict
 
+from core.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+
+class _CompiledTemplate:
+    """A user prompt template parsed once, rendered with missing fields replaced by "N/A" """
+
+    _formatter = Formatter()
+
+    def __init__(self, template: str):
+        self.template = template
+        try:
+            self.parts = list(self._formatter.parse(template))
+        except ValueError:
+            self.parts = None
+        # Only plain {name} / {name!r} / {name:spec} fields take the fast path; anything else
+        # (positional, attribute or index access, nested specs, malformed) uses format_map
+        self.simple = self.parts is not None and all(
+            field is None or (field.isidentifier() and "{" not in (spec or ""))
+            for _, field, spec, _ in self.parts
+        )
+
+    def render(self, values: Dict[str, Any]) -> str:
+        if not self.simple:
+            return self.template.format_map(defaultdict(lambda: "N/A", values))
+        pieces = []
+        for literal, field, spec, conversion in self.parts:
+            pieces.append(literal)
+            if field is None:
+                continue
+            value = values.get(field, "N/A")
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            pieces.append(format(value, spec))
+        return "".join(pieces)
+
+
+class PromptSnapshot(NamedTuple):
+    """An immutable, fully prepared version of both prompt files"""
+    version: int
+    system: Mapping[str, str]
+    user: Mapping[str, str]
+    templates: Mapping[str, _CompiledTemplate]
+    mtimes: Tuple[Optional[float], Optional[float]]
+
+
 class PromptManager:
     PROMPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'prompts')
     SYSTEM_PROMPTS_FILE = 'system_prompts.yaml'
     USER_PROMPTS_FILE = 'user_prompts.yaml'
+    # Seconds between checks of the prompt files' mtimes for out-of-band edits
+    RELOAD_CHECK_INTERVAL = float(os.getenv('PROMPT_RELOAD_INTERVAL', '2.0'))
+
+    # Readers only ever dereference _snapshot once; writers build a new snapshot under
+    # _lock and swap the reference, so a reader never sees a half-reloaded state
+    _snapshot: Optional[PromptSnapshot] = None
+    _lock = threading.Lock()
+    _next_check = 0.0
 
-    _system_prompts = {}
-    _user_prompts = {}
+    @classmethod
+    def load_prompts(cls) -> PromptSnapshot:
+        with cls._lock:
+            snapshot = cls._load_locked()
+        logger.info("Loaded prompts")
+        return snapshot
+
+    @classmethod
+    def _load_locked(cls) -> PromptSnapshot:
+        mtimes = cls._file_mtimes()
+        return cls._build_snapshot(
+            cls._load_yaml(cls.SYSTEM_PROMPTS_FILE),
+            cls._load_yaml(cls.USER_PROMPTS_FILE),
+            mtimes
+        )
+
+    @classmethod
+    def _build_snapshot(cls, system_prompts: Dict[str, str], user_prompts: Dict[str, str],
+                        mtimes: Tuple[Optional[float], Optional[float]]) -> PromptSnapshot:
+        """Prepare and publish a new snapshot; callers hold _lock"""
+        previous = cls._snapshot
+        snapshot = PromptSnapshot(
+            version=previous.version + 1 if previous else 1,
+            system=MappingProxyType(dict(system_prompts)),
+            user=MappingProxyType(dict(user_prompts)),
+            templates=MappingProxyType({
+                name: _CompiledTemplate(template) for name, template in user_prompts.items()
+            }),
+            mtimes=mtimes
+        )
+        cls._snapshot = snapshot
+        cls._next_check = time.monotonic() + cls.RELOAD_CHECK_INTERVAL
+        return snapshot
+
+    @classmethod
+    def _file_mtimes(cls) -> Tuple[Optional[float], Optional[float]]:
+        mtimes = []
+        for filename in (cls.SYSTEM_PROMPTS_FILE, cls.USER_PROMPTS_FILE):
+            try:
+                mtimes.append(os.stat(os.path.join(cls.PROMPTS_DIR, filename)).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    @classmethod
+    def _current(cls) -> PromptSnapshot:
+        """
+        The current snapshot. Loads the prompts on first use and, at most once per
+        RELOAD_CHECK_INTERVAL, reloads them if a prompt file changed on disk.
+        """
+        snapshot = cls._snapshot
+        if snapshot is None:
+            return cls._reload(None)
+        if time.monotonic() >= cls._next_check:
+            cls._next_check = time.monotonic() + cls.RELOAD_CHECK_INTERVAL
+            if cls._file_mtimes() != snapshot.mtimes:
+                return cls._reload(snapshot)
+        return snapshot
 
     @classmethod
-    def load_prompts(cls):
-        cls._system_prompts = cls._load_yaml(cls.SYSTEM_PROMPTS_FILE)
-        cls._user_prompts = cls._load_yaml(cls.USER_PROMPTS_FILE)
-        print("Loaded prompts")
+    def _reload(cls, stale: Optional[PromptSnapshot]) -> PromptSnapshot:
+        """Reload unless another thread already replaced the stale snapshot while we waited"""
+        with cls._lock:
+            if cls._snapshot is not stale:
+                return cls._snapshot
+            snapshot = cls._load_locked()
+        logger.info("Loaded prompts")
+        return snapshot
+
+    @classmethod
+    def version(cls) -> int:
+        """Version of the current prompts; increases on every load, reload or update"""
+        return cls._current().version
 
     @classmethod
     def _load_yaml(cls, filename):
         file_path = os.path.join(cls.PROMPTS_DIR, filename)
         if os.path.exists(file_path):
             with open(file_path, 'r') as f:
-                return yaml.safe_load(f)
+                return yaml.safe_load(f) or {}
         return {}
 
     @classmethod
     def save_prompts(cls):
-        cls._save_yaml(cls.SYSTEM_PROMPTS_FILE, cls._system_prompts)
-        cls._save_yaml(cls.USER_PROMPTS_FILE, cls._user_prompts)
-        print("Prompts saved successfully")
+        snapshot = cls._current()
+        cls._save_yaml(cls.SYSTEM_PROMPTS_FILE, dict(snapshot.system))
+        cls._save_yaml(cls.USER_PROMPTS_FILE, dict(snapshot.user))
+        logger.info("Prompts saved successfully")
 
     @classmethod
     def _save_yaml(cls, filename, data):
         file_path = os.path.join(cls.PROMPTS_DIR, filename)
+        tmp_path = f"{file_path}.tmp"
         try:
-            with open(file_path, 'w') as f:
+            # Write then rename, so a concurrent reload never parses a partially written file
+            with open(tmp_path, 'w') as f:
                 yaml.dump(data, f, default_flow_style=False)
+            os.replace(tmp_path, file_path)
         except Exception as e:
-            print(f"Error saving prompts to {filename}: {e}")
+            logger.error(f"Error saving prompts to {filename}: {e}")
 
     @classmethod
+    @profiled("PromptManager.get_prompt")
     def get_prompt(cls, prompt_type: str, prompt_name: str, **kwargs) -> str:
+        snapshot = cls._current()
         if prompt_type == "system":
-            return cls._system_prompts.get(prompt_name, "")
+            return snapshot.system.get(prompt_name, "")
         elif prompt_type == "user":
-            template = cls._user_prompts.get(prompt_name, "")
-            return template.format_map(defaultdict(lambda: "N/A", kwargs))
+            template = snapshot.templates.get(prompt_name)
+            return template.render(kwargs) if template else ""
         else:
             raise ValueError(f"Invalid prompt type: {prompt_type}")
 
     @classmethod
     def update_prompt(cls, name: str, content: str, prompt_type: str):
-        if prompt_type == 'system':
-            cls._system_prompts[name] = content
-        elif prompt_type == 'user':
-            cls._user_prompts[name] = content
-        else:
+        if prompt_type not in ('system', 'user'):
             raise ValueError("Invalid prompt type")
-        
-        cls.save_prompts()
-        cls.load_prompts()
-        print("Reloaded prompts after update")
 
-# Load prompts when the module is imported
-PromptManager.load_prompts()
+        cls._current()
+        with cls._lock:
+            snapshot = cls._snapshot
+            system_prompts = dict(snapshot.system)
+            user_prompts = dict(snapshot.user)
+            if prompt_type == 'system':
+                system_prompts[name] = content
+                cls._save_yaml(cls.SYSTEM_PROMPTS_FILE, system_prompts)
+            else:
+                user_prompts[name] = content
+                cls._save_yaml(cls.USER_PROMPTS_FILE, user_prompts)
+            # Built from memory rather than re-parsed; the new mtimes mark our own write as seen
+            cls._build_snapshot(system_prompts, user_prompts, cls._file_mtimes())
+        logger.info("Reloaded prompts after update")
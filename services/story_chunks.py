@@ -0,0 +1,75 @@
+import hashlib
+import io
+import re
+from typing import Iterable, Iterator, List, NamedTuple
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class StoryChunk(NamedTuple):
+    hash: str
+    position: int
+    text: str
+
+
+def _fingerprint(text: str) -> str:
+    # Whitespace-only edits do not change a chunk's fingerprint
+    return hashlib.sha256(_WHITESPACE.sub(" ", text).strip().encode("utf-8")).hexdigest()
+
+
+def iter_story_chunks(lines: Iterable[str], target_chars: int = 4000) -> Iterator[StoryChunk]:
+    """
+    Split a story read line by line (e.g. from an open file) into paragraph-aligned
+    chunks with content-defined boundaries, holding at most one chunk in memory.
+
+    A chunk ends after a paragraph whose own fingerprint selects it as a boundary
+    (about one paragraph in four) once the chunk holds target_chars / 2, or
+    unconditionally at target_chars * 2. Because boundaries depend on paragraph content
+    rather than offsets, editing one paragraph only changes the chunk containing it:
+    the chunks before and after keep their text and therefore their hash.
+    Paragraphs are separated by blank (whitespace-only) lines.
+    """
+    position = 0
+    current = []
+    current_chars = 0
+    paragraph_lines = []
+
+    def end_paragraph():
+        nonlocal position, current, current_chars
+        paragraph = "".join(paragraph_lines).strip()
+        paragraph_lines.clear()
+        if not paragraph:
+            return None
+        current.append(paragraph)
+        current_chars += len(paragraph)
+        is_boundary = int(_fingerprint(paragraph)[:8], 16) % 4 == 0
+        if (current_chars >= target_chars // 2 and is_boundary) or current_chars >= target_chars * 2:
+            return flush()
+        return None
+
+    def flush():
+        nonlocal position, current, current_chars
+        chunk_text = "\n\n".join(current)
+        chunk = StoryChunk(_fingerprint(chunk_text), position, chunk_text)
+        position += 1
+        current = []
+        current_chars = 0
+        return chunk
+
+    for line in lines:
+        if line.strip():
+            paragraph_lines.append(line)
+            continue
+        chunk = end_paragraph()
+        if chunk is not None:
+            yield chunk
+    chunk = end_paragraph()
+    if chunk is not None:
+        yield chunk
+    if current:
+        yield flush()
+
+
+def split_story(text: str, target_chars: int = 4000) -> List[StoryChunk]:
+    """Split a story held in memory into chunks; see iter_story_chunks"""
+    return list(iter_story_chunks(io.StringIO(text), target_chars))
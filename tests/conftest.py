@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core.llm_client import LLMClient
+from core.memory_graph_builder import InMemoryGraphBuilder
+from scripts.fake_llm_server import extraction_content
+
+
+class FakeLLMClient:
+    """In-process stand-in for LLMClient.generate_json, answering like scripts.fake_llm_server"""
+
+    def __init__(self):
+        self.calls = []
+        self.response_schemas = []
+
+    def generate_json(self, prompt, system_prompt=None, validate=None, prompt_name=None, response_schema=None,
+                      **kwargs):
+        self.calls.append(prompt_name)
+        self.response_schemas.append(response_schema)
+        data = extraction_content(system_prompt or "", prompt)
+        if validate is not None:
+            validate(data)
+        return json.dumps(data)
+
+
+@pytest.fixture
+def graph_builder():
+    return InMemoryGraphBuilder()
+
+
+@pytest.fixture
+def llm_client():
+    return FakeLLMClient()
+
+
+@pytest.fixture
+def extractor(monkeypatch, graph_builder, llm_client):
+    monkeypatch.setenv("ANALYTICS_REFRESH", "off")
+    from services.graph_extractor import GraphExtractor
+    return GraphExtractor(graph_builder, llm_client)
+
+
+class ScriptedCompletions:
+    """chat.completions stand-in answering with (content, finish_reason) pairs in order"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def create(self, **params):
+        self.requests.append(params)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        content, finish_reason = reply
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=len(content) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    def make(replies, provider="FAKE", **env):
+        monkeypatch.setenv("SELECTED_LLM_MAIN", provider)
+        monkeypatch.setenv("SELECTED_LLM_NSFW", provider)
+        for key, value in {"API_KEY": "key", "API_BASE": "http://127.0.0.1:1/v1", "MODEL": "fake", **env}.items():
+            monkeypatch.setenv(f"{provider}_{key}", value)
+        client = LLMClient()
+        completions = ScriptedCompletions(replies)
+        client._main_client = client._nsfw_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return client, completions
+    return make
+
+
+@pytest.fixture
+def make_app(monkeypatch, tmp_path, extractor):
+    """A Flask app with the /api/v1 routes over the extractor fixture; env vars are set before the routes read them"""
+    from flask import Blueprint, Flask
+
+    from api.routes import admin_routes, init_routes
+    from core.profiling import ProfileStore
+
+    monkeypatch.setattr(admin_routes, "ProfileStore", lambda: ProfileStore(str(tmp_path / "profiles")))
+
+    def make(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        app = Flask(__name__)
+        api = Blueprint("api", __name__, url_prefix="/api/v1")
+        init_routes(api, extractor)
+        app.register_blueprint(api)
+        return app.test_client()
+    return make
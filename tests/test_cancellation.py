@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from core.cancellation import (CancellationToken, JobRegistry, OperationCancelled, cancellation_scope,
+                               current_token, propagate, raise_if_cancelled)
+from core.profiling import Profile, current_profile, profile_scope
+
+
+def test_cancel_runs_callbacks_once_and_raises():
+    token = CancellationToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("first"))
+    unregister = token.on_cancel(lambda: calls.append("removed"))
+    unregister()
+    token.cancel("client went away")
+    token.cancel("again")
+    assert calls == ["first"]
+    with pytest.raises(OperationCancelled, match="client went away"):
+        token.raise_if_cancelled()
+    # Registering after cancellation runs the callback immediately
+    token.on_cancel(lambda: calls.append("late"))
+    assert calls == ["first", "late"]
+
+
+def test_failing_callback_does_not_stop_the_others():
+    token = CancellationToken()
+    calls = []
+    token.on_cancel(lambda: 1 / 0)
+    token.on_cancel(lambda: calls.append("ran"))
+    token.cancel()
+    assert calls == ["ran"]
+
+
+def test_operation_cancelled_is_not_an_exception():
+    # Broad "except Exception" handlers must let cancellation through
+    assert not issubclass(OperationCancelled, Exception)
+
+
+def test_scope_sets_and_restores_the_current_token():
+    token = CancellationToken()
+    assert current_token() is None
+    with cancellation_scope(token):
+        assert current_token() is token
+        token.cancel()
+        with pytest.raises(OperationCancelled):
+            raise_if_cancelled()
+        with cancellation_scope(None):
+            raise_if_cancelled()
+    assert current_token() is None
+
+
+def test_propagate_carries_token_and_profile_into_pool_threads():
+    token = CancellationToken()
+    profile = Profile("test")
+    with cancellation_scope(token), profile_scope(profile):
+        task = propagate(lambda: (current_token(), current_profile()))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = [future.result() for future in [pool.submit(task) for _ in range(4)]]
+    assert results == [(token, profile)] * 4
+
+
+def test_job_registry():
+    jobs = JobRegistry()
+    job_id, token = jobs.start("job-1")
+    with pytest.raises(ValueError):
+        jobs.start("job-1")
+    assert jobs.active() == ["job-1"]
+    assert jobs.cancel("job-1", "stop") and token.cancelled and token.reason == "stop"
+    jobs.finish(job_id)
+    assert not jobs.cancel("job-1")
+    generated_id, _ = jobs.start()
+    assert generated_id and generated_id != "job-1"
+
+
+class _BlockingStream:
+    """A streamed completion that sends one chunk, then blocks until it is closed"""
+
+    def __init__(self):
+        self.streaming = threading.Event()
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        delta = SimpleNamespace(content='{"nodes": [')
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+        self.streaming.set()
+        if not self.closed.wait(5):
+            raise AssertionError("the stream was not closed")
+        raise ConnectionError("stream closed")
+
+    def close(self):
+        self.closed.set()
+
+
+def test_cancelling_closes_the_llm_stream(make_client):
+    client, _ = make_client([])
+    stream = _BlockingStream()
+    requests = []
+
+    def create(**params):
+        requests.append(params)
+        return stream
+
+    completions = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    token = CancellationToken()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        with cancellation_scope(token):
+            future = pool.submit(propagate(client._complete), completions, model="fake", messages=[])
+        assert stream.streaming.wait(5)
+        token.cancel("client went away")
+        with pytest.raises(OperationCancelled, match="client went away"):
+            future.result(5)
+    assert stream.closed.is_set()
+    assert requests[0]["stream"] is True
@@ -0,0 +1,98 @@
+import pytest
+
+from core.neo4j_graph_builder import ANALYTICS_PREFIX
+from services.graph_analytics import GraphAnalytics, compute_analytics, connected_components, pagerank
+
+
+def _add_graph(graph_builder, story_id=None):
+    """Alice and Bob (sharing a chunk) live in Town; Carol is on her own. Returns node ids by name."""
+    story = {"story_id": story_id} if story_id else {}
+    characters = graph_builder.create_nodes("Character", [
+        {"key": "alice", "properties": {"name": "Alice", "chunks": ["c1"], **story}},
+        {"key": "bob", "properties": {"name": "Bob", "chunks": ["c1", "c2"], **story}},
+        {"key": "carol", "properties": {"name": "Carol", "chunks": ["c3"], **story}},
+    ])
+    locations = graph_builder.create_nodes("Location", [{"key": "town", "properties": {"name": "Town", **story}}])
+    ids = {row["key"]: row["elementId"] for row in characters + locations}
+    graph_builder.create_relationships("LIVES_IN", [
+        {"source": ids["alice"], "target": ids["town"]},
+        {"source": ids["bob"], "target": ids["town"]},
+    ])
+    graph_builder.create_relationships("KNOWS", [{"source": ids["alice"], "target": ids["bob"]}])
+    return ids
+
+
+@pytest.fixture
+def analytics(monkeypatch, graph_builder):
+    monkeypatch.setenv("ANALYTICS_REFRESH", "off")
+    return GraphAnalytics(graph_builder)
+
+
+def test_pagerank_sums_to_one_and_favours_linked_nodes():
+    ranks = pagerank(["a", "b", "c"], [("a", "c"), ("b", "c")])
+    assert sum(ranks.values()) == pytest.approx(1.0)
+    assert ranks["c"] > ranks["a"] == pytest.approx(ranks["b"])
+    assert pagerank([], []) == {}
+
+
+def test_connected_components_number_the_largest_first():
+    components = connected_components(["a", "b", "c", "d", "e"], [("d", "e"), ("e", "c"), ("a", "b")])
+    assert components["c"] == components["d"] == components["e"] == 0
+    assert components["a"] == components["b"] == 1
+
+
+def test_compute_analytics_ranks_traffic_and_co_occurrence(graph_builder):
+    ids = _add_graph(graph_builder)
+    metrics, summary = compute_analytics(graph_builder.get_graph_data())
+
+    assert metrics[ids["town"]]["in_degree"] == 2
+    assert metrics[ids["alice"]]["out_degree"] == 2
+    assert metrics[ids["carol"]]["degree"] == 0
+    assert summary["components"] == {"count": 2, "sizes": [3, 1]}
+    assert summary["centrality"][0]["name"] == "Town"
+    assert summary["location_traffic"] == [
+        {"id": ids["town"], "label": "Location", "name": "Town", "characters": 2, "relationships": 2}
+    ]
+    # One shared chunk plus one KNOWS relationship
+    [pair] = summary["co_occurrence"]
+    assert {pair["source"]["name"], pair["target"]["name"]} == {"Alice", "Bob"}
+    assert (pair["strength"], pair["shared_chunks"], pair["relationships"]) == (2, 1, 1)
+
+
+def test_refresh_stores_prefixed_metrics_hidden_from_graph_data(analytics, graph_builder):
+    ids = _add_graph(graph_builder, story_id="s")
+    summary = analytics.refresh("s")
+    assert summary["story_id"] == "s" and summary["node_count"] == 4
+
+    stored = graph_builder.get_graph_data("s", include_analytics=True)
+    town = next(node for node in stored["nodes"] if node["id"] == ids["town"])
+    assert town["properties"][ANALYTICS_PREFIX + "in_degree"] == 2
+    for node in graph_builder.get_graph_data("s")["nodes"]:
+        assert not any(key.startswith(ANALYTICS_PREFIX) for key in node["properties"])
+    assert graph_builder.get_analytics("s") == summary
+
+
+def test_refresh_of_the_default_graph_leaves_stories_out(analytics, graph_builder):
+    _add_graph(graph_builder, story_id="s")
+    default_ids = _add_graph(graph_builder)
+    summary = analytics.refresh(None)
+    assert summary["node_count"] == 4
+    assert {entry["id"] for entry in summary["centrality"]} == set(default_ids.values())
+    for node in graph_builder.get_graph_data("s", include_analytics=True)["nodes"]:
+        assert not any(key.startswith(ANALYTICS_PREFIX) for key in node["properties"])
+
+
+def test_get_serves_the_cache_and_recomputes_dirty_stories(analytics, graph_builder):
+    _add_graph(graph_builder, story_id="s")
+    first = analytics.get("s")
+    assert analytics.get("s") is first
+
+    graph_builder.create_nodes("Character", [{"key": "dan", "properties": {"name": "Dan", "story_id": "s"}}])
+    analytics.mark_dirty("s")
+    assert analytics.get("s")["node_count"] == 5
+
+
+def test_get_reads_the_stored_summary_after_a_restart(analytics, graph_builder):
+    _add_graph(graph_builder, story_id="s")
+    summary = analytics.refresh("s")
+    assert GraphAnalytics(graph_builder).get("s") == summary
@@ -0,0 +1,107 @@
+import csv
+
+import pytest
+
+from core import graph_bulk_io
+from core.graph_bulk_io import GraphBulkIO, node_columns, relationship_columns
+
+NODES = [
+    {"id": "4:a:1", "labels": ["Location", "Castle"],
+     "properties": {"name": "Keep", "story_id": "s", "chunks": ["h1", "h2"], "unknown": 1}},
+    {"id": "4:a:2", "labels": ["Location"], "properties": {"name": "Tower", "story_id": "s"}},
+]
+PART_OF = [
+    {"source": "4:a:1", "target": "4:a:2", "properties": {"type": "wing", "story_id": "s", "chunk_hash": "h1"}},
+]
+
+
+class _Counters:
+    def __init__(self, rows):
+        self.nodes_created = self.relationships_created = len(rows)
+
+
+class _Result:
+    def __init__(self, rows):
+        self.counters = _Counters(rows)
+
+    def consume(self):
+        return self
+
+
+class RecordingSession:
+    def __init__(self):
+        self.queries = []
+
+    def run(self, cypher, rows=(), **params):
+        self.queries.append((cypher, list(rows)))
+        return _Result(rows)
+
+
+@pytest.fixture
+def bulk_io():
+    return GraphBulkIO(None, batch_size=1)
+
+
+def _export(bulk_io, out_dir, file_format):
+    dropped = {}
+    nodes = bulk_io._write_table(str(out_dir), "nodes_Location", file_format,
+                                 node_columns("Location", bulk_io.nodes_schema), iter(NODES), "node", "Location",
+                                 dropped)
+    relationships = bulk_io._write_table(str(out_dir), "relationships_PART_OF", file_format,
+                                         relationship_columns("PART_OF", bulk_io.relationships_schema),
+                                         iter(PART_OF), "relationship", "PART_OF", dropped)
+    return nodes, relationships, dropped
+
+
+def _read(bulk_io, path, kind):
+    return [row for rows in bulk_io._iter_file_rows(str(path), kind) for row in rows]
+
+
+def test_csv_headers_follow_neo4j_admin(tmp_path, bulk_io):
+    _export(bulk_io, tmp_path, "csv")
+    with open(tmp_path / "nodes_Location.csv", newline="") as f:
+        header = next(csv.reader(f))
+    assert header[0] == ":ID" and header[-1] == ":LABEL" and "name:string" in header
+    assert "chunks:string[]" in header
+    with open(tmp_path / "relationships_PART_OF.csv", newline="") as f:
+        header = next(csv.reader(f))
+    assert header[:3] == [":START_ID", ":END_ID", ":TYPE"] and "type:string" in header
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet", "arrow"])
+def test_round_trip_keeps_ids_labels_and_type_property(tmp_path, bulk_io, file_format):
+    if file_format != "csv":
+        pytest.importorskip("pyarrow")
+    nodes_entry, relationships_entry, dropped = _export(bulk_io, tmp_path, file_format)
+    assert nodes_entry["count"] == 2 and relationships_entry["count"] == 1
+    assert dropped == {"Location.unknown": 1}
+
+    nodes = _read(bulk_io, tmp_path / nodes_entry["file"], "node")
+    assert [(node["id"], node["labels"]) for node in nodes] == [
+        ("4:a:1", ["Location", "Castle"]), ("4:a:2", ["Location"])
+    ]
+    assert nodes[0]["properties"] == {"name": "Keep", "story_id": "s", "chunks": ["h1", "h2"]}
+
+    relationships = _read(bulk_io, tmp_path / relationships_entry["file"], "relationship")
+    assert relationships == [{"start": "4:a:1", "end": "4:a:2", "type": "PART_OF",
+                              "properties": {"type": "wing", "story_id": "s", "chunk_hash": "h1"}}]
+
+
+def test_arrow_id_columns_are_reserved(tmp_path, bulk_io):
+    pyarrow = pytest.importorskip("pyarrow")
+    _export(bulk_io, tmp_path, "arrow")
+    with pyarrow.ipc.open_file(str(tmp_path / "relationships_PART_OF.arrow")) as reader:
+        names = reader.schema.names
+    assert names[:3] == ["_start_id", "_end_id", "_type"] and "type" in names
+
+
+def test_multi_label_node_is_created_once_with_all_labels(bulk_io):
+    session = RecordingSession()
+    rows = [{"id": node["id"], "labels": node["labels"], "properties": {"name": node["properties"]["name"]}}
+            for node in NODES]
+    assert bulk_io._import_node_batch(session, rows, {"story_id": "t"}) == 2
+    label_expressions = sorted(cypher.split("CREATE (n:")[1].split(")")[0] for cypher, _ in session.queries)
+    assert label_expressions == sorted([
+        f"`Location`:`Castle`:`{graph_bulk_io.IMPORT_LABEL}`", f"`Location`:`{graph_bulk_io.IMPORT_LABEL}`"
+    ])
+    assert all(row["properties"]["story_id"] == "t" for _, rows in session.queries for row in rows)
@@ -0,0 +1,63 @@
+from core.graph_codec import COLUMNAR_ENCODING, from_columnar, to_columnar
+
+GRAPH = {
+    "nodes": [
+        {"id": "a", "labels": ["Character"], "properties": {"name": "Alice", "age": 12, "title": None}},
+        {"id": "b", "labels": ["Character"], "properties": {"name": "Bob", "traits": ["brave"]}},
+        {"id": "c", "labels": ["Location", "Place"], "properties": {}},
+    ],
+    "relationships": [
+        {"source": "a", "target": "b", "type": "KNOWS", "properties": {"since": None}},
+        {"source": "a", "target": "c", "type": "LOCATED_AT", "properties": {"since": "2020"}},
+    ],
+}
+
+
+def test_round_trip_is_lossless():
+    assert from_columnar(to_columnar(GRAPH)) == GRAPH
+
+
+def test_explicit_null_is_distinct_from_absent():
+    columnar = to_columnar(GRAPH)
+    strings = columnar["strings"]
+    columns = {strings[entry[0]]: entry for entry in columnar["nodes"]["properties"]}
+    # Only columns holding an explicit null carry the null row list
+    assert columns["title"][2] == [0]
+    assert len(columns["age"]) == 2
+
+    decoded = from_columnar(columnar)
+    assert "title" in decoded["nodes"][0]["properties"]
+    assert "title" not in decoded["nodes"][1]["properties"]
+
+
+def test_strings_are_deduplicated_and_relationships_indexed():
+    columnar = to_columnar(GRAPH)
+    assert columnar["encoding"] == COLUMNAR_ENCODING
+    assert columnar["strings"].count("Character") == 1
+    assert columnar["relationships"]["source"] == [0, 0]
+    assert columnar["relationships"]["target"] == [1, 2]
+
+
+def test_relationships_to_unknown_nodes_are_kept():
+    graph = {"nodes": GRAPH["nodes"], "relationships": GRAPH["relationships"] + [
+        {"source": "a", "target": "zzz", "type": "KNOWS", "properties": {}},
+        {"source": "yyy", "target": "zzz", "type": "KNOWS", "properties": {"since": "2021"}},
+    ]}
+    columnar = to_columnar(graph)
+    rel_table = columnar["relationships"]
+    assert rel_table["count"] == len(graph["relationships"]) == 4
+    assert rel_table["external_ids"] == ["zzz", "yyy"]
+    assert rel_table["target"][2:] == [3, 3] and rel_table["source"][3] == 4
+    assert from_columnar(columnar) == graph
+    # Graphs without such relationships keep the plain layout
+    assert "external_ids" not in to_columnar(GRAPH)["relationships"]
+
+
+def test_decoder_accepts_two_element_columns():
+    columnar = {
+        "encoding": COLUMNAR_ENCODING,
+        "strings": ["name"],
+        "nodes": {"count": 2, "id": ["x", "y"], "labels": [[], []], "properties": [[0, ["X", None]]]},
+        "relationships": {"count": 0, "source": [], "target": [], "type": [], "properties": []},
+    }
+    assert from_columnar(columnar)["nodes"][1]["properties"] == {}
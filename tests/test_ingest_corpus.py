@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from scripts import ingest_corpus
+from scripts.ingest_corpus import Checkpoint
+from services.story_chunks import split_story
+
+STORY = "\n\n".join(
+    f"Alice met Bob near the river in part {index}. Carol watched from the bridge." for index in range(20)
+)
+
+
+def test_checkpoint_appends_one_line_per_story(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = Checkpoint(str(path), 4000)
+    checkpoint.mark_completed("a.txt")
+    checkpoint.mark_completed("b.txt")
+    checkpoint.mark_completed("a.txt")
+    checkpoint.close()
+
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[0])["chunk_chars"] == 4000
+    assert [json.loads(line)["story_id"] for line in lines[1:]] == ["a.txt", "b.txt"]
+
+
+def test_checkpoint_compacts_and_skips_torn_lines(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = Checkpoint(str(path), 4000)
+    checkpoint.mark_completed("b.txt")
+    checkpoint.mark_completed("a.txt")
+    checkpoint.close()
+    with open(path, "a") as f:
+        f.write('{"story_id": "b.txt"}\n{"story_')
+
+    reopened = Checkpoint(str(path), 4000)
+    reopened.close()
+    assert reopened.is_completed("a.txt") and reopened.is_completed("b.txt")
+    assert not reopened.is_completed("c.txt")
+    assert len(path.read_text().splitlines()) == 3
+
+
+def test_checkpoint_rejects_other_chunk_size(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    Checkpoint(str(path), 4000).close()
+    with pytest.raises(ValueError):
+        Checkpoint(str(path), 8000)
+    restarted = Checkpoint(str(path), 8000, restart=True)
+    restarted.close()
+
+
+def test_story_is_ingested_as_one_graph(tmp_path, monkeypatch, extractor, graph_builder):
+    extractor.story_chunk_chars = 200
+    monkeypatch.setattr(ingest_corpus, "_extractor", extractor)
+    path = tmp_path / "novel.txt"
+    path.write_text(STORY)
+
+    outcome = ingest_corpus.ingest_story("novel.txt", str(path), None)
+
+    assert outcome["success"], outcome["message"]
+    assert outcome["chunks"] > 1
+    names = [node["properties"]["name"] for node in graph_builder.get_graph_data("novel.txt")["nodes"]]
+    # Entities seen in every chunk are merged into one node per story
+    assert sorted(names).count("Alice") == 1
+
+    again = ingest_corpus.ingest_story("novel.txt", str(path), None)
+    assert again["success"] and again["chunks"] == 0 and again["reused"] == outcome["chunks"]
+
+
+def test_partitioned_mode_extracts_one_call_per_type_group(tmp_path, monkeypatch, extractor, llm_client):
+    extractor.story_chunk_chars = 200
+    monkeypatch.setattr(ingest_corpus, "_extractor", extractor)
+    path = tmp_path / "novel.txt"
+    path.write_text(STORY)
+
+    outcome = ingest_corpus.ingest_story("novel.txt", str(path), "partitioned")
+
+    assert outcome["success"], outcome["message"]
+    assert any(name.startswith("GRAPH_NODE_EXTRACTOR[") for name in llm_client.calls)
+    assert "GRAPH_NODE_EXTRACTOR" not in llm_client.calls
+
+
+def test_interrupted_story_resumes_at_the_last_completed_chunk(tmp_path, monkeypatch, extractor, graph_builder,
+                                                               llm_client):
+    extractor.story_chunk_chars = 200
+    # One chunk at a time: the interruption stops the story after its second chunk
+    extractor.story_chunk_window = 1
+    monkeypatch.setattr(ingest_corpus, "_extractor", extractor)
+    path = tmp_path / "novel.txt"
+    path.write_text(STORY)
+    total = len(split_story(STORY, 200))
+
+    generate_json = llm_client.generate_json
+    node_calls = []
+
+    def interrupted(prompt, *args, prompt_name=None, **kwargs):
+        if prompt_name == "GRAPH_NODE_EXTRACTOR":
+            node_calls.append(prompt)
+            if len(node_calls) == 3:
+                raise KeyboardInterrupt
+        return generate_json(prompt, *args, prompt_name=prompt_name, **kwargs)
+
+    monkeypatch.setattr(llm_client, "generate_json", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        ingest_corpus.ingest_story("novel.txt", str(path), None)
+    assert len(graph_builder.get_story_chunks("novel.txt")) == 2
+
+    monkeypatch.setattr(llm_client, "generate_json", generate_json)
+    resumed = ingest_corpus.ingest_story("novel.txt", str(path), None)
+    assert resumed["success"], resumed["message"]
+    assert (resumed["chunks"], resumed["reused"]) == (total - 2, 2)
+
+    graph_data = graph_builder.get_graph_data("novel.txt")
+    relationships = {(rel["source"], rel["target"], rel["type"], rel["properties"]["chunk_hash"])
+                     for rel in graph_data["relationships"]}
+    assert len(relationships) == len(graph_data["relationships"])
+    assert set(graph_builder.get_story_chunks("novel.txt")) == {chunk.hash for chunk in split_story(STORY, 200)}
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from core.llm_client import LLMResponseError
+from core.utils import salvage_truncated_json
+
+
+SCHEMA = {"title": "graph_nodes", "type": "object", "properties": {"nodes": {"type": "array"}}}
+
+
+def test_salvage_keeps_complete_array_elements():
+    assert salvage_truncated_json('{"nodes": [{"a": 1}, {"b": 2}, {"c": ') == {"nodes": [{"a": 1}, {"b": 2}]}
+    assert salvage_truncated_json('[1, 2, 3') == [1, 2]
+    assert salvage_truncated_json('{"nodes": [{"a": "x, ]') == {"nodes": []}
+    assert salvage_truncated_json('{"na') is None
+
+
+def test_unknown_provider_sends_no_response_format(make_client):
+    client, completions = make_client([('{"nodes": []}', "stop")])
+    client.generate_json("prompt", "system", response_schema=SCHEMA)
+    assert "response_format" not in completions.requests[0]
+
+
+def test_json_schema_format_uses_the_response_schema(make_client):
+    client, completions = make_client([('{"nodes": []}', "stop")], provider="OPENAI")
+    client.generate_json("prompt", "system", response_schema=SCHEMA)
+    response_format = completions.requests[0]["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"] == {"name": "graph_nodes", "schema": SCHEMA}
+
+
+def test_provider_rejecting_response_format_falls_back(make_client):
+    client, completions = make_client(
+        [ValueError("response_format is not supported"), ('{"nodes": []}', "stop")], RESPONSE_FORMAT="json_object"
+    )
+    assert json.loads(client.generate_json("prompt", "system")) == {"nodes": []}
+    assert "response_format" not in completions.requests[1]
+    assert client.response_formats["FAKE"] == "none"
+
+
+def test_truncated_response_is_continued_and_merged(make_client):
+    client, completions = make_client([
+        ('{"nodes": [{"name": "A"}, {"name": "B"}, {"na', "length"),
+        ('{"nodes": [{"name": "C"}]}', "stop"),
+    ])
+    result = json.loads(client.generate_json("prompt", "system", max_tokens=100))
+    assert result == {"nodes": [{"name": "A"}, {"name": "B"}, {"name": "C"}]}
+    assert completions.requests[1]["messages"][-2]["role"] == "assistant"
+
+
+def test_truncation_before_any_element_raises(make_client):
+    client, _ = make_client([('{"nod', "length")])
+    with pytest.raises(LLMResponseError):
+        client.generate_json("prompt", "system", max_tokens=100)
+
+
+@pytest.mark.parametrize("mode", ["serial", "pipelined", "joint", "partitioned"])
+def test_extraction_calls_pass_a_response_schema(extractor, llm_client, mode):
+    result = extractor.extract_graph_nodes_and_relations("Alice met Bob in Paris.", story_id="s", mode=mode)
+    assert result["status"]["success"]
+    assert llm_client.response_schemas and all(llm_client.response_schemas)
+    for schema in llm_client.response_schemas:
+        for key in schema["required"]:
+            assert schema["properties"][key]["items"]["properties"]["type"]["enum"]
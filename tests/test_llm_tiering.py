@@ -0,0 +1,64 @@
+import pytest
+
+from core.llm_client import LLMOutputError, LLMResponseError
+from core.llm_tiering import ModelTiering, TierPlan
+
+TIERS = {"MODEL_FAST": "small", "MODEL_STRONG": "large"}
+
+
+def _validate_nodes(data):
+    if not data.get("nodes"):
+        raise ValueError("no nodes")
+
+
+def test_unseen_prompt_gets_the_maximum_and_input_decides_the_tier():
+    tiering = ModelTiering()
+    assert tiering.plan("P", 4000) == TierPlan("fast", tiering.max_max_tokens)
+    assert tiering.plan("P", 4 * (tiering.fast_max_input_tokens + 1)).tier == "strong"
+
+
+def test_learned_output_size_sets_max_tokens_and_tier():
+    tiering = ModelTiering()
+    tiering.observe("P", 1000, 500)
+    plan = tiering.plan("P", 1000)
+    assert plan == TierPlan("fast", max(tiering.min_max_tokens, int(500 * tiering.headroom)))
+    # Expected output beyond the fast tier's limit goes to the strong tier
+    assert tiering.plan("P", 10000).tier == "strong"
+
+
+def test_truncated_observation_pushes_the_estimate_up():
+    tiering = ModelTiering()
+    tiering.observe("P", 1000, 1000, truncated=True)
+    assert tiering.estimate_output_tokens("P", 1000) == int(1000 * tiering.headroom)
+
+
+def test_escalated_plan_doubles_max_tokens_up_to_the_maximum():
+    tiering = ModelTiering()
+    assert tiering.escalated(TierPlan("fast", 2000)) == TierPlan("strong", 4000)
+    assert tiering.escalated(TierPlan("fast", tiering.max_max_tokens)).max_tokens == tiering.max_max_tokens
+
+
+def test_invalid_output_escalates_to_the_strong_tier(make_client):
+    client, completions = make_client([('{"nodes": []}', "stop"), ('{"nodes": [{"name": "A"}]}', "stop")], **TIERS)
+    client.generate_json("prompt", "system", prompt_name="P", validate=_validate_nodes)
+    assert [request["model"] for request in completions.requests] == ["small", "large"]
+
+
+def test_unparseable_output_escalates(make_client):
+    client, completions = make_client([("not json", "stop"), ('{"nodes": [1]}', "stop")], **TIERS)
+    client.generate_json("prompt", "system", prompt_name="P")
+    assert [request["model"] for request in completions.requests] == ["small", "large"]
+
+
+def test_failed_request_is_not_escalated(make_client):
+    client, completions = make_client([ConnectionError("connection refused")], **TIERS)
+    with pytest.raises(LLMResponseError) as raised:
+        client.generate_json("prompt", "system", prompt_name="P")
+    assert not isinstance(raised.value, LLMOutputError)
+    assert len(completions.requests) == 1
+
+
+def test_validation_failure_on_the_strong_tier_raises(make_client):
+    client, _ = make_client([('{"nodes": []}', "stop"), ('{"nodes": []}', "stop")], **TIERS)
+    with pytest.raises(LLMOutputError):
+        client.generate_json("prompt", "system", prompt_name="P", validate=_validate_nodes)
@@ -0,0 +1,38 @@
+import json
+
+from services.graph_extractor import GraphExtractor
+
+
+def _node(name, node_id=None):
+    node = {"type": "Character", "properties": {"name": name}}
+    if node_id is not None:
+        node["id"] = node_id
+    return node
+
+
+def test_generated_ids_skip_given_ones():
+    nodes = GraphExtractor._assign_local_ids([
+        _node("Alice", "n1"), _node("Bob"), _node("Carol", "n1"), _node("Dave", "n3"), {"type": "Character"}
+    ])
+    ids = [node["id"] for node in nodes]
+    assert [node["properties"]["name"] for node in nodes] == ["Alice", "Bob", "Carol", "Dave"]
+    assert len(set(ids)) == 4
+    # Given ids keep their node; missing and duplicate ones get ids no other node uses
+    assert ids[0] == "n1" and ids[3] == "n3"
+
+
+def test_relationships_attach_to_the_given_ids(extractor, graph_builder, llm_client, monkeypatch):
+    response = {
+        "nodes": [_node("Alice", "n1"), _node("Bob"), _node("Carol", "c")],
+        "relationships": [{"source_node": "n1", "target_node": "c", "type": "KNOWS", "properties": {}}]
+    }
+    monkeypatch.setattr(llm_client, "generate_json", lambda *args, **kwargs: json.dumps(response))
+
+    result = extractor.extract_graph_nodes_and_relations("Alice knows Carol.", story_id="s", mode="joint")
+
+    assert result["status"]["success"]
+    graph_data = graph_builder.get_graph_data("s")
+    names = {node["id"]: node["properties"]["name"] for node in graph_data["nodes"]}
+    assert len(names) == 3
+    [rel] = graph_data["relationships"]
+    assert (names[rel["source"]], names[rel["target"]]) == ("Alice", "Carol")
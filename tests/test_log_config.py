@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import queue
+import runpy
+import sys
+
+from core import log_config
+from core.log_config import DroppingQueueHandler, JsonFormatter, _file_name, sample_payload
+
+
+def _record(message):
+    return logging.makeLogRecord({"name": "test", "levelno": logging.ERROR, "levelname": "ERROR", "msg": message})
+
+
+def test_json_formatter_keeps_extra_fields_and_traceback():
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = logging.getLogger("test").makeRecord(
+            "test", logging.ERROR, __file__, 1, "failed %s", ("call",), exc_info=sys.exc_info(),
+            extra={"prompt": "hello"}
+        )
+    data = json.loads(JsonFormatter().format(record))
+    assert data["message"] == "failed call"
+    assert data["level"] == "ERROR"
+    assert data["prompt"] == "hello"
+    assert "ZeroDivisionError" in data["exception"]
+
+
+def test_sample_payload_keeps_head_and_tail_of_large_payloads():
+    assert sample_payload(None) is None
+    assert sample_payload("short", max_chars=10, sample_rate=0) == "short"
+    text = "a" * 10 + "b" * 80 + "c" * 10
+    sampled = sample_payload(text, max_chars=20, sample_rate=0)
+    assert sampled.startswith("a" * 10) and sampled.endswith("c" * 10)
+    assert "[80 chars omitted]" in sampled
+    assert sample_payload(text, max_chars=20, sample_rate=1) == text
+
+
+def test_full_queue_drops_records_and_reports_them_later():
+    log_queue = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(log_queue)
+    handler.handle(_record("kept"))
+    handler.handle(_record("dropped"))
+    handler.handle(_record("dropped too"))
+    assert handler.dropped == 2
+
+    assert log_queue.get_nowait().getMessage() == "kept"
+    handler.handle(_record("after"))
+    # The drop notice took the only free slot; "after" itself was dropped and counted
+    assert log_queue.get_nowait().getMessage() == "Dropped 2 log records: the log queue was full"
+    assert handler.dropped == 1
+
+
+def test_gunicorn_workers_default_to_their_own_log_files(monkeypatch):
+    monkeypatch.delenv("LOG_FILE_PER_PROCESS", raising=False)
+    assert _file_name("app").endswith(f"{os.sep}app.jsonl")
+    runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+    assert _file_name("app").endswith(f"app.{os.getpid()}.jsonl")
+
+    monkeypatch.setenv("LOG_FILE_PER_PROCESS", "0")
+    runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+    assert _file_name("app").endswith(f"{os.sep}app.jsonl")
+
+
+def test_llm_client_leaves_logging_to_the_entry_points(monkeypatch, make_client):
+    # As in a process that has not set up logging yet
+    monkeypatch.setattr(log_config, "_setup_pid", None)
+    make_client([])
+    assert log_config._setup_pid is None
@@ -0,0 +1,39 @@
+from core.mention_index import AhoCorasick, MentionIndex, valid_label_pairs
+
+NODES = [
+    {"id": "alice", "labels": ["Character"], "properties": {"name": "Alice", "aliases": ["Al"]}},
+    {"id": "bob", "labels": ["Character"], "properties": {"name": "Bob"}},
+    {"id": "castle", "labels": ["Location"], "properties": {"name": "Old Castle"}},
+]
+
+
+def test_matcher_finds_overlapping_whole_words_case_insensitively():
+    matcher = AhoCorasick([("he", 1), ("she", 2), ("hers", 3)])
+    assert sorted(value for _, _, value in matcher.find("She said HERS, not he")) == [1, 2, 3]
+    # "he" inside "she" and "the" is not a whole word
+    assert list(matcher.find("the")) == []
+
+
+def test_mentions_cover_names_and_aliases():
+    index = MentionIndex(NODES)
+    text = "Al walked to the old castle. Later, Alicent arrived; Bob too."
+    assert [(text[start:end], node_id) for start, end, node_id in index.mentions(text)] == [
+        ("Al", "alice"), ("old castle", "castle"), ("Bob", "bob")
+    ]
+
+
+def test_windows_pack_paragraphs_and_collect_mentions():
+    index = MentionIndex(NODES)
+    text = "Alice sat.\n\nBob stood.\n\n" + "x" * 50 + "\n\nThe Old Castle loomed."
+    windows = index.windows(text, window_chars=30)
+    assert [window["node_ids"] for window in windows] == [{"alice", "bob"}, set(), {"castle"}]
+    assert text[windows[0]["start"]:windows[0]["end"]] == "Alice sat.\n\nBob stood."
+
+
+def test_candidate_pairs_follow_the_schema():
+    schema = {"relationship_types": {
+        "LOCATED_AT": {"valid_sources": ["Character"], "valid_targets": ["Location"]}
+    }}
+    index = MentionIndex(NODES)
+    pairs = index.candidate_pairs({"alice", "bob", "castle"}, valid_label_pairs(schema))
+    assert pairs == {("alice", "castle"), ("bob", "castle")}
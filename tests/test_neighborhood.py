@@ -0,0 +1,169 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from core.memory_graph_builder import InMemoryGraphBuilder
+from core.neo4j_graph_builder import CHUNK_PROPERTIES, Neo4jGraphBuilder, encode_cursor
+
+
+def _star(builder, leaves):
+    center = builder.create_node("Character", {"name": "Center"})["elementId"]
+    for index in range(leaves):
+        leaf = builder.create_node("Character", {"name": f"Leaf {index}"})["elementId"]
+        builder.create_relationship(center, leaf, "KNOWS", {})
+    return center
+
+
+def test_neighborhood_at_cap_is_not_truncated(monkeypatch, graph_builder):
+    monkeypatch.setattr(InMemoryGraphBuilder, "MAX_NEIGHBORHOOD_NODES", 5)
+    center = _star(graph_builder, 5)
+    result = graph_builder.get_neighborhood(center, depth=2)
+    assert len(result["nodes"]) == 6
+    assert result["truncated"] is False
+
+
+def test_neighborhood_over_cap_is_truncated(monkeypatch, graph_builder):
+    monkeypatch.setattr(InMemoryGraphBuilder, "MAX_NEIGHBORHOOD_NODES", 5)
+    center = _star(graph_builder, 6)
+    result = graph_builder.get_neighborhood(center)
+    assert len(result["nodes"]) == 6
+    assert result["truncated"] is True
+
+
+def test_neighborhood_pages_by_distance(graph_builder):
+    center = _star(graph_builder, 5)
+    first = graph_builder.get_neighborhood(center, limit=3)
+    assert first["nodes"][0]["id"] == center and len(first["nodes"]) == 4
+    second = graph_builder.get_neighborhood(center, limit=3, cursor=first["cursor"])
+    assert len(second["nodes"]) == 2 and second["cursor"] is None
+    # Relationships of the second page connect back to the start node returned on the first
+    assert len(second["relationships"]) == 2
+
+
+class _Record(dict):
+    def data(self):
+        return dict(self)
+
+
+class _GraphSession:
+    """Answers the paging queries of Neo4jGraphBuilder from the nodes and relationships of an InMemoryGraphBuilder"""
+
+    def __init__(self, memory):
+        self.nodes = memory._nodes
+        self.relationships = memory._relationships
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def _node(self, node_id):
+        node = self.nodes[node_id]
+        return _Record(id=node_id, labels=list(node["labels"]), properties=dict(node["properties"]))
+
+    def _touching(self, node_id, types):
+        for rel in self.relationships.values():
+            if node_id in (rel["source"], rel["target"]) and (types is None or rel["type"] in types):
+                yield rel, rel["target"] if rel["source"] == node_id else rel["source"]
+
+    def run(self, cypher, **params):
+        if "ORDER BY id" in cypher:
+            label = re.search(r"MATCH \(n:`(.*?)`\)", cypher).group(1)
+            node_ids = sorted(
+                node_id for node_id, node in self.nodes.items()
+                if label in node["labels"] and (params["after"] is None or node_id > params["after"])
+                and (params["story_id"] is None or node["properties"].get("story_id") == params["story_id"])
+            )
+            return [self._node(node_id) for node_id in node_ids[:params["limit"]]]
+        if "UNWIND $frontier" in cypher:
+            found = []
+            for frontier_id in params["frontier"]:
+                for _, other in self._touching(frontier_id, params["types"]):
+                    story_id = self.nodes[other]["properties"].get("story_id")
+                    if other not in found and (params["story_id"] is None or story_id == params["story_id"]):
+                        found.append(other)
+            return [_Record(id=node_id) for node_id in found[:params["cap"]]]
+        if "UNWIND $ids" in cypher:
+            relationships = []
+            for page_id in params["ids"]:
+                for rel, other in self._touching(page_id, params["types"]):
+                    if other in params["known"] and rel not in relationships:
+                        relationships.append(rel)
+            return [_Record(source=rel["source"], target=rel["target"], type=rel["type"],
+                            properties=dict(rel["properties"])) for rel in relationships]
+        return [self._node(node_id) for node_id in params["ids"] if node_id in self.nodes]
+
+
+def _neo4j_over(memory):
+    builder = Neo4jGraphBuilder()
+    builder._driver = SimpleNamespace(session=lambda: _GraphSession(memory))
+    return builder
+
+
+def _pages(fetch):
+    pages = [fetch(None)]
+    while pages[-1]["cursor"]:
+        pages.append(fetch(pages[-1]["cursor"]))
+    return pages
+
+
+def test_cypher_neighborhood_pages_match_the_in_memory_builder(graph_builder):
+    center = _star(graph_builder, 5)
+    leaves = [node["id"] for node in graph_builder.get_neighborhood(center)["nodes"][1:]]
+    # Two hops out, and a node of another story that the story filter leaves out
+    graph_builder.create_relationship(leaves[0], graph_builder.create_node("Location", {"name": "Town"})["elementId"],
+                                      "LIVES_IN", {})
+    graph_builder.merge_story_nodes("s", "c1", "Character", [{"key": 0, "name": "Stranger", "properties": {}}])
+    neo4j_builder = _neo4j_over(graph_builder)
+
+    for options in ({"depth": 2, "limit": 2}, {"depth": 2, "limit": 4, "relationship_types": ["KNOWS"]},
+                    {"depth": 1, "limit": 10}):
+        expected = _pages(lambda cursor: graph_builder.get_neighborhood(center, cursor=cursor, **options))
+        pages = _pages(lambda cursor: neo4j_builder.get_neighborhood(center, cursor=cursor, **options))
+        assert pages == expected
+
+    assert len(_pages(lambda cursor: neo4j_builder.get_neighborhood(center, depth=2, limit=2, cursor=cursor))) == 3
+
+
+def test_cypher_label_pages_match_the_in_memory_builder(graph_builder):
+    _star(graph_builder, 4)
+    for name in ("Alice", "Bob", "Carol"):
+        graph_builder.merge_story_nodes("s", "c1", "Character", [{"key": 0, "name": name, "properties": {"age": 3}}])
+    neo4j_builder = _neo4j_over(graph_builder)
+
+    for story_id in (None, "s"):
+        expected = _pages(lambda cursor: graph_builder.get_nodes_by_label_page(
+            "Character", limit=2, cursor=cursor, story_id=story_id))
+        pages = _pages(lambda cursor: neo4j_builder.get_nodes_by_label_page(
+            "Character", limit=2, cursor=cursor, story_id=story_id))
+        assert pages == expected
+    nodes = [node for page in pages for node in page["nodes"]]
+    assert [node["properties"]["name"] for node in nodes] == ["Alice", "Bob", "Carol"]
+    assert all(CHUNK_PROPERTIES not in node["properties"] for node in nodes)
+
+
+@pytest.mark.parametrize("cursor", [
+    "MTIz",  # 123
+    encode_cursor(["a", 1]),
+    encode_cursor([1, "a", 2]),
+    encode_cursor([True, "a"]),
+    "not a cursor",
+])
+def test_malformed_neighborhood_cursors_are_rejected(graph_builder, cursor):
+    center = _star(graph_builder, 2)
+    for builder in (graph_builder, _neo4j_over(graph_builder)):
+        with pytest.raises(ValueError):
+            builder.get_neighborhood(center, cursor=cursor)
+    with pytest.raises(ValueError):
+        graph_builder.get_nodes_by_label_page("Character", cursor=encode_cursor([1, "a"]))
+
+
+def test_malformed_cursor_is_a_bad_request(graph_builder, make_app):
+    center = _star(graph_builder, 2)
+    client = make_app()
+    response = client.get(f"/api/v1/graph/nodes/{center}/neighborhood?cursor=MTIz")
+    assert response.status_code == 400
+    response = client.get("/api/v1/graph/labels/Character/nodes?cursor=MTIz")
+    assert response.status_code == 400
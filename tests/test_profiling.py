@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from core.profiling import Profile, ProfileStore, annotate, folded_stacks, profile_scope, profiled, span
+
+
+@profiled()
+def _work():
+    with span("inner", step=1):
+        annotate(tokens=5)
+        time.sleep(0.02)
+    return "done"
+
+
+def test_spans_nest_and_carry_attributes():
+    profile = Profile("request", sample_interval_ms=1)
+    with profile_scope(profile):
+        assert _work() == "done"
+    spans = {record["name"]: record for record in profile.to_dict()["spans"]}
+    assert spans["inner"]["parent"] == spans["_work"]["id"]
+    assert spans["_work"]["parent"] == spans["request"]["id"]
+    assert spans["inner"]["attributes"] == {"step": 1, "tokens": 5}
+    assert profile.duration_ms >= spans["inner"]["duration_ms"] >= 15
+    assert profile.sample_count > 0 and any("_work" in stack for stack in profile.samples)
+
+
+def test_instrumentation_is_a_no_op_without_a_profile():
+    assert _work() == "done"
+    with span("outside"):
+        annotate(ignored=True)
+
+
+def test_failed_span_records_the_error():
+    profile = Profile("request")
+    with pytest.raises(KeyError):
+        with profile_scope(profile):
+            with span("lookup"):
+                raise KeyError("x")
+    assert {record["name"]: record.get("error") for record in profile.spans}["lookup"] == "KeyError"
+
+
+def test_span_limit():
+    profile = Profile("request", max_spans=2)
+    with profile_scope(profile):
+        for _ in range(3):
+            with span("step"):
+                pass
+    assert len(profile.spans) == 2 and profile.dropped_spans == 2
+
+
+def test_store_keeps_the_newest_profiles(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=2)
+    profiles = []
+    for index in range(3):
+        profile = Profile("request")
+        profile.id = f"2026010{index}T000000-abcd"
+        with profile_scope(profile):
+            pass
+        store.save(profile)
+        profiles.append(profile)
+    assert [summary["id"] for summary in store.list()] == [profiles[2].id, profiles[1].id]
+    assert store.get(profiles[0].id) is None
+    with pytest.raises(ValueError):
+        store.get("../secrets")
+
+
+def test_folded_stacks():
+    assert folded_stacks({"samples": {"a;b": 3, "a": 1}}) == "a;b 3\na 1\n"
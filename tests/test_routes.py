@@ -0,0 +1,167 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.cancellation import current_token
+
+TEXT = "Alice met Bob near the river. Carol watched Alice and Bob."
+
+
+def test_extract_returns_the_graph_and_a_job_id(make_app):
+    client = make_app()
+    response = client.post("/api/v1/graph/extract", json={"text": TEXT, "story_id": "s", "job_id": "job-1"})
+    assert response.status_code == 200
+    assert response.headers["X-Job-Id"] == "job-1"
+    body = response.get_json()
+    assert body["status"]["success"] and body["metadata"]["node_count"] == 3
+
+
+def test_extract_requires_text(make_app):
+    assert make_app().post("/api/v1/graph/extract", json={}).status_code == 400
+
+
+def test_columnar_format_is_negotiated(make_app):
+    response = make_app().post("/api/v1/graph/extract?format=columnar", json={"text": TEXT, "story_id": "s"})
+    assert response.mimetype == "application/vnd.kg.columnar+json"
+    assert response.get_json()["graph_data"]["encoding"] == "columnar-v1"
+
+
+def test_columnar_pages_keep_every_relationship(make_app, graph_builder):
+    client = make_app()
+    client.post("/api/v1/graph/extract", json={"text": TEXT, "story_id": "s"})
+    [bob] = [node for node in graph_builder.get_graph_data("s")["nodes"] if node["properties"]["name"] == "Bob"]
+    url = f"/api/v1/graph/nodes/{bob['id']}/neighborhood?limit=1"
+    first = client.get(url).get_json()
+    # The second page links back to Bob, who is only on the first page
+    url += f"&cursor={first['cursor']}"
+    rows = client.get(url).get_json()["graph_data"]
+    columnar = client.get(url + "&format=columnar").get_json()["graph_data"]
+    assert rows["relationships"]
+    assert columnar["relationships"]["count"] == len(rows["relationships"])
+    assert bob["id"] in columnar["relationships"]["external_ids"]
+
+
+def test_story_update_reports_chunks(make_app):
+    response = make_app().put("/api/v1/graph/stories/s", json={"text": TEXT})
+    assert response.status_code == 200
+    assert response.get_json()["metadata"]["chunks"]["extracted"] == 1
+
+
+def test_batch_streams_one_line_per_document(make_app):
+    response = make_app().post("/api/v1/graph/extract/batch", json={"documents": [
+        {"id": "a", "text": TEXT}, {"id": "a", "text": TEXT}, {"text": "no id"}
+    ]})
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert [line["status"]["success"] for line in sorted(lines, key=lambda line: line["index"])] == [True, False, False]
+
+
+def test_unknown_job_cannot_be_cancelled(make_app):
+    assert make_app().delete("/api/v1/graph/jobs/nope").status_code == 404
+
+
+def _block_until_cancelled(monkeypatch, llm_client, marker):
+    """LLM calls for prompts containing marker wait for their job to be cancelled; returns the tokens seen"""
+    generate_json = llm_client.generate_json
+    tokens = []
+
+    def blocking(prompt, *args, **kwargs):
+        if marker in prompt:
+            token = current_token()
+            tokens.append(token)
+            token.wait(5)
+            token.raise_if_cancelled()
+        return generate_json(prompt, *args, **kwargs)
+
+    monkeypatch.setattr(llm_client, "generate_json", blocking)
+    return tokens
+
+
+def test_running_job_is_cancelled(make_app, llm_client, monkeypatch):
+    client = make_app()
+    tokens = _block_until_cancelled(monkeypatch, llm_client, "Alice")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        extraction = pool.submit(client.post, "/api/v1/graph/extract", json={"text": TEXT, "job_id": "job-1"})
+        while not tokens:
+            threading.Event().wait(0.01)
+        assert client.get("/api/v1/graph/jobs").get_json() == {"jobs": ["job-1"]}
+        response = client.delete("/api/v1/graph/jobs/job-1")
+        assert response.status_code == 202
+        assert response.get_json() == {"job_id": "job-1", "cancelled": True}
+        assert extraction.result(5).status_code == 409
+    assert client.get("/api/v1/graph/jobs").get_json() == {"jobs": []}
+
+
+def test_disconnecting_from_a_batch_cancels_it(make_app, llm_client, monkeypatch):
+    client = make_app()
+    tokens = _block_until_cancelled(monkeypatch, llm_client, "SLOW")
+    response = client.post("/api/v1/graph/extract/batch", buffered=False, json={"documents": [
+        {"id": "fast", "text": TEXT}, {"id": "slow", "text": "SLOW " + TEXT}
+    ]})
+    first = json.loads(next(iter(response.response)))
+    assert first["id"] == "fast"
+    while not tokens:
+        threading.Event().wait(0.01)
+    response.close()
+    assert tokens[0].wait(5)
+    assert client.get("/api/v1/graph/jobs").get_json() == {"jobs": []}
+
+
+def test_profile_admin_is_disabled_without_a_token(make_app):
+    client = make_app()
+    assert client.get("/api/v1/admin/profiles").status_code == 404
+    assert client.get("/api/v1/admin/profiles/x").status_code == 404
+
+
+def test_profile_admin_requires_the_token(make_app):
+    client = make_app(PROFILE_ADMIN_TOKEN="secret")
+    assert client.get("/api/v1/admin/profiles").status_code == 401
+    assert client.get("/api/v1/admin/profiles", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/api/v1/admin/profiles", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200 and response.get_json() == {"profiles": []}
+
+
+def test_profiled_request_is_saved(make_app):
+    client = make_app(PROFILE_ADMIN_TOKEN="secret")
+    auth = {"Authorization": "Bearer secret"}
+    response = client.post("/api/v1/graph/extract", json={"text": TEXT, "story_id": "s"}, headers={"X-Profile": "1"})
+    profile_id = response.headers["X-Profile-Id"]
+
+    profile = client.get(f"/api/v1/admin/profiles/{profile_id}", headers=auth).get_json()
+    names = {span["name"] for span in profile["spans"]}
+    assert "GraphExtractor.extract_graph_nodes_and_relations" in names
+    assert profile["attributes"]["status"] == 200
+    folded = client.get(f"/api/v1/admin/profiles/{profile_id}?format=folded", headers=auth)
+    assert folded.mimetype == "text/plain"
+    assert client.get("/api/v1/admin/profiles/missing", headers=auth).status_code == 404
+
+
+def test_streamed_response_is_profiled_until_closed(make_app):
+    client = make_app(PROFILE_ADMIN_TOKEN="secret")
+    response = client.post("/api/v1/graph/extract/batch", json={"documents": [{"id": "a", "text": TEXT}]},
+                           headers={"X-Profile": "1"})
+    response.get_data()
+    response.close()
+
+    profile = client.get(f"/api/v1/admin/profiles/{response.headers['X-Profile-Id']}",
+                         headers={"Authorization": "Bearer secret"}).get_json()
+    # The documents are extracted while the stream is consumed, after the view returned
+    assert "GraphExtractor.extract_graph_nodes_and_relations" in {span["name"] for span in profile["spans"]}
+
+
+def test_analytics_are_served_with_an_etag(make_app):
+    client = make_app()
+    client.put("/api/v1/graph/stories/s", json={"text": TEXT})
+    response = client.get("/api/v1/graph/analytics?story_id=s&top=1")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["story_id"] == "s" and body["node_count"] == 3
+    assert len(body["centrality"]) == 1
+    etag = response.headers["ETag"]
+    assert client.get("/api/v1/graph/analytics?story_id=s&top=1", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/v1/graph/analytics?top=-1").status_code == 400
+
+    refreshed = client.post("/api/v1/graph/analytics/refresh", json={"story_id": "s"})
+    assert refreshed.status_code == 200
+    assert set(refreshed.get_json()) == {"story_id", "computed_at", "node_count", "relationship_count"}
@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.cancellation import CancellationToken, OperationCancelled, cancellation_scope, current_token, raise_if_cancelled
+from core.single_flight import SingleFlight, request_key
+
+
+def test_request_key_is_stable_and_order_insensitive_for_dicts():
+    assert request_key("extract", {"a": 1, "b": 2}) == request_key("extract", {"b": 2, "a": 1})
+    assert request_key("extract", "x") != request_key("extract", "y")
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flights.do, "key", work) for _ in range(4)]
+        while flights.coalesced < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [future.result(5) for future in futures]
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1 and flights.executions == 1
+
+
+def test_errors_are_shared_and_nothing_is_cached():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flights.do("key", fail)
+    assert flights.do("key", lambda: 2) == 2
+    assert flights.executions == 2
+
+
+def test_waiter_reruns_when_the_leader_is_cancelled():
+    flights = SingleFlight()
+    leader_token = CancellationToken()
+    started = threading.Event()
+
+    def work():
+        started.set()
+        if current_token() is leader_token:
+            leader_token.wait(5)
+            raise_if_cancelled()
+        return "fresh"
+
+    def lead():
+        with cancellation_scope(leader_token):
+            return flights.do("key", work)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(lead)
+        started.wait(5)
+        waiter = pool.submit(flights.do, "key", work)
+        while flights.coalesced < 1:
+            threading.Event().wait(0.01)
+        leader_token.cancel()
+        with pytest.raises(OperationCancelled):
+            leader.result(5)
+        assert waiter.result(5) == "fresh"
+
+
+def test_cancelled_waiter_stops_waiting():
+    flights = SingleFlight()
+    release = threading.Event()
+    token = CancellationToken()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "key", lambda: release.wait(5))
+        while flights.executions < 1:
+            threading.Event().wait(0.01)
+
+        def wait_cancelled():
+            with cancellation_scope(token):
+                return flights.do("key", lambda: None)
+        waiter = pool.submit(wait_cancelled)
+        token.cancel("client went away")
+        with pytest.raises(OperationCancelled):
+            waiter.result(5)
+        release.set()
+        assert leader.result(5) is True
+
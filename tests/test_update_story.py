@@ -0,0 +1,240 @@
+import json
+
+import pytest
+
+from core.cancellation import OperationCancelled
+from core.memory_graph_builder import InMemoryGraphBuilder
+from core.neo4j_graph_builder import CHUNK_PROPERTIES
+from services.graph_extractor import GraphExtractor
+from services.story_chunks import split_story
+
+STORY = "\n\n".join(
+    f"Alice and Bob walked past Mill {index}. Carol and Dave waited at Gate {index}." for index in range(12)
+)
+
+
+def _counts(graph_builder, story_id):
+    graph_data = graph_builder.get_graph_data(story_id)
+    return len(graph_data["nodes"]), len(graph_data["relationships"])
+
+
+def test_resubmitting_unchanged_story_reuses_every_chunk(extractor, graph_builder, llm_client):
+    extractor.story_chunk_chars = 200
+    first = extractor.update_story("s", STORY)
+    calls = len(llm_client.calls)
+    second = extractor.update_story("s", STORY)
+
+    assert first["status"]["success"] and second["status"]["success"]
+    assert second["metadata"]["chunks"]["extracted"] == 0
+    assert len(llm_client.calls) == calls
+    assert _counts(graph_builder, "s") == (first["metadata"]["node_count"], first["metadata"]["relationship_count"])
+
+
+def test_edit_extracts_only_changed_chunks(extractor, graph_builder):
+    extractor.story_chunk_chars = 200
+    extractor.update_story("s", STORY)
+    edited = STORY.replace("Gate 11", "Tower 11")
+    result = extractor.update_story("s", edited)
+
+    chunks = result["metadata"]["chunks"]
+    assert chunks["extracted"] == 1 and chunks["retracted"] == 1
+    names = {node["properties"]["name"] for node in graph_builder.get_graph_data("s")["nodes"]}
+    assert "Tower" in names and "Alice" in names
+
+
+def test_story_built_by_extract_is_rebuilt_on_first_update(extractor, graph_builder):
+    extractor.story_chunk_chars = 200
+    extracted = extractor.extract_graph_nodes_and_relations(STORY, story_id="s", mode="pipelined")
+    assert extracted["status"]["success"]
+
+    first = extractor.update_story("s", STORY)
+    counts = _counts(graph_builder, "s")
+    assert counts == (first["metadata"]["node_count"], first["metadata"]["relationship_count"])
+    # No relationship is duplicated by adopting the nodes of the extracted graph
+    relationships = graph_builder.get_graph_data("s")["relationships"]
+    assert len({(rel["source"], rel["target"], rel["type"], rel["properties"].get("chunk_hash"))
+                for rel in relationships}) == len(relationships)
+    assert all("chunk_hash" in rel["properties"] for rel in relationships)
+
+    edited = STORY.replace("Gate 11", "Tower 11")
+    second = extractor.update_story("s", edited)
+    assert second["status"]["success"]
+    names = {node["properties"]["name"] for node in graph_builder.get_graph_data("s")["nodes"]}
+    assert {"Alice", "Bob", "Carol", "Dave", "Tower"} <= names
+
+
+# Two edits in different chunks
+EDITED = STORY.replace("Gate 1.", "Tower 1.").replace("Gate 10.", "Tower 10.")
+
+
+def _rebuilt_counts(llm_client):
+    graph_builder = InMemoryGraphBuilder()
+    extractor = GraphExtractor(graph_builder, llm_client)
+    extractor.story_chunk_chars = 200
+    extractor.update_story("s", EDITED)
+    return _counts(graph_builder, "s")
+
+
+def _interrupt_second_chunk(extractor, graph_builder, llm_client, monkeypatch, interruption):
+    """Update to EDITED, raising interruption once the first changed chunk has been written"""
+    expected = _rebuilt_counts(llm_client)
+    extractor.story_chunk_chars = 200
+    # One pipeline thread: the changed chunks run in order
+    extractor.pipeline_max_workers = 1
+    extractor.update_story("s", STORY)
+    assert len({chunk.hash for chunk in split_story(EDITED, 200)} - set(graph_builder.get_story_chunks("s"))) == 2
+    interruption(monkeypatch)
+    with pytest.raises(BaseException):
+        extractor.update_story("s", EDITED)
+    monkeypatch.undo()
+    # The finished chunk kept its fingerprint, so only the interrupted one is extracted again
+    result = extractor.update_story("s", EDITED)
+    assert result["metadata"]["chunks"]["extracted"] == 1
+    assert _counts(graph_builder, "s") == expected
+
+
+def test_cancelled_update_resumes_without_duplicates(extractor, graph_builder, llm_client, monkeypatch):
+    def cancel_second_node_call(monkeypatch):
+        generate_json = llm_client.generate_json
+        node_calls = []
+
+        def cancelling(prompt, *args, prompt_name=None, **kwargs):
+            if prompt_name == "GRAPH_NODE_EXTRACTOR":
+                node_calls.append(prompt)
+                if len(node_calls) == 2:
+                    raise OperationCancelled("cancelled")
+            return generate_json(prompt, *args, prompt_name=prompt_name, **kwargs)
+
+        monkeypatch.setattr(llm_client, "generate_json", cancelling)
+
+    _interrupt_second_chunk(extractor, graph_builder, llm_client, monkeypatch, cancel_second_node_call)
+
+
+def test_crashed_update_resumes_without_duplicates(extractor, graph_builder, llm_client, monkeypatch):
+    def crash_before_second_fingerprint(monkeypatch):
+        record_story_chunks = graph_builder.record_story_chunks
+        recorded = []
+
+        def crashing(story_id, chunks):
+            recorded.append(chunks)
+            if len(recorded) == 2:
+                # Like a killed process: no retraction runs, the chunk's facts stay without a fingerprint
+                raise SystemExit(1)
+            record_story_chunks(story_id, chunks)
+
+        monkeypatch.setattr(graph_builder, "record_story_chunks", crashing)
+
+    _interrupt_second_chunk(extractor, graph_builder, llm_client, monkeypatch, crash_before_second_fingerprint)
+
+
+def test_split_story_is_content_defined():
+    chunks = split_story(STORY, 200)
+    assert len(chunks) > 1
+    assert "\n\n".join(chunk.text for chunk in chunks) == STORY
+    edited = split_story(STORY.replace("Mill 0.", "Mill 0 again."), 200)
+    # Only the first chunk changes; later chunks keep their hash
+    assert edited[0].hash != chunks[0].hash
+    assert [chunk.hash for chunk in edited[1:]] == [chunk.hash for chunk in chunks[1:]]
+
+
+def test_whitespace_edits_keep_fingerprints():
+    assert [chunk.hash for chunk in split_story(STORY.replace(". ", ".   "), 200)] == \
+        [chunk.hash for chunk in split_story(STORY, 200)]
+
+
+def test_analytics_metrics_stay_out_of_chunk_prompts(extractor, graph_builder, llm_client, monkeypatch):
+    extractor.story_chunk_chars = 200
+    extractor.update_story("s", STORY)
+    extractor.analytics.refresh("s")
+    prompts = []
+    generate_json = llm_client.generate_json
+
+    def recording(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return generate_json(prompt, *args, **kwargs)
+
+    monkeypatch.setattr(llm_client, "generate_json", recording)
+    extractor.update_story("s", STORY.replace("Gate 11", "Tower 11"))
+    assert prompts and not any("_analytics_" in prompt for prompt in prompts)
+
+
+def test_streamed_story_matches_the_string(extractor, graph_builder, tmp_path):
+    extractor.story_chunk_chars = 200
+    extractor.story_chunk_window = 2
+    path = tmp_path / "story.txt"
+    path.write_text(STORY)
+    with open(path) as f:
+        streamed = extractor.update_story("s", f)
+    assert streamed["status"]["success"]
+    assert streamed["metadata"]["chunks"]["extracted"] == len(split_story(STORY, 200))
+    again = extractor.update_story("s", STORY)
+    assert again["metadata"]["chunks"]["extracted"] == 0
+
+
+def _merge(graph_builder, chunk_hash, **properties):
+    [node] = graph_builder.merge_story_nodes(
+        "s", chunk_hash, "Character", [{"key": 0, "name": "Alice", "properties": properties}]
+    )
+    return node["elementId"]
+
+
+def _properties(graph_builder, node_id):
+    [node] = [node for node in graph_builder.get_graph_data("s", include_analytics=True)["nodes"]
+              if node["id"] == node_id]
+    return node["properties"]
+
+
+def test_retraction_rebuilds_shared_node_properties(graph_builder):
+    node_id = _merge(graph_builder, "c1", role="baker", age=30)
+    _merge(graph_builder, "c2", role="mayor", title="Dr; PhD")
+    graph_builder.set_node_properties([{"id": node_id, "properties": {"_analytics_degree": 2}}])
+
+    graph_builder.retract_story_chunks("s", ["c2"])
+    # The value c2 overwrote is restored and the one only c2 contributed is gone; analytics survive
+    properties = _properties(graph_builder, node_id)
+    assert properties["role"] == "baker" and properties["age"] == 30
+    assert "title" not in properties
+    assert properties["chunks"] == ["c1"] and properties["_analytics_degree"] == 2
+
+    graph_builder.retract_story_chunks("s", ["c1"])
+    assert graph_builder.get_graph_data("s")["nodes"] == []
+
+
+def test_chunk_properties_stay_internal(graph_builder):
+    node_id = _merge(graph_builder, "c1", role="baker")
+    _merge(graph_builder, "c2", role="mayor")
+    outputs = [
+        graph_builder.get_graph_data("s")["nodes"],
+        graph_builder.get_graph_data("s", include_analytics=True)["nodes"],
+        graph_builder.get_nodes_by_label_page("Character", story_id="s")["nodes"],
+        graph_builder.merge_story_nodes("s", "c3", "Character", [{"key": 0, "name": "Alice", "properties": {}}]),
+    ]
+    for nodes in outputs:
+        assert nodes and all(CHUNK_PROPERTIES not in node["properties"] for node in nodes)
+    assert _properties(graph_builder, node_id)["role"] == "mayor"
+
+
+def test_edited_paragraph_takes_its_properties_along(extractor, graph_builder, llm_client, monkeypatch):
+    generate_json = llm_client.generate_json
+
+    def with_roles(prompt, *args, prompt_name=None, **kwargs):
+        response = generate_json(prompt, *args, prompt_name=prompt_name, **kwargs)
+        if prompt_name == "GRAPH_NODE_EXTRACTOR" and "Gate 11" in prompt:
+            data = json.loads(response)
+            for node in data["nodes"]:
+                node["properties"]["role"] = "guard"
+            response = json.dumps(data)
+        return response
+
+    monkeypatch.setattr(llm_client, "generate_json", with_roles)
+    extractor.story_chunk_chars = 200
+    extractor.update_story("s", STORY)
+    roles = {node["properties"]["name"]: node["properties"].get("role")
+             for node in graph_builder.get_graph_data("s")["nodes"]}
+    assert roles["Carol"] == "guard"
+
+    extractor.update_story("s", STORY.replace("Gate 11", "Tower 11"))
+    roles = {node["properties"]["name"]: node["properties"].get("role")
+             for node in graph_builder.get_graph_data("s")["nodes"]}
+    # Carol is still named by the other chunks, but no remaining chunk made her a guard
+    assert "Carol" in roles and roles["Carol"] is None